@@ -0,0 +1,231 @@
+"""
+Batching writer for the Atlas Data API.
+
+Documents are buffered and sent with one `insertMany` call once the buffer
+reaches `max_docs` or its oldest document is `max_age_sec` old. Every document
+gets a deterministic `_id` before it is sent, so when a batch fails it can be
+retried document by document: anything the failed batch already stored comes
+back as a duplicate-key error and is reported as stored rather than inserted
+twice.
+
+Results are (ok, status, body) tuples, one per document, in submission order.
+"""
+
+import json
+import re
+import threading
+import time
+
+import requests
+
+import metrics
+
+
+OBJECT_ID = re.compile(r"[0-9a-fA-F]{24}")
+
+
+def proof_document_id(document):
+    return document["proof"]["actualHash"]
+
+
+def id_filter_value(document_id):
+    """
+    An _id as a find filter needs it. The Data API returns ObjectIds (records
+    stored before proof-derived ids) as plain 24-hex strings, which would
+    never equal the ObjectId in a filter; proof ids are 64 hex, so the two
+    cannot be confused.
+    """
+    if isinstance(document_id, str) and OBJECT_ID.fullmatch(document_id):
+        return {"$oid": document_id}
+    return document_id
+
+
+class KeysetPager:
+    """
+    Filters for paging a find sorted by {"ts": 1, "_id": 1} without skip, so
+    each page costs the server the same however deep the scan is and inserts
+    during the scan cannot shift pages.
+
+    The next page starts at the last page's ts and excludes the ids already
+    returned at that ts, rather than comparing _id with $gt: ids of different
+    BSON types (legacy ObjectIds, proof-hash strings) never compare greater
+    than each other, which would drop records sharing the boundary ts.
+    """
+
+    def __init__(self, filter_doc):
+        self.filter_doc = filter_doc
+        self._ts = None
+        self._seen = []
+        self._started = False
+
+    def filter(self):
+        if not self._started:
+            return self.filter_doc
+        after = {"$or": [{"ts": {"$gt": self._ts}}, {"ts": self._ts, "_id": {"$nin": self._seen}}]}
+        return {"$and": [self.filter_doc, after]} if self.filter_doc else after
+
+    def advance(self, documents):
+        last_ts = documents[-1].get("ts")
+        if not self._started or last_ts != self._ts:
+            self._ts = last_ts
+            self._seen = []
+            self._started = True
+        self._seen.extend(id_filter_value(d.get("_id")) for d in documents if d.get("ts") == last_ts)
+
+
+def is_duplicate_key_error(status, body):
+    text = (body or "").lower()
+    return 400 <= status < 500 and ("e11000" in text or "duplicate key" in text)
+
+
+class AtlasBatchWriter:
+    def __init__(
+        self,
+        action_base_url,
+        api_key,
+        data_source,
+        database,
+        collection,
+        max_docs=50,
+        max_age_sec=5.0,
+        document_id=proof_document_id,
+        session=None,
+        timeout=15,
+    ):
+        self.action_base_url = action_base_url.rstrip("/")
+        self.headers = {
+            "Content-Type": "application/json",
+            "api-key": api_key,
+        }
+        self.target = {
+            "dataSource": data_source,
+            "database": database,
+            "collection": collection,
+        }
+        self.max_docs = max(1, int(max_docs))
+        self.max_age_sec = max_age_sec
+        self.document_id = document_id
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._opened_at = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def add(self, document):
+        with self._lock:
+            if not self._buffer:
+                self._opened_at = time.monotonic()
+            self._buffer.append(document)
+            batch = self._take_if_due()
+        return self.write_batch(batch)
+
+    def flush_if_due(self):
+        with self._lock:
+            batch = self._take_if_due()
+        return self.write_batch(batch)
+
+    def flush(self):
+        with self._lock:
+            batch = self._take()
+        return self.write_batch(batch)
+
+    def _take_if_due(self):
+        if not self._buffer:
+            return []
+        if len(self._buffer) >= self.max_docs:
+            return self._take()
+        if self.max_age_sec is not None and time.monotonic() - self._opened_at >= self.max_age_sec:
+            return self._take()
+        return []
+
+    def _take(self):
+        batch = self._buffer
+        self._buffer = []
+        self._opened_at = None
+        return batch
+
+    def _post(self, action, body):
+        payload = dict(self.target)
+        payload.update(body)
+        with metrics.timed(f"atlas_{action}"):
+            response = self.session.post(
+                f"{self.action_base_url}/{action}",
+                data=json.dumps(payload),
+                headers=self.headers,
+                timeout=self.timeout,
+            )
+            try:
+                status, text = response.status_code, response.text
+            finally:
+                response.close()
+        if not 200 <= status < 300 and not is_duplicate_key_error(status, text):
+            metrics.error(f"atlas_{action}")
+        return status, text
+
+    def write_batch(self, batch):
+        """Sends `batch` immediately, bypassing the buffer."""
+        if not batch:
+            return []
+
+        if self.document_id is not None:
+            for document in batch:
+                if "_id" not in document:
+                    document["_id"] = self.document_id(document)
+
+        try:
+            status, body = self._post("insertMany", {"documents": batch})
+        except Exception as e:
+            status, body = -1, str(e)
+
+        if 200 <= status < 300:
+            try:
+                inserted_ids = json.loads(body).get("insertedIds", [])
+            except ValueError:
+                inserted_ids = []
+            if len(inserted_ids) == len(batch):
+                return [(True, status, json.dumps({"insertedId": i})) for i in inserted_ids]
+
+        # Whole-batch failure (or an unreadable reply): settle each document individually.
+        return [self._insert_one(document) for document in batch]
+
+    def _insert_one(self, document):
+        try:
+            status, body = self._post("insertOne", {"document": document})
+        except Exception as e:
+            return False, -1, str(e)
+
+        if 200 <= status < 300:
+            return True, status, body
+        if is_duplicate_key_error(status, body):
+            return True, status, json.dumps({"alreadyStoredId": document.get("_id")})
+        return False, status, body
+
+    def find(self, filter_doc, projection=None, page_size=1000):
+        """Yields every matching document in (ts, _id) order, paged with KeysetPager; raises on failure."""
+        pager = KeysetPager(filter_doc)
+        while True:
+            body = {"filter": pager.filter(), "sort": {"ts": 1, "_id": 1}, "limit": page_size}
+            if projection:
+                body["projection"] = projection
+            status, text = self._post("find", body)
+            if not 200 <= status < 300:
+                raise RuntimeError(f"Atlas find failed: {status} {text}")
+            documents = json.loads(text).get("documents", [])
+            yield from documents
+            if len(documents) < page_size:
+                return
+            pager.advance(documents)
+
+    def update_many(self, filter_doc, update):
+        """Sends one updateMany; returns the matched document count, raising on failure."""
+        status, body = self._post("updateMany", {"filter": filter_doc, "update": update})
+        if not 200 <= status < 300:
+            raise RuntimeError(f"Atlas updateMany failed: {status} {body}")
+        try:
+            return int(json.loads(body).get("matchedCount", 0))
+        except (ValueError, TypeError, AttributeError):
+            return 0
@@ -0,0 +1,788 @@
+"""
+Throughput benchmarks for the gateway, the verifier, the analysis code and the
+grid generator, run against local stand-ins for every remote service.
+
+One in-process HTTP server plays Atlas (insertOne/insertMany/find/findOne/
+updateMany), Open-Meteo (/v1/forecast) and Solana JSON-RPC
+(getLatestBlockhash, sendTransaction, getSignatureStatuses). A fake serial
+port replays recorded STM32 lines through main.main(), so the real pipeline,
+spool and batch writer are measured end to end.
+
+Suites (all rates are higher-is-better):
+- gateway:  readings/sec through main.py, per anchor mode, direct and spooled
+- framing:  serial decode readings/sec, text lines vs binary frames (FrameDecoder)
+- hashing:  compute_actual_hash calls/sec on a built record
+- verify:   verifications/sec through verify_record.run_batch (--check-chain)
+- analysis: points/sec in analyze_metric_history (raw, and on a 1h rollup
+            tier), 1h/24h/7d window trends emitted per point, rollup ingest,
+            analyze_series_batch and history_analysis.analyze_history
+            (reading from the Atlas stand-in)
+- grid:     features/sec from the grid generator
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --only analysis grid --compare bench.json
+
+Without the Solana libraries, main.py cannot build transactions; the gateway
+suite then anchors with a plain sendTransaction call to the stand-in RPC and
+records "anchor": "rpc-only" in the results.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from argparse import Namespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+SRC_DIR = Path(__file__).resolve().parent
+REPO_DIR = SRC_DIR.parents[2]
+GRID_SCRIPTS_DIR = REPO_DIR / "the-delta" / "scripts"
+
+SUITES = ("gateway", "framing", "hashing", "verify", "analysis", "grid")
+
+# Lines recorded from the STM32 over UART, including the odd garbled line.
+RECORDED_LINES = [
+    "H=61.0%, T=29.0C",
+    "H=61.0%, T=29.1C",
+    "H=62.0%, T=29.1C",
+    "CMD:TEMP",
+    "H=62.0%, T=29.2C",
+    "H=63.0%, T=29.2C",
+    "CMD:MOISTURE",
+    "H=63.0%, T=29.3C",
+    "DHT11 read error",
+    "H=64.0%, T=29.3C",
+    "CMD:PH",
+    "H=64.0%, T=29.4C",
+    "CMD:SALINITY",
+    "H=65.0%, T=29.4C",
+]
+
+# main.py and verify_record.py read their settings from a `secrets` module.
+# The stand-in keeps the stdlib secrets API and is installed at import time so
+# verifier worker processes (which re-import this module) see it too.
+BENCH_SETTINGS = {
+    "ATLAS_APP_ID": "benchmark",
+    "ATLAS_API_KEY": "benchmark-key",
+    "ATLAS_DATA_SOURCE": "bench",
+    "ATLAS_DB": "bench",
+    "ATLAS_COLLECTION": "records",
+    "DEVICE_ID": "bench-stm32",
+    "HASH_TWEAK_SECRET": "benchmark-secret",
+    "SOLANA_PRIVATE_KEY_B58": "",
+    "SPOOL_DIR": None,
+    "METRICS_PORT": None,
+}
+
+
+def install_settings():
+    if getattr(sys.modules.get("secrets"), "BENCHMARK", False):
+        return
+    import secrets as stdlib_secrets
+
+    settings = types.ModuleType("secrets")
+    settings.__dict__.update({k: v for k, v in vars(stdlib_secrets).items() if not k.startswith("__")})
+    settings.__dict__.update(BENCH_SETTINGS)
+    settings.BENCHMARK = True
+    sys.modules["secrets"] = settings
+
+
+install_settings()
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+
+# -- stand-in services --------------------------------------------------------
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def b58encode(data):
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, rem = divmod(n, 58)
+        out = B58_ALPHABET[rem] + out
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + out
+
+
+def _lookup(document, dotted):
+    value = document
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def matches(document, filter_doc):
+    """The subset of Atlas filter syntax the gateway and verifier use."""
+    for path, cond in filter_doc.items():
+        if path == "$and":
+            if not all(matches(document, sub) for sub in cond):
+                return False
+            continue
+        if path == "$or":
+            if not any(matches(document, sub) for sub in cond):
+                return False
+            continue
+        value = _lookup(document, path)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, operand in cond.items():
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op == "$gt" and not (value is not None and value > operand):
+                return False
+            if op == "$gte" and not (value is not None and value >= operand):
+                return False
+            if op == "$lt" and not (value is not None and value < operand):
+                return False
+    return True
+
+
+def project(document, projection):
+    """Inclusion projection over dotted paths (plus `_id` unless excluded)."""
+    out = {}
+    if projection.get("_id", 1) and "_id" in document:
+        out["_id"] = document["_id"]
+    for path, include in projection.items():
+        if path == "_id" or not include:
+            continue
+        value = _lookup(document, path)
+        if value is None:
+            continue
+        *parents, leaf = path.split(".")
+        target = out
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[leaf] = value
+    return out
+
+
+class FakeServices:
+    """Atlas, Open-Meteo and Solana RPC stand-ins on one local HTTP server."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_sec = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.documents = {}
+        self.received = 0
+        self.requests = {}
+        self.signatures = 0
+
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                services.handle(self, "GET")
+
+            def do_POST(self):
+                services.handle(self, "POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.atlas_url = f"{base}/atlas"
+        self.weather_url = f"{base}/v1/forecast"
+        self.solana_url = f"{base}/solana"
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.documents = {}
+            self.received = 0
+            self.requests = {}
+
+    def count(self, name):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def delivered(self):
+        """Documents received by insertOne/insertMany, counting repeats of the same _id."""
+        with self.lock:
+            return self.received
+
+    def handle(self, request, method):
+        length = int(request.headers.get("Content-Length") or 0)
+        body = json.loads(request.rfile.read(length) or b"null") if length else None
+        url = urlparse(request.path)
+        path = url.path
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+
+        if path.startswith("/atlas/"):
+            status, reply = self.atlas(path.rsplit("/", 1)[-1], body)
+        elif path == "/v1/forecast" and method == "GET":
+            status, reply = self.weather(parse_qs(url.query))
+        elif path == "/solana":
+            status, reply = self.solana(body)
+        else:
+            status, reply = 404, {"error": "not found"}
+
+        payload = json.dumps(reply).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def atlas(self, action, body):
+        self.count(f"atlas.{action}")
+        if action == "insertOne":
+            body = dict(body, documents=[body["document"]])
+        if action in ("insertOne", "insertMany"):
+            ids = []
+            with self.lock:
+                for document in body["documents"]:
+                    doc_id = document.get("_id") or hashlib.sha256(json.dumps(document).encode()).hexdigest()
+                    self.documents[doc_id] = document
+                    ids.append(doc_id)
+                self.received += len(ids)
+            if action == "insertOne":
+                return 201, {"insertedId": ids[0]}
+            return 201, {"insertedIds": ids}
+
+        if action in ("find", "findOne"):
+            filter_doc = body.get("filter", {})
+            with self.lock:
+                found = [d for d in self.documents.values() if matches(d, filter_doc)]
+            found.sort(key=lambda d: (d.get("ts", 0), str(d.get("_id", ""))))
+            if action == "findOne":
+                return 200, {"document": found[0] if found else None}
+            skip = body.get("skip", 0)
+            found = found[skip:skip + body.get("limit", len(found))]
+            if body.get("projection"):
+                found = [project(d, body["projection"]) for d in found]
+            return 200, {"documents": found}
+
+        if action == "updateMany":
+            matched = 0
+            with self.lock:
+                for document in self.documents.values():
+                    if not matches(document, body.get("filter", {})):
+                        continue
+                    matched += 1
+                    for path, value in body.get("update", {}).get("$set", {}).items():
+                        *parents, leaf = path.split(".")
+                        target = document
+                        for key in parents:
+                            target = target.setdefault(key, {})
+                        target[leaf] = value
+            return 200, {"matchedCount": matched, "modifiedCount": matched}
+
+        return 400, {"error": f"unsupported action {action}"}
+
+    def weather(self, query):
+        self.count("open-meteo")
+        # Like Open-Meteo: one object for one coordinate, a list for several.
+        lats = query.get("latitude", [""])[0].split(",")
+        results = [self.current_weather() for _ in lats]
+        return 200, results[0] if len(results) == 1 else results
+
+    def current_weather(self):
+        return {
+            "current": {
+                "time": "2026-01-01T12:00",
+                "temperature_2m": 31.2,
+                "relative_humidity_2m": 64,
+                "apparent_temperature": 35.0,
+                "precipitation": 0.0,
+                "pressure_msl": 1008.4,
+                "cloud_cover": 40,
+                "wind_speed_10m": 7.2,
+                "wind_direction_10m": 180,
+                "weather_code": 2,
+            }
+        }
+
+    def solana(self, body):
+        method = body.get("method")
+        self.count(f"solana.{method}")
+        if method == "getLatestBlockhash":
+            result = {"context": {"slot": 1}, "value": {"blockhash": b58encode(os.urandom(32)), "lastValidBlockHeight": 1000}}
+        elif method == "sendTransaction":
+            with self.lock:
+                self.signatures += 1
+            result = b58encode(hashlib.sha512(str(body.get("params")).encode("utf-8")).digest())
+        elif method == "getSignatureStatuses":
+            status = {"slot": 1, "confirmations": None, "err": None, "confirmationStatus": "finalized"}
+            result = {"context": {"slot": 1}, "value": [status for _ in body["params"][0]]}
+        else:
+            return 200, {"jsonrpc": "2.0", "id": body.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+        return 200, {"jsonrpc": "2.0", "id": body.get("id"), "result": result}
+
+
+class ReplayFinished(Exception):
+    pass
+
+
+class FakeSerial:
+    """Replays recorded lines (or raw frames) as serial.Serial would return them, then ends its reader (and so main())."""
+
+    def __init__(self, lines):
+        self._chunks = iter(lines)
+        self._pending = b""
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _next_chunk(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            raise ReplayFinished()
+        return chunk if isinstance(chunk, bytes) else (chunk + "\r\n").encode("utf-8")
+
+    @property
+    def in_waiting(self):
+        if not self._pending:
+            self._pending = self._next_chunk()
+        return len(self._pending)
+
+    def read(self, size=1):
+        if not self._pending:
+            self._pending = self._next_chunk()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def readline(self):
+        if self._pending:
+            data, self._pending = self._pending, b""
+            return data
+        return self._next_chunk()
+
+
+# -- suites -------------------------------------------------------------------
+
+def result(value, unit, count, seconds, **extra):
+    entry = {"value": round(value, 2), "unit": unit, "count": count, "seconds": round(seconds, 4)}
+    entry.update(extra)
+    return entry
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def replay_lines(path, count):
+    recorded = RECORDED_LINES
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            recorded = [line.strip() for line in f if line.strip()]
+    return [recorded[i % len(recorded)] for i in range(count)]
+
+
+def rpc_anchor(services):
+    import transport
+
+    def anchor(hash_hex):
+        payload = {"jsonrpc": "2.0", "id": 1, "method": "sendTransaction", "params": [hash_hex]}
+        response = transport.session("solana-rpc").post(services.solana_url, json=payload, timeout=10)
+        response.raise_for_status()
+        return response.json()["result"]
+
+    return anchor
+
+
+def point_gateway(gateway, services, spool_dir):
+    from atlas_writer import AtlasBatchWriter
+    from merkle import AnchorBatch
+    from time_series_rollup import RollupStore
+    from weather_cache import WeatherCache
+    import transport
+
+    gateway.ATLAS_ACTION_URL = services.atlas_url
+    gateway.ATLAS_URL = f"{services.atlas_url}/insertOne"
+    gateway.OPEN_METEO_URL = services.weather_url
+    gateway.SOLANA_RPC_URL = services.solana_url
+    gateway.SPOOL_DIR = spool_dir
+    gateway._spool = None
+    gateway._weather_cache = WeatherCache(gateway.fetch_weather_batch, ttl_sec=gateway.WEATHER_REFRESH_SEC)
+    gateway._rollups = RollupStore()
+    gateway._anchor_batch = AnchorBatch(gateway.ANCHOR_BATCH_SIZE, gateway.ANCHOR_BATCH_WINDOW_SEC)
+    gateway._atlas_writer = AtlasBatchWriter(
+        services.atlas_url,
+        gateway.ATLAS_API_KEY,
+        gateway.ATLAS_DATA_SOURCE,
+        gateway.ATLAS_DB,
+        gateway.ATLAS_COLLECTION,
+        max_docs=gateway.ATLAS_BATCH_SIZE,
+        max_age_sec=gateway.ATLAS_BATCH_MAX_AGE_SEC,
+        session=transport.session("atlas"),
+    )
+
+
+def run_gateway(gateway, services, lines, anchor_mode, spooled):
+    from spool import Replayer
+
+    services.reset()
+    random.seed(0)
+    expected = sum(1 for line in lines if gateway.reading_from_line(line) is not None)
+    gateway.ANCHOR_MODE = anchor_mode
+    # Big enough that the non-blocking serial submit never drops a reading.
+    gateway.PIPELINE_QUEUE_SIZE = len(lines) + 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        point_gateway(gateway, services, os.path.join(tmp, "spool") if spooled else None)
+        gateway.serial = types.SimpleNamespace(Serial=FakeSerial(lines))
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            gateway.main()
+            if spooled:
+                # main() leaves undelivered records spooled for the next start; drain them here.
+                batch = gateway.ANCHOR_BATCH_SIZE if anchor_mode == "merkle-batch" else gateway.ATLAS_BATCH_SIZE
+                tail = Replayer(gateway._spool, gateway.deliver_spooled, batch, 0)
+                while tail.drain_once(force=True):
+                    pass
+        elapsed = time.perf_counter() - started
+
+    delivered = services.delivered()
+    return result(
+        delivered / elapsed, "readings/sec", delivered, elapsed,
+        lines=len(lines), expected=expected, requests=dict(services.requests),
+    )
+
+
+def bench_gateway(args, services, results, meta):
+    import main as gateway
+
+    if gateway.SolanaClient is None or not gateway.SOLANA_PRIVATE_KEY_B58:
+        gateway.anchor_hash_on_solana = rpc_anchor(services)
+        meta["anchor"] = "rpc-only"
+    else:
+        meta["anchor"] = "solana-client"
+
+    lines = replay_lines(args.lines, args.readings)
+    for anchor_mode in ("per-record", "merkle-batch"):
+        for spooled in (False, True):
+            name = f"gateway.{anchor_mode}.{'spool' if spooled else 'direct'}"
+            results[name] = run_gateway(gateway, services, lines, anchor_mode, spooled)
+
+
+def sample_record():
+    import main as gateway
+
+    random.seed(0)
+    weather = {"temperature": 31.2, "humidity": 64, "pressureMsl": 1008.4, "observedAt": "2026-01-01T12:00"}
+    return gateway.build_record({"temperature": 29.4, "humidity": 64.0}, "stm-dht11", weather, anchor=False, ts=1767225600)
+
+
+def bench_framing(args, services, results, meta):
+    import main as gateway
+    from serial_frame import FrameDecoder, encode_frame
+
+    lines = replay_lines(args.lines, args.readings)
+    text = "".join(line + "\r\n" for line in lines).encode("utf-8")
+    readings = [gateway.parse_stm_line(line) for line in lines]
+    frames = b"".join(
+        encode_frame("stm1", seq, {"temperature": parsed[0], "humidity": parsed[1]})
+        for seq, parsed in enumerate(readings) if parsed is not None
+    )
+    chunk = 64  # roughly what one read returns at 115200 baud
+
+    def decode_text():
+        decoder = FrameDecoder()
+        for i in range(0, len(text), chunk):
+            for _, line in decoder.feed(text[i:i + chunk]):
+                gateway.parse_stm_line(line)
+
+    def decode_frames():
+        decoder = FrameDecoder()
+        for i in range(0, len(frames), chunk):
+            decoder.feed(frames[i:i + chunk])
+
+    count = len(lines)
+    elapsed = best_of(args.repeat, decode_text)
+    results["framing.text"] = result(count / elapsed, "readings/sec", count, elapsed, bytes=len(text))
+    count = sum(1 for parsed in readings if parsed is not None)
+    elapsed = best_of(args.repeat, decode_frames)
+    results["framing.binary"] = result(count / elapsed, "readings/sec", count, elapsed, bytes=len(frames))
+
+
+def bench_hashing(args, services, results, meta):
+    import main as gateway
+
+    record = sample_record()
+    base = {k: v for k, v in record.items() if k != "proof"}
+    count = args.iterations
+    elapsed = best_of(args.repeat, lambda: [gateway.compute_actual_hash(base) for _ in range(count)])
+    results["hashing.compute_actual_hash"] = result(count / elapsed, "hashes/sec", count, elapsed)
+
+
+def bench_verify(args, services, results, meta):
+    import main as gateway
+    import verify_record
+
+    services.reset()
+    verify_record.ATLAS_FIND_URL = f"{services.atlas_url}/find"
+    verify_record.ATLAS_FIND_ONE_URL = f"{services.atlas_url}/findOne"
+    verify_record.SOLANA_RPC_URL = services.solana_url
+
+    random.seed(0)
+    documents = []
+    hashes = []
+    for i in range(args.records):
+        sensor = {"temperature": round(random.uniform(20.0, 36.0), 2), "humidity": round(random.uniform(40.0, 90.0), 1)}
+        record = gateway.build_record(sensor, "stm-dht11", None, anchor=False, ts=1767225600 + i * 60)
+        record["proof"]["solana"]["txSignature"] = b58encode(hashlib.sha512(record["proof"]["actualHash"].encode()).digest())
+        record["_id"] = record["proof"]["actualHash"]
+        documents.append(record)
+        hashes.append(record["proof"]["actualHash"])
+    with services.lock:
+        services.documents = {d["_id"]: d for d in documents}
+
+    elapsed = best_of(args.repeat, lambda: [verify_record.verify_document(d, h) for d, h in zip(documents, hashes)])
+    results["verify.verify_document"] = result(len(documents) / elapsed, "verifications/sec", len(documents), elapsed)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(hashes) + "\n")
+    try:
+        batch_args = Namespace(hashes_file=f.name, since=None, until=None, check_chain=True, workers=args.workers)
+        report = {}
+
+        def run():
+            report.update(verify_record.run_batch(batch_args))
+
+        elapsed = best_of(1, run)
+    finally:
+        os.unlink(f.name)
+    results["verify.run_batch"] = result(
+        len(hashes) / elapsed, "verifications/sec", len(hashes), elapsed, summary=report.get("summary"),
+    )
+
+
+def synthetic_history(points, seed=0):
+    rng = random.Random(seed)
+    history = []
+    value = 28.0
+    for i in range(points):
+        value += rng.gauss(0.002, 0.05)
+        reading = value + (rng.choice((-6.0, 6.0)) if rng.random() < 0.01 else rng.gauss(0.0, 0.3))
+        history.append({"ts": 1767225600 + i * 60, "deviceId": f"dev-{i % 8}", "sensor": {"temperature": round(reading, 2)}})
+    return history
+
+
+def bench_analysis(args, services, results, meta):
+    from time_series_analysis import MetricSeries, analyze_metric_history
+    from time_series_rollup import RollupStore
+    from time_series_windows import WindowedTrendState
+
+    history = synthetic_history(args.points)
+    elapsed = best_of(args.repeat, lambda: analyze_metric_history(history, "temperature"))
+    results["analysis.records"] = result(len(history) / elapsed, "points/sec", len(history), elapsed)
+
+    series = MetricSeries.from_records(history, "temperature")
+    elapsed = best_of(args.repeat, lambda: analyze_metric_history(series))
+    results["analysis.metric_series"] = result(len(series) / elapsed, "points/sec", len(series), elapsed)
+
+    def windowed():
+        state = WindowedTrendState()
+        for ts, value in zip(series.timestamps, series.values):
+            state.update(ts, value)
+            state.trends()
+
+    elapsed = best_of(args.repeat, windowed)
+    results["analysis.windowed_trends"] = result(len(series) / elapsed, "points/sec", len(series), elapsed)
+
+    store = RollupStore(["temperature"])
+    elapsed = best_of(1, lambda: store.add_records(history))
+    results["analysis.rollup_ingest"] = result(len(history) / elapsed, "points/sec", len(history), elapsed)
+    rollup = store.get("dev-0", "temperature")
+    elapsed = best_of(args.repeat, lambda: analyze_metric_history(rollup, tier="1h"))
+    # Rate in raw points covered, to compare with analysis.metric_series.
+    covered = sum(b.count for b in rollup.buckets("1h"))
+    results["analysis.tier_1h"] = result(covered / elapsed, "points/sec", covered, elapsed, buckets=len(rollup.buckets("1h")))
+
+    try:
+        from time_series_batch import analyze_histories_batch
+    except ImportError as e:
+        meta.setdefault("skipped", {})["analysis.batch"] = str(e)
+        return
+    elapsed = best_of(args.repeat, lambda: analyze_histories_batch(history, ["temperature"]))
+    results["analysis.batch"] = result(len(history) / elapsed, "points/sec", len(history), elapsed)
+
+    import history_analysis
+
+    services.reset()
+    history_analysis.ATLAS_FIND_URL = f"{services.atlas_url}/find"
+    with services.lock:
+        services.documents = {
+            f"{d['deviceId']}:{d['ts']}": dict(d, _id=f"{d['deviceId']}:{d['ts']}", proof={"actualHash": "0" * 64})
+            for d in history
+        }
+    devices = sorted({d["deviceId"] for d in history})
+    report = {}
+
+    def run():
+        report.update(history_analysis.analyze_history(["temperature"], device_ids=devices, workers=args.workers))
+
+    elapsed = best_of(1, run)
+    results["analysis.history"] = result(
+        len(history) / elapsed, "points/sec", len(history), elapsed, summary=report.get("summary"),
+    )
+
+
+def bench_grid(args, services, results, meta):
+    if str(GRID_SCRIPTS_DIR) not in sys.path:
+        sys.path.insert(0, str(GRID_SCRIPTS_DIR))
+    try:
+        import regenerate_cambodia_grid as grid
+    except ImportError as e:
+        meta.setdefault("skipped", {})["grid"] = str(e)
+        return
+
+    for noise in sorted(grid.NOISE_SCHEMES):
+        region = grid.load_region(grid.DEFAULT_REGION)
+        region["noise"] = noise
+        counted = []
+
+        def run():
+            counted[:] = [sum(len(points) for points, _ in grid.iter_grid_bands(region, workers=args.workers or 1))]
+
+        elapsed = best_of(args.repeat, run)
+        results[f"grid.{noise}"] = result(counted[0] / elapsed, "features/sec", counted[0], elapsed)
+
+    # Re-classification against a warm geography cache (what a fields/ranges edit costs).
+    region = grid.load_region(grid.DEFAULT_REGION)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for _ in grid.iter_grid_bands(region, workers=args.workers or 1, cache_dir=cache_dir):
+            pass
+        counted = []
+
+        def run_cached():
+            counted[:] = [sum(len(points) for points, _ in grid.iter_grid_bands(region, cache_dir=cache_dir))]
+
+        elapsed = best_of(args.repeat, run_cached)
+        results["grid.cached"] = result(counted[0] / elapsed, "features/sec", counted[0], elapsed)
+
+
+BENCHMARKS = {
+    "gateway": bench_gateway,
+    "framing": bench_framing,
+    "hashing": bench_hashing,
+    "verify": bench_verify,
+    "analysis": bench_analysis,
+    "grid": bench_grid,
+}
+
+
+# -- reporting ----------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Prints per-benchmark ratios; returns the names that regressed past threshold."""
+    regressions = []
+    for name, entry in sorted(report["results"].items()):
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("value"):
+            print(f"{name:40s} {entry['value']:>14.2f} {entry['unit']}  (new)")
+            continue
+        ratio = entry["value"] / before["value"]
+        flag = ""
+        if ratio < 1.0 - threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:40s} {entry['value']:>14.2f} {entry['unit']}  x{ratio:.2f} vs {before['value']:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gateway, verifier, analysis and grid generator against local stand-ins")
+    parser.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES), help="Suites to run")
+    parser.add_argument("--output", help="Write the JSON results here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown fraction reported as a regression")
+    parser.add_argument("--lines", help="Recorded STM32 lines to replay (default: built-in recording)")
+    parser.add_argument("--readings", type=int, default=2000, help="Serial lines replayed per gateway run")
+    parser.add_argument("--records", type=int, default=2000, help="Stored records verified")
+    parser.add_argument("--points", type=int, default=50000, help="Points per analysis history")
+    parser.add_argument("--iterations", type=int, default=20000, help="Hash computations per hashing run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per micro benchmark; the best is kept")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the verifier and grid generator")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per stand-in service request")
+    args = parser.parse_args()
+
+    meta = {
+        "timestamp": int(time.time()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latencyMs": args.latency_ms,
+    }
+    results = {}
+    with FakeServices(args.latency_ms) as services:
+        for suite in SUITES:
+            if suite in args.only:
+                BENCHMARKS[suite](args, services, results, meta)
+                print(f"{suite}: done", file=sys.stderr)
+
+    report = {"meta": meta, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    for name, entry in sorted(results.items()):
+        print(f"{name:40s} {entry['value']:>14.2f} {entry['unit']}")
+
+
+if __name__ == "__main__":
+    main()
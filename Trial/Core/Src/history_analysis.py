@@ -0,0 +1,265 @@
+"""
+Batch trend/anomaly analysis over the sensor history stored in Atlas.
+
+Reads the collection main.py inserts into with keyset-paginated `find` calls
+that project only `ts`, `_id`, `deviceId` and the requested `sensor.<metric>`
+fields (proofs and weather never leave the database). With explicit device ids each
+device is read by its own paginated query, several at a time. Points are
+collected per (device, metric) into compact int64/float64 arrays, and the
+series are analyzed with time_series_batch.analyze_series_batch in a process
+pool, one chunk of series per task.
+
+The result is a single JSON-ready report: per device, per metric, the trend,
+anomaly count, recent anomaly timestamps and latest values, which the
+dashboard's /risk and /satellite routes can serve as is.
+
+Usage:
+    python history_analysis.py --since 2026-01-01 --metrics temperature humidity --output analysis.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+
+import secrets as app_secrets
+import transport
+from atlas_writer import KeysetPager
+from time_series_analysis import KalmanConfig, _to_float
+from time_series_batch import analyze_series_batch
+
+ATLAS_APP_ID = app_secrets.ATLAS_APP_ID
+ATLAS_API_KEY = app_secrets.ATLAS_API_KEY
+ATLAS_DATA_SOURCE = app_secrets.ATLAS_DATA_SOURCE
+ATLAS_DB = app_secrets.ATLAS_DB
+ATLAS_COLLECTION = app_secrets.ATLAS_COLLECTION
+
+ATLAS_ACTION_URL = f"https://data.mongodb-api.com/app/{ATLAS_APP_ID}/endpoint/data/v1/action"
+ATLAS_FIND_URL = f"{ATLAS_ACTION_URL}/find"
+FIND_PAGE_SIZE = 5000
+DEFAULT_METRICS = ("temperature", "humidity", "moisture", "salinity", "ph")
+FETCH_THREADS = 4
+SERIES_PER_TASK = 64
+RECENT_ANOMALIES = 10
+
+
+def atlas_headers():
+    return {
+        "Content-Type": "application/json",
+        "api-key": ATLAS_API_KEY,
+    }
+
+
+def atlas_target():
+    return {
+        "dataSource": ATLAS_DATA_SOURCE,
+        "database": ATLAS_DB,
+        "collection": ATLAS_COLLECTION,
+    }
+
+
+def history_projection(metric_keys):
+    # _id is kept for keyset pagination.
+    projection = {"ts": 1, "deviceId": 1}
+    projection.update({f"sensor.{metric_key}": 1 for metric_key in metric_keys})
+    return projection
+
+
+def find_history(filter_doc, metric_keys, page_size=FIND_PAGE_SIZE):
+    """Yields projected documents matching filter_doc in (ts, _id) order, one find call per page."""
+    pager = KeysetPager(filter_doc)
+    while True:
+        payload = atlas_target()
+        payload.update({
+            "filter": pager.filter(),
+            "projection": history_projection(metric_keys),
+            "sort": {"ts": 1, "_id": 1},
+            "limit": page_size,
+        })
+        response = transport.session("atlas").post(ATLAS_FIND_URL, headers=atlas_headers(), data=json.dumps(payload), timeout=60)
+        response.raise_for_status()
+        documents = response.json().get("documents", [])
+        yield from documents
+        if len(documents) < page_size:
+            return
+        pager.advance(documents)
+
+
+def history_filter(since=None, until=None, device_ids=None):
+    filter_doc = {}
+    ts_filter = {}
+    if since is not None:
+        ts_filter["$gte"] = since
+    if until is not None:
+        ts_filter["$lt"] = until
+    if ts_filter:
+        filter_doc["ts"] = ts_filter
+    if device_ids:
+        filter_doc["deviceId"] = device_ids[0] if len(device_ids) == 1 else {"$in": list(device_ids)}
+    return filter_doc
+
+
+def collect_series(documents, metric_keys, series=None):
+    """
+    Appends each document's metrics to {(deviceId, metric): (ts array, value array)}.
+    Documents arrive in ts order (find sorts by ts), so every series stays sorted.
+    """
+    series = {} if series is None else series
+    for document in documents:
+        try:
+            ts = int(document["ts"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        sensor = document.get("sensor") or {}
+        device_id = document.get("deviceId")
+        for metric_key in metric_keys:
+            value = _to_float(sensor.get(metric_key))
+            if value is None:
+                continue
+            columns = series.get((device_id, metric_key))
+            if columns is None:
+                columns = series[(device_id, metric_key)] = (array("q"), array("d"))
+            columns[0].append(ts)
+            columns[1].append(value)
+    return series
+
+
+def fetch_series(metric_keys, since=None, until=None, device_ids=None, page_size=FIND_PAGE_SIZE, threads=FETCH_THREADS):
+    if not device_ids:
+        return collect_series(find_history(history_filter(since, until), metric_keys, page_size), metric_keys)
+
+    def fetch_device(device_id):
+        return collect_series(find_history(history_filter(since, until, [device_id]), metric_keys, page_size), metric_keys)
+
+    series = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(device_ids)))) as pool:
+        for device_series in pool.map(fetch_device, device_ids):
+            series.update(device_series)
+    return series
+
+
+def summarize(analysis):
+    timestamps = analysis.timestamps
+    anomalies = analysis.anomaly_indices
+    return {
+        "trend": asdict(analysis.trend),
+        "points": len(timestamps),
+        "anomalyCount": len(anomalies),
+        "recentAnomalies": [
+            {"ts": timestamps[i], "value": analysis.raw_values[i]} for i in anomalies[-RECENT_ANOMALIES:]
+        ],
+        "firstTs": timestamps[0] if len(timestamps) else None,
+        "lastTs": timestamps[-1] if len(timestamps) else None,
+        "lastValue": analysis.raw_values[-1] if len(timestamps) else None,
+        "lastFiltered": analysis.filtered_values[-1] if len(timestamps) else None,
+    }
+
+
+def _analyze_chunk(task):
+    """Process-pool task: [(key, timestamps, values), ...] -> [(key, summary), ...]."""
+    items, cfg_fields = task
+    analyses = analyze_series_batch([(ts, values) for _, ts, values in items], KalmanConfig(**cfg_fields))
+    return [(key, summarize(analysis)) for (key, _, _), analysis in zip(items, analyses)]
+
+
+def analyze_series(series, cfg=None, workers=None, per_task=SERIES_PER_TASK):
+    """Returns {(deviceId, metric): summary}; small inputs skip the process pool."""
+    cfg_fields = asdict(cfg or KalmanConfig())
+    items = [(key, timestamps, values) for key, (timestamps, values) in series.items()]
+    tasks = [(items[i:i + per_task], cfg_fields) for i in range(0, len(items), per_task)]
+
+    summaries = {}
+    if len(tasks) <= 1 or workers == 1:
+        for task in tasks:
+            summaries.update(_analyze_chunk(task))
+        return summaries
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(_analyze_chunk, tasks):
+            summaries.update(chunk)
+    return summaries
+
+
+def build_report(summaries, metric_keys, since=None, until=None):
+    devices = {}
+    for (device_id, metric_key), summary in sorted(summaries.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        device = devices.setdefault(str(device_id), {"metrics": {}, "anomalyCount": 0, "lastTs": None})
+        device["metrics"][metric_key] = summary
+        device["anomalyCount"] += summary["anomalyCount"]
+        if summary["lastTs"] is not None and (device["lastTs"] is None or summary["lastTs"] > device["lastTs"]):
+            device["lastTs"] = summary["lastTs"]
+
+    return {
+        "generatedAt": int(time.time()),
+        "since": since,
+        "until": until,
+        "metrics": list(metric_keys),
+        "summary": {
+            "devices": len(devices),
+            "series": len(summaries),
+            "points": sum(summary["points"] for summary in summaries.values()),
+        },
+        "devices": devices,
+    }
+
+
+def analyze_history(
+    metric_keys=DEFAULT_METRICS,
+    since=None,
+    until=None,
+    device_ids=None,
+    cfg=None,
+    workers=None,
+    page_size=FIND_PAGE_SIZE,
+):
+    """
+    Fetch, group and analyze history for many devices and metrics at once.
+
+    Example:
+    report = analyze_history(["temperature", "ph"], since=1767225600, device_ids=["stm32-01", "stm32-02"])
+    report["devices"]["stm32-01"]["metrics"]["ph"]["trend"]
+    """
+    series = fetch_series(metric_keys, since, until, device_ids, page_size)
+    return build_report(analyze_series(series, cfg, workers), metric_keys, since, until)
+
+
+def parse_time(value):
+    """Unix seconds or an ISO-8601 timestamp."""
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trend/anomaly analysis over stored sensor history")
+    parser.add_argument("--since", help="Only readings with ts >= this (unix seconds or ISO-8601)")
+    parser.add_argument("--until", help="Only readings with ts < this")
+    parser.add_argument("--devices", nargs="+", help="Device ids (default: every device in the range)")
+    parser.add_argument("--metrics", nargs="+", default=list(DEFAULT_METRICS), help="Sensor metrics to analyze")
+    parser.add_argument("--workers", type=int, default=None, help="Analysis processes")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = analyze_history(
+        args.metrics,
+        since=parse_time(args.since) if args.since else None,
+        until=parse_time(args.until) if args.until else None,
+        device_ids=args.devices,
+        workers=args.workers,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print("Summary:", json.dumps(report["summary"]))
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
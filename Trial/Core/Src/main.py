@@ -1,13 +1,23 @@
 import json
+import os
 import re
 import time
 import random
-import hashlib
-import hmac
 
-import requests
 import serial
 import secrets as app_secrets
+import metrics
+import record_hash
+import transport
+from atlas_writer import AtlasBatchWriter
+from merkle import AnchorBatch, TREE_ALGORITHM, build_levels, inclusion_path
+from metrics import MetricsServer
+from pipeline import Stage
+from readers import MqttUplinkReader, SerialReader, SERIAL_TRANSPORT
+from solana_anchor import AnchorWorker
+from spool import Rejected, Replayer, Spool
+from time_series_rollup import RollupStore
+from weather_cache import WeatherCache
 
 try:
     from solana.rpc.api import Client as SolanaClient
@@ -29,7 +39,7 @@ ATLAS_API_KEY = app_secrets.ATLAS_API_KEY
 ATLAS_DATA_SOURCE = app_secrets.ATLAS_DATA_SOURCE
 ATLAS_DB = app_secrets.ATLAS_DB
 ATLAS_COLLECTION = app_secrets.ATLAS_COLLECTION
-DEVICE_ID = app_secrets.DEVICE_ID
+DEVICE_ID = getattr(app_secrets, "DEVICE_ID", None)
 
 WEATHER_LAT = getattr(app_secrets, "WEATHER_LAT", 28.6139)
 WEATHER_LON = getattr(app_secrets, "WEATHER_LON", 77.2090)
@@ -38,40 +48,88 @@ SOLANA_RPC_URL = getattr(app_secrets, "SOLANA_RPC_URL", "https://api.devnet.sola
 SOLANA_PRIVATE_KEY_B58 = getattr(app_secrets, "SOLANA_PRIVATE_KEY_B58", "")
 SOLANA_MEMO_PROGRAM_ID = "MemoSq4gqABAXKb96qnH8TysNcWxMyWCqXgDLGmfcHr"
 ANCHOR_REQUIRED = getattr(app_secrets, "ANCHOR_REQUIRED", True)
+# "per-record" anchors every actualHash in its own memo; "merkle-batch" anchors
+# one Merkle root per batch and stores each record's inclusion path in its proof.
+ANCHOR_MODE = getattr(app_secrets, "ANCHOR_MODE", "per-record")
+ANCHOR_BATCH_SIZE = getattr(app_secrets, "ANCHOR_BATCH_SIZE", 64)
+ANCHOR_BATCH_WINDOW_SEC = getattr(app_secrets, "ANCHOR_BATCH_WINDOW_SEC", 30)
+# Async anchoring signs against a cached blockhash and returns the signature at
+# once; sending and confirmation run in the background and proof.solana.status
+# is updated in Atlas ("pending" -> "confirmed"/"finalized" or "failed").
+ANCHOR_ASYNC = getattr(app_secrets, "ANCHOR_ASYNC", True)
+ANCHOR_COMMITMENT = getattr(app_secrets, "ANCHOR_COMMITMENT", "confirmed")
+ANCHOR_CONFIRM_INTERVAL_SEC = getattr(app_secrets, "ANCHOR_CONFIRM_INTERVAL_SEC", 5)
+ANCHOR_BLOCKHASH_REFRESH_SEC = getattr(app_secrets, "ANCHOR_BLOCKHASH_REFRESH_SEC", 20)
+ANCHOR_MAX_ATTEMPTS = getattr(app_secrets, "ANCHOR_MAX_ATTEMPTS", 3)
 
-ATLAS_URL = f"https://data.mongodb-api.com/app/{ATLAS_APP_ID}/endpoint/data/v1/action/insertOne"
+ATLAS_ACTION_URL = f"https://data.mongodb-api.com/app/{ATLAS_APP_ID}/endpoint/data/v1/action"
+ATLAS_URL = f"{ATLAS_ACTION_URL}/insertOne"
+# The pipeline writes through insertMany once either threshold is reached.
+ATLAS_BATCH_SIZE = getattr(app_secrets, "ATLAS_BATCH_SIZE", 50)
+ATLAS_BATCH_MAX_AGE_SEC = getattr(app_secrets, "ATLAS_BATCH_MAX_AGE_SEC", 5)
 OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
 SERIAL_PORT = "COM5"  # Update to your STM32 COM port in Device Manager.
 BAUD_RATE = 115200
 SERIAL_TIMEOUT_SEC = 2
+# Readers feeding the shared pipeline, one per board or uplink subscription:
+#   {"type": "serial", "port": "COM5", "deviceId": "stm32-01", "baudRate": 115200, "lat": 11.56, "lon": 104.92}
+#   {"type": "mqtt", "host": "eu1.cloud.thethings.network", "port": 1883,
+#    "topic": "v3/<app-id>@ttn/devices/+/up", "username": "<app-id>@ttn", "password": "NNSXS...",
+#    "deviceIds": {"<ttn-device-id>": "<device id>"}, "locations": {"<device id>": [lat, lon]}}
+# Devices without a location use WEATHER_LAT/WEATHER_LON for weather.
+# Defaults to a single serial reader on SERIAL_PORT recorded as DEVICE_ID.
+DEVICES = getattr(app_secrets, "DEVICES", None)
 WEATHER_REFRESH_SEC = 300
+# Readings use cached weather only; a background thread refreshes each location tile
+# WEATHER_REFRESH_AHEAD_SEC before it expires and serves stale data up to WEATHER_MAX_STALE_SEC.
+WEATHER_REFRESH_AHEAD_SEC = getattr(app_secrets, "WEATHER_REFRESH_AHEAD_SEC", 60)
+WEATHER_MAX_STALE_SEC = getattr(app_secrets, "WEATHER_MAX_STALE_SEC", 3600)
+WEATHER_TILE_DEG = getattr(app_secrets, "WEATHER_TILE_DEG", 0.1)
+WEATHER_BATCH_SIZE = getattr(app_secrets, "WEATHER_BATCH_SIZE", 50)
+WEATHER_CACHE_PATH = getattr(app_secrets, "WEATHER_CACHE_PATH", None)  # e.g. "weather_cache.json"
+# 1h/1d/1w rollups of every reading, kept in memory and checkpointed here.
+ROLLUP_PATH = getattr(app_secrets, "ROLLUP_PATH", None)  # e.g. "rollups.json"
+# Buckets kept per series and tier, e.g. {"1h": 2160, "1d": 732, "1w": 530}; None uses those defaults.
+ROLLUP_RETENTION = getattr(app_secrets, "ROLLUP_RETENTION", None)
+PIPELINE_QUEUE_SIZE = getattr(app_secrets, "PIPELINE_QUEUE_SIZE", 1024)
+PIPELINE_INSERT_WORKERS = getattr(app_secrets, "PIPELINE_INSERT_WORKERS", 2)
+PIPELINE_METRICS_INTERVAL_SEC = getattr(app_secrets, "PIPELINE_METRICS_INTERVAL_SEC", 60)
+# Prometheus text endpoint at http://METRICS_HOST:METRICS_PORT/metrics; set the port to None to disable.
+METRICS_HOST = getattr(app_secrets, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT = getattr(app_secrets, "METRICS_PORT", 9108)
+# Built records are spooled to disk before any anchoring or insert; set to None to insert directly.
+SPOOL_DIR = getattr(app_secrets, "SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool"))
+SPOOL_FSYNC_EVERY = getattr(app_secrets, "SPOOL_FSYNC_EVERY", 32)
+SPOOL_FSYNC_INTERVAL_SEC = getattr(app_secrets, "SPOOL_FSYNC_INTERVAL_SEC", 1.0)
 
 LINE_PATTERN = re.compile(r"H=(?P<humidity>[0-9]+(?:\.[0-9]+)?)%,\s*T=(?P<temp>[0-9]+(?:\.[0-9]+)?)C")
 COMMAND_PATTERN = re.compile(r"^CMD:(?P<cmd>TEMP|MOISTURE|SALINITY|PH)$", re.IGNORECASE)
 
-_last_weather_fetch = 0
-_cached_weather = None
-
-
-def canonical_json(payload):
-    return json.dumps(payload, separators=(",", ":"), sort_keys=True)
+_anchor_batch = AnchorBatch(ANCHOR_BATCH_SIZE, ANCHOR_BATCH_WINDOW_SEC)
+_spool = None
+_anchor_worker = None
+_atlas_writer = AtlasBatchWriter(
+    ATLAS_ACTION_URL,
+    ATLAS_API_KEY,
+    ATLAS_DATA_SOURCE,
+    ATLAS_DB,
+    ATLAS_COLLECTION,
+    max_docs=ATLAS_BATCH_SIZE,
+    max_age_sec=ATLAS_BATCH_MAX_AGE_SEC,
+    session=transport.session("atlas"),
+)
 
 
+@metrics.instrumented("compute_actual_hash")
 def compute_actual_hash(payload):
-    canonical = canonical_json(payload).encode("utf-8")
-    return hashlib.sha256(canonical).hexdigest()
+    return record_hash.compute_actual_hash(payload)
 
 
 def compute_modified_hash(actual_hash_hex):
-    digest = hmac.new(
-        HASH_TWEAK_SECRET.encode("utf-8"),
-        actual_hash_hex.encode("utf-8"),
-        hashlib.sha256,
-    ).hexdigest()
-    return digest
+    return record_hash.compute_modified_hash(actual_hash_hex, HASH_TWEAK_SECRET)
 
 
-def anchor_hash_on_solana(actual_hash_hex):
+def require_solana():
     if (
         SolanaClient is None
         or Transaction is None
@@ -85,8 +143,9 @@ def anchor_hash_on_solana(actual_hash_hex):
     if not SOLANA_PRIVATE_KEY_B58:
         raise RuntimeError("SOLANA_PRIVATE_KEY_B58 is not configured in secrets.py")
 
-    client = SolanaClient(SOLANA_RPC_URL)
-    payer = Keypair.from_base58_string(SOLANA_PRIVATE_KEY_B58)
+
+def memo_transaction(actual_hash_hex, recent_blockhash):
+    payer = transport.payer_keypair(SOLANA_PRIVATE_KEY_B58)
 
     memo_program = Pubkey.from_string(SOLANA_MEMO_PROGRAM_ID)
     memo_instruction = Instruction(
@@ -95,10 +154,17 @@ def anchor_hash_on_solana(actual_hash_hex):
         accounts=[],
     )
 
-    latest = client.get_latest_blockhash()
-    recent_blockhash = latest.value.blockhash
     message = Message([memo_instruction], payer.pubkey())
-    tx = Transaction([payer], message, recent_blockhash)
+    return Transaction([payer], message, recent_blockhash)
+
+
+@metrics.instrumented("anchor_hash_on_solana")
+def anchor_hash_on_solana(actual_hash_hex):
+    require_solana()
+    client = transport.solana_client(SOLANA_RPC_URL)
+
+    latest = client.get_latest_blockhash()
+    tx = memo_transaction(actual_hash_hex, latest.value.blockhash)
     send_resp = client.send_transaction(tx)
     if getattr(send_resp, "value", None) is None:
         raise RuntimeError(f"Solana RPC error: {send_resp}")
@@ -106,49 +172,165 @@ def anchor_hash_on_solana(actual_hash_hex):
     return str(send_resp.value)
 
 
-def build_record(sensor_data, source, weather_payload):
+def solana_proof(tx_signature, error, status=None):
+    proof = {
+        "rpc": SOLANA_RPC_URL,
+        "memoProgram": SOLANA_MEMO_PROGRAM_ID,
+        "txSignature": tx_signature,
+        "error": error,
+    }
+    if status is not None:
+        proof["status"] = status
+    return proof
+
+
+def anchor_or_raise(hash_hex):
+    """Returns (txSignature, error, status); status is "pending" when the anchor worker sends it."""
+    try:
+        if _anchor_worker is not None:
+            return _anchor_worker.submit(hash_hex), None, "pending"
+        return anchor_hash_on_solana(hash_hex), None, None
+    except Exception as e:
+        if ANCHOR_REQUIRED:
+            raise RuntimeError(f"Blockchain anchor failed: {e}")
+        return None, str(e), None
+
+
+def record_anchor_status(signature, status, detail=None, new_signature=None):
+    """AnchorWorker callback: sets proof.solana on every stored record anchored by `signature`."""
+    fields = {"proof.solana.status": status}
+    if detail is not None:
+        fields["proof.solana.error"] = detail
+    if new_signature is not None:
+        fields["proof.solana.txSignature"] = new_signature
+    matched = _atlas_writer.update_many({"proof.solana.txSignature": signature}, {"$set": fields})
+    return matched > 0
+
+
+def anchored_hash(proof):
+    """The hash a proof's memo carries: the Merkle root when batched, else the record hash."""
+    merkle = proof.get("merkle")
+    return merkle["root"] if merkle else proof["actualHash"]
+
+
+def adopt_pending(proof):
+    """Hands a proof signed by an earlier run (status "pending") to the worker."""
+    solana = proof.get("solana") or {}
+    if _anchor_worker is None or solana.get("status") != "pending" or not solana.get("txSignature"):
+        return False
+    return _anchor_worker.adopt(solana["txSignature"], anchored_hash(proof))
+
+
+def reconcile_pending_anchors():
+    """
+    Adopts every stored record still "pending": signatures from a previous
+    run (stopped, crashed, or signed but never sent) are otherwise never
+    confirmed or re-signed.
+    """
+    projection = {"ts": 1, "proof.actualHash": 1, "proof.merkle.root": 1, "proof.solana": 1}
+    adopted = 0
+    for document in _atlas_writer.find({"proof.solana.status": "pending"}, projection):
+        if adopt_pending(document.get("proof", {})):
+            adopted += 1
+    return adopted
+
+
+def start_anchor_worker():
+    global _anchor_worker
+    if not ANCHOR_ASYNC:
+        return None
+    try:
+        require_solana()
+        client = transport.solana_client(SOLANA_RPC_URL)
+    except RuntimeError as e:
+        print("Async anchoring disabled:", e)
+        return None
+
+    _anchor_worker = AnchorWorker(
+        client,
+        SOLANA_RPC_URL,
+        memo_transaction,
+        record_anchor_status,
+        commitment=ANCHOR_COMMITMENT,
+        blockhash_refresh_sec=ANCHOR_BLOCKHASH_REFRESH_SEC,
+        confirm_interval_sec=ANCHOR_CONFIRM_INTERVAL_SEC,
+        max_attempts=ANCHOR_MAX_ATTEMPTS,
+    )
+    try:
+        _anchor_worker.blockhashes.refresh()
+    except Exception as e:
+        # Not fatal: the first anchor fetches it inline.
+        print("Initial blockhash fetch failed:", e)
+    try:
+        adopted = reconcile_pending_anchors()
+        if adopted:
+            print(f"Resumed {adopted} pending anchor(s)")
+    except Exception as e:
+        print("Pending anchor reconciliation failed:", e)
+    return _anchor_worker.start()
+
+
+def stop_anchor_worker():
+    global _anchor_worker
+    if _anchor_worker is not None:
+        _anchor_worker.stop()
+        _anchor_worker = None
+
+
+def build_record(sensor_data, source, weather_payload, anchor=True, ts=None, device_id=None, link=None):
     base_record = {
-        "deviceId": DEVICE_ID,
+        "deviceId": DEVICE_ID if device_id is None else device_id,
         "sensor": sensor_data,
         "weather": weather_payload,
-        "ts": int(time.time()),
+        "ts": int(time.time()) if ts is None else ts,
         "board": "stm32",
-        "transport": "wired-serial",
+        "transport": SERIAL_TRANSPORT if link is None else link,
         "source": source,
     }
 
     actual_hash = compute_actual_hash(base_record)
     modified_hash = compute_modified_hash(actual_hash)
 
-    solana_tx_sig = None
-    solana_error = None
-    try:
-        solana_tx_sig = anchor_hash_on_solana(actual_hash)
-    except Exception as e:
-        solana_error = str(e)
-        if ANCHOR_REQUIRED:
-            raise RuntimeError(f"Blockchain anchor failed: {solana_error}")
+    solana = solana_proof(None, None)
+    if anchor:
+        solana = solana_proof(*anchor_or_raise(actual_hash))
 
     base_record["proof"] = {
         "actualHash": actual_hash,
         "modifiedHash": modified_hash,
         "hashAlgorithm": "sha256",
         "modifiedHashAlgorithm": "hmac-sha256(actualHash, secret)",
-        "solana": {
-            "rpc": SOLANA_RPC_URL,
-            "memoProgram": SOLANA_MEMO_PROGRAM_ID,
-            "txSignature": solana_tx_sig,
-            "error": solana_error,
-        },
+        "solana": solana,
     }
 
     return base_record
 
 
+def anchor_records_merkle(records):
+    leaves = [record["proof"]["actualHash"] for record in records]
+    levels = build_levels(leaves)
+    root = levels[-1][0].hex()
+
+    anchor = anchor_or_raise(root)
+
+    for index, record in enumerate(records):
+        record["proof"]["merkle"] = {
+            "root": root,
+            "leafIndex": index,
+            "leafCount": len(records),
+            "path": inclusion_path(levels, index),
+            "algorithm": TREE_ALGORITHM,
+        }
+        record["proof"]["solana"] = solana_proof(*anchor)
+
+    return records
+
+
 def modified_hash_from_blockchain_hash(actual_hash_hex):
     return compute_modified_hash(actual_hash_hex)
 
 
+@metrics.instrumented("parse_stm_line")
 def parse_stm_line(line):
     match = LINE_PATTERN.search(line)
     if not match:
@@ -178,59 +360,75 @@ def create_dummy_measurement(command_name):
     return None
 
 
-def fetch_weather():
-    global _last_weather_fetch, _cached_weather
+WEATHER_FIELDS = (
+    ("temperature", "temperature_2m"),
+    ("humidity", "relative_humidity_2m"),
+    ("apparentTemperature", "apparent_temperature"),
+    ("precipitation", "precipitation"),
+    ("pressureMsl", "pressure_msl"),
+    ("cloudCover", "cloud_cover"),
+    ("windSpeed", "wind_speed_10m"),
+    ("windDirection", "wind_direction_10m"),
+    ("weatherCode", "weather_code"),
+)
+
 
-    now = int(time.time())
-    if _cached_weather is not None and (now - _last_weather_fetch) < WEATHER_REFRESH_SEC:
-        return _cached_weather
+def weather_from_current(current):
+    weather = {key: current.get(field) for key, field in WEATHER_FIELDS}
+    weather["observedAt"] = current.get("time")
+    return weather
 
+
+def fetch_weather_batch(locations):
+    """One Open-Meteo request for many (lat, lon) pairs; returns payloads in input order."""
     params = {
-        "latitude": WEATHER_LAT,
-        "longitude": WEATHER_LON,
-        "current": (
-            "temperature_2m,relative_humidity_2m,apparent_temperature,"
-            "precipitation,pressure_msl,cloud_cover,wind_speed_10m,"
-            "wind_direction_10m,weather_code"
-        ),
+        "latitude": ",".join(str(lat) for lat, _ in locations),
+        "longitude": ",".join(str(lon) for _, lon in locations),
+        "current": ",".join(field for _, field in WEATHER_FIELDS),
         "timezone": "auto",
     }
 
-    response = requests.get(OPEN_METEO_URL, params=params, timeout=10)
-    response.raise_for_status()
-    data = response.json()
-    current = data.get("current", {})
-
-    _cached_weather = {
-        "temperature": current.get("temperature_2m"),
-        "humidity": current.get("relative_humidity_2m"),
-        "apparentTemperature": current.get("apparent_temperature"),
-        "precipitation": current.get("precipitation"),
-        "pressureMsl": current.get("pressure_msl"),
-        "cloudCover": current.get("cloud_cover"),
-        "windSpeed": current.get("wind_speed_10m"),
-        "windDirection": current.get("wind_direction_10m"),
-        "weatherCode": current.get("weather_code"),
-        "observedAt": current.get("time"),
-    }
-    _last_weather_fetch = now
-    return _cached_weather
+    with metrics.timed("fetch_weather"):
+        response = transport.session("open-meteo").get(OPEN_METEO_URL, params=params, timeout=10)
+        response.raise_for_status()
+        data = response.json()
 
+    # A single coordinate comes back as one object, several as a list.
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(locations):
+        raise RuntimeError(f"Open-Meteo returned {len(results)} results for {len(locations)} locations")
+    return [weather_from_current(result.get("current", {})) for result in results]
 
-def send_to_atlas(sensor_data, source):
+
+def fetch_weather(lat=WEATHER_LAT, lon=WEATHER_LON):
+    """Blocking fetch for one location, bypassing the cache."""
+    return fetch_weather_batch([(lat, lon)])[0]
+
+
+_weather_cache = WeatherCache(
+    fetch_weather_batch,
+    ttl_sec=WEATHER_REFRESH_SEC,
+    refresh_ahead_sec=WEATHER_REFRESH_AHEAD_SEC,
+    max_stale_sec=WEATHER_MAX_STALE_SEC,
+    tile_deg=WEATHER_TILE_DEG,
+    batch_size=WEATHER_BATCH_SIZE,
+    persist_path=WEATHER_CACHE_PATH,
+)
+_device_locations = {}
+_rollups = RollupStore(retention=ROLLUP_RETENTION)
+
+
+def weather_location(device_id):
+    return _device_locations.get(device_id, (WEATHER_LAT, WEATHER_LON))
+
+
+@metrics.instrumented("atlas_insertOne")
+def insert_document(document):
     headers = {
         "Content-Type": "application/json",
         "api-key": ATLAS_API_KEY,
     }
 
-    weather_payload = None
-    try:
-        weather_payload = fetch_weather()
-    except Exception as e:
-        print("Weather API error:", e)
-
-    document = build_record(sensor_data, source, weather_payload)
-
     payload = {
         "dataSource": ATLAS_DATA_SOURCE,
         "database": ATLAS_DB,
@@ -240,7 +438,7 @@ def send_to_atlas(sensor_data, source):
 
     response = None
     try:
-        response = requests.post(
+        response = transport.session("atlas").post(
             ATLAS_URL,
             data=json.dumps(payload),
             headers=headers,
@@ -248,50 +446,515 @@ def send_to_atlas(sensor_data, source):
         )
         ok = (200 <= response.status_code < 300)
         body = response.text
+        if not ok:
+            metrics.error("atlas_insertOne")
         return ok, response.status_code, body
     except Exception as e:
+        metrics.error("atlas_insertOne")
         return False, -1, str(e)
     finally:
         if response is not None:
             response.close()
 
+
+def make_reading(sensor_data, source, device_id=None, link=None):
+    # Timestamp at read time so queueing delay never shifts the recorded ts.
+    return {
+        "sensor": sensor_data,
+        "source": source,
+        "ts": int(time.time()),
+        "deviceId": DEVICE_ID if device_id is None else device_id,
+        "transport": SERIAL_TRANSPORT if link is None else link,
+    }
+
+
+def reading_from_line(raw, device_id=None, link=None):
+    parsed = parse_stm_line(raw)
+    if parsed is not None:
+        temp_c, humidity = parsed
+        sensor = {
+            "temperature": temp_c,
+            "humidity": humidity,
+        }
+        return make_reading(sensor, "stm-dht11", device_id, link)
+
+    command = parse_dummy_command(raw)
+    if command is None:
+        return None
+
+    return make_reading(create_dummy_measurement(command), f"dummy-{command.lower()}", device_id, link)
+
+
+def record_from_reading(reading, weather_payload, anchor=True):
+    return build_record(
+        reading["sensor"],
+        reading["source"],
+        weather_payload,
+        anchor=anchor,
+        ts=reading["ts"],
+        device_id=reading.get("deviceId"),
+        link=reading.get("transport"),
+    )
+
+
+def flush_anchor_batch_documents(force=False):
+    if not len(_anchor_batch) or not (force or _anchor_batch.is_due()):
+        return []
+    # Drain only after the root is anchored: if anchoring raises, the batch
+    # stays queued and the next flush retries it with any newer readings.
+    documents = anchor_records_merkle(list(_anchor_batch.records))
+    _anchor_batch.drain()
+    return documents
+
+
+def flush_anchor_batch(force=False):
+    return [insert_document(document) for document in flush_anchor_batch_documents(force)]
+
+
+def current_weather(device_id=None):
+    """Cached weather for the device's location; None until its tile is first fetched."""
+    return _weather_cache.get(*weather_location(DEVICE_ID if device_id is None else device_id))
+
+
+def load_rollups():
+    global _rollups
+    if not ROLLUP_PATH:
+        return _rollups
+    try:
+        with open(ROLLUP_PATH, "r", encoding="utf-8") as f:
+            _rollups = RollupStore.from_dict(json.load(f), retention=ROLLUP_RETENTION)
+    except (OSError, ValueError) as e:
+        print("Starting with empty rollups:", e)
+    return _rollups
+
+
+def save_rollups():
+    if not ROLLUP_PATH:
+        return
+    tmp_path = ROLLUP_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_rollups.to_dict(), f)
+        os.replace(tmp_path, ROLLUP_PATH)
+    except OSError as e:
+        print("Rollups not saved:", e)
+
+
+def build_documents(reading):
+    """Weather, hashing and anchoring for one reading; returns the documents ready to insert."""
+    _rollups.add_record(reading)
+    weather_payload = current_weather(reading.get("deviceId"))
+
+    if ANCHOR_MODE == "merkle-batch":
+        _anchor_batch.add(record_from_reading(reading, weather_payload, anchor=False))
+        return flush_anchor_batch_documents()
+
+    return [record_from_reading(reading, weather_payload)]
+
+
+def spool_record(reading):
+    """Build stage when spooling: weather and hashing, then a durable local append."""
+    _rollups.add_record(reading)
+    weather_payload = current_weather(reading.get("deviceId"))
+    _spool.append(record_from_reading(reading, weather_payload, anchor=False))
+
+
+def needs_anchor(record):
+    solana = record["proof"]["solana"]
+    return solana["txSignature"] is None and solana["error"] is None
+
+
+# Atlas client errors that say nothing about the record itself (auth, routing,
+# throttling, conflicts); other 4xx replies reject the document for good.
+RETRYABLE_CLIENT_STATUSES = {401, 403, 404, 408, 409, 429}
+
+
+def is_rejected(status):
+    return 400 <= status < 500 and status not in RETRYABLE_CLIENT_STATUSES
+
+
+def is_deliverable(record):
+    proof = record.get("proof") if isinstance(record, dict) else None
+    return isinstance(proof, dict) and bool(proof.get("actualHash")) and isinstance(proof.get("solana"), dict)
+
+
+def anchored_proof(record):
+    return {key: record["proof"][key] for key in ("solana", "merkle") if key in record["proof"]}
+
+
+def anchor_spooled(records):
+    """
+    Anchors the records that have no anchor yet, restoring proofs saved by an
+    earlier attempt first. New proofs are saved in the spool's progress before
+    insertion, so a restart does not pay for the same anchor twice.
+    """
+    saved = _spool.load_progress()
+    for record in records:
+        proof = saved.get(record["proof"]["actualHash"])
+        if proof is not None and needs_anchor(record):
+            record["proof"].update(proof)
+            adopt_pending(record["proof"])
+
+    pending = [record for record in records if needs_anchor(record)]
+    if not pending:
+        return
+    try:
+        if ANCHOR_MODE == "merkle-batch":
+            anchor_records_merkle(pending)
+        else:
+            for record in pending:
+                record["proof"]["solana"] = solana_proof(*anchor_or_raise(record["proof"]["actualHash"]))
+    finally:
+        anchored = {r["proof"]["actualHash"]: anchored_proof(r) for r in pending if not needs_anchor(r)}
+        if anchored:
+            saved.update(anchored)
+            _spool.save_progress(saved)
+
+
+def forget_proofs(records):
+    saved = _spool.load_progress()
+    if saved:
+        for record in records:
+            saved.pop(record["proof"]["actualHash"], None)
+        _spool.save_progress(saved)
+
+
+def deliver_spooled(records):
+    """
+    Replayer callback: anchor what is not anchored yet, then insert the batch.
+    Records that are malformed or that Atlas rejects outright are raised as
+    Rejected (dead-lettered by the replayer) once the rest are stored.
+    """
+    invalid = [record for record in records if not is_deliverable(record)]
+    records = [record for record in records if is_deliverable(record)]
+
+    anchor_spooled(records)
+    results = _atlas_writer.write_batch(records)
+    report_results(results)
+
+    failed = [(record, status) for record, (ok, status, _) in zip(records, results) if not ok]
+    if any(not is_rejected(status) for _, status in failed):
+        return False
+
+    forget_proofs(records)
+    if invalid or failed:
+        reasons = [f"{len(invalid)} malformed"] if invalid else []
+        if failed:
+            reasons.append(f"{len(failed)} rejected by Atlas ({', '.join(sorted({str(s) for _, s in failed}))})")
+        raise Rejected(invalid + [record for record, _ in failed], "; ".join(reasons))
+    return True
+
+
+def send_to_atlas(sensor_data, source):
+    """Returns a list of (ok, status, body) for every document inserted by this call."""
+    return [insert_document(document) for document in build_documents(make_reading(sensor_data, source))]
+
+
+def report_results(results):
+    for ok, status, body in results:
+        if ok:
+            print("Inserted:", status, body)
+        else:
+            print("Insert failed:", status, body)
+
+
+def insert_and_report(document):
+    report_results(_atlas_writer.add(document))
+
+
+def flush_due_inserts():
+    report_results(_atlas_writer.flush_if_due())
+
+
+def open_spool():
+    global _spool
+    if _spool is None and SPOOL_DIR:
+        _spool = Spool(SPOOL_DIR, fsync_every=SPOOL_FSYNC_EVERY, fsync_interval_sec=SPOOL_FSYNC_INTERVAL_SEC)
+    return _spool
+
+
+def build_pipeline():
+    """
+    Reader -> build -> insert; only the reader runs on the serial thread.
+
+    With a spool, the build stage ends at the local append and a replayer
+    anchors and inserts from disk, so readings survive Atlas/Solana outages
+    and gateway restarts. Returns (stages, replayer).
+    """
+    if open_spool() is not None:
+        # Single worker: spool appends stay in reading order.
+        build_stage = Stage("build", spool_record, PIPELINE_QUEUE_SIZE, idle_handler=_spool.sync_if_due)
+        if ANCHOR_MODE == "merkle-batch":
+            replayer = Replayer(_spool, deliver_spooled, ANCHOR_BATCH_SIZE, ANCHOR_BATCH_WINDOW_SEC)
+        else:
+            replayer = Replayer(_spool, deliver_spooled, ATLAS_BATCH_SIZE, ATLAS_BATCH_MAX_AGE_SEC)
+        return {"build": build_stage}, replayer
+
+    insert_stage = Stage(
+        "insert",
+        insert_and_report,
+        PIPELINE_QUEUE_SIZE,
+        workers=PIPELINE_INSERT_WORKERS,
+        idle_handler=flush_due_inserts,
+    )
+    # Single worker: the Merkle batch is not shared across threads.
+    build_stage = Stage(
+        "build",
+        build_documents,
+        PIPELINE_QUEUE_SIZE,
+        downstream=insert_stage,
+        idle_handler=flush_anchor_batch_documents,
+    )
+    return {"build": build_stage, "insert": insert_stage}, None
+
+
+def start_pipeline(stages, replayer):
+    for stage in reversed(list(stages.values())):
+        stage.start()
+    if replayer is not None:
+        replayer.start()
+
+
+def close_pipeline(stages, replayer):
+    stages["build"].close()
+
+    if "insert" in stages:
+        try:
+            for document in flush_anchor_batch_documents(force=True):
+                stages["insert"].submit(document)
+        except RuntimeError as e:
+            print(f"Final Merkle batch not anchored, {len(_anchor_batch)} reading(s) not inserted:", e)
+        stages["insert"].close()
+        report_results(_atlas_writer.flush())
+
+    # Anything still spooled is replayed on the next start.
+    if replayer is not None:
+        replayer.stop()
+        _spool.close()
+
+
+def pipeline_metrics(stages, replayer):
+    report = {name: stage.snapshot() for name, stage in stages.items()}
+    if replayer is not None:
+        report["spool"] = {
+            "backlogBytes": _spool.backlog_bytes(),
+            "delivered": replayer.delivered,
+            "failures": replayer.failures,
+            "deadLettered": replayer.dead_lettered,
+        }
+    return report
+
+
+STAGE_SAMPLES = (
+    ("stage_queue_depth", "gauge", "queueDepth"),
+    ("stage_submitted_total", "counter", "submitted"),
+    ("stage_processed_total", "counter", "processed"),
+    ("stage_errors_total", "counter", "errors"),
+    ("stage_dropped_total", "counter", "dropped"),
+)
+
+
+def pipeline_samples(stages, replayer):
+    """Metrics collector: stage and spool state as Prometheus samples."""
+    report = pipeline_metrics(stages, replayer)
+    samples = []
+    for name in stages:
+        for sample, kind, key in STAGE_SAMPLES:
+            samples.append((sample, kind, {"stage": name}, report[name][key]))
+    if "spool" in report:
+        samples.append(("spool_backlog_bytes", "gauge", {}, report["spool"]["backlogBytes"]))
+        samples.append(("spool_delivered_total", "counter", {}, report["spool"]["delivered"]))
+        samples.append(("spool_failures_total", "counter", {}, report["spool"]["failures"]))
+        samples.append(("spool_dead_lettered_total", "counter", {}, report["spool"]["deadLettered"]))
+    return samples
+
+
+READER_SAMPLES = (
+    ("lines", "lines"),
+    ("bytes", "bytes"),
+    ("frames", "frames"),
+    ("droppedFrames", "dropped_frames"),
+    ("crcErrors", "crc_errors"),
+    ("reconnects", "reconnects"),
+    ("errors", "errors"),
+)
+
+
+def reader_samples(readers):
+    samples = []
+    for reader in readers:
+        snap = reader.stats.snapshot()
+        for key, name in READER_SAMPLES:
+            samples.append((f"reader_{name}_total", "counter", {"reader": reader.name}, snap[key]))
+    return samples
+
+
+def weather_samples():
+    snap = _weather_cache.snapshot()
+    samples = [("weather_cache_entries", "gauge", {}, snap["entries"])]
+    for key in ("hits", "stale", "misses", "refreshes", "failures"):
+        samples.append((f"weather_cache_{key}_total", "counter", {}, snap[key]))
+    return samples
+
+
+def rollup_samples():
+    return [("rollup_buckets", "gauge", {"tier": tier}, count) for tier, count in _rollups.bucket_count().items()]
+
+
+def anchor_samples():
+    if _anchor_worker is None:
+        return []
+    snap = _anchor_worker.snapshot()
+    samples = [("anchor_pending", "gauge", {}, snap["pending"])]
+    for key, name in (("signed", "signed"), ("sent", "sent"), ("sendErrors", "send_errors"),
+                      ("confirmed", "confirmed"), ("failed", "failed"), ("resigned", "resigned")):
+        samples.append((f"anchor_{name}_total", "counter", {}, snap[key]))
+    return samples
+
+
+def metrics_log_line(stages, replayer, readers=()):
+    """One JSON object per interval: stage/spool/reader state plus hot-path latencies and errors."""
+    return json.dumps({
+        "ts": int(time.time()),
+        "pipeline": pipeline_metrics(stages, replayer),
+        "readers": {reader.name: reader.stats.snapshot() for reader in readers},
+        "weather": _weather_cache.snapshot(),
+        "anchor": _anchor_worker.snapshot() if _anchor_worker is not None else None,
+        "operations": metrics.snapshot(),
+    })
+
+
+def start_metrics_server():
+    if METRICS_PORT is None:
+        return None
+    try:
+        server = MetricsServer(METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        print("Metrics endpoint disabled:", e)
+        return None
+    print(f"Metrics: http://{METRICS_HOST}:{server.port}/metrics")
+    return server
+
+
+def device_configs():
+    if DEVICES:
+        return DEVICES
+    return [{"type": "serial", "port": SERIAL_PORT, "deviceId": DEVICE_ID, "baudRate": BAUD_RATE}]
+
+
+def reading_handlers(build_stage):
+    """Reader callbacks; every reader thread submits into the same build stage."""
+    def submit(reading, raw):
+        if not build_stage.submit(reading, block=False):
+            print(f"Pipeline full, dropped reading from {reading['deviceId']}:", raw)
+
+    def on_line(raw, device_id, link):
+        print(f"STM[{device_id}]:", raw)
+        reading = reading_from_line(raw, device_id, link)
+        if reading is None:
+            print(f"Ignored line from {device_id} (unknown format)")
+            return
+        submit(reading, raw)
+
+    def on_sensor(sensor_data, source, device_id, link):
+        submit(make_reading(sensor_data, source, device_id, link), sensor_data)
+
+    return on_line, on_sensor
+
+
+def load_device_locations():
+    """Fills the device id -> (lat, lon) map used for weather lookups; returns every location."""
+    _device_locations.clear()
+    for config in device_configs():
+        if "lat" in config and "lon" in config and config.get("deviceId"):
+            _device_locations[config["deviceId"]] = (config["lat"], config["lon"])
+        for device_id, (lat, lon) in config.get("locations", {}).items():
+            _device_locations[device_id] = (lat, lon)
+    return [(WEATHER_LAT, WEATHER_LON)] + list(_device_locations.values())
+
+
+def build_readers(on_line, on_sensor):
+    readers = []
+    for config in device_configs():
+        kind = config.get("type", "serial")
+        if kind == "serial":
+            readers.append(SerialReader(
+                config["port"],
+                config.get("deviceId", DEVICE_ID),
+                on_line,
+                on_sensor,
+                baud_rate=config.get("baudRate", BAUD_RATE),
+                timeout=SERIAL_TIMEOUT_SEC,
+                opener=serial.Serial,
+            ))
+        elif kind == "mqtt":
+            readers.append(MqttUplinkReader(
+                config["host"],
+                config["topic"],
+                on_line,
+                on_sensor,
+                port=config.get("port", 1883),
+                username=config.get("username"),
+                password=config.get("password"),
+                device_ids=config.get("deviceIds"),
+                client_id=config.get("clientId"),
+            ))
+        else:
+            raise ValueError(f"Unknown device type in DEVICES: {kind}")
+    return readers
+
+
 def main():
-    print(f"Listening on {SERIAL_PORT} @ {BAUD_RATE}...")
     print("Supported dummy commands: CMD:TEMP, CMD:MOISTURE, CMD:SALINITY, CMD:PH")
     print(f"Solana RPC endpoint: {SOLANA_RPC_URL}")
+    print(f"Anchor mode: {ANCHOR_MODE}")
+
+    start_anchor_worker()
+    load_rollups()
+    stages, replayer = build_pipeline()
+    readers = build_readers(*reading_handlers(stages["build"]))
+    start_pipeline(stages, replayer)
+    metrics.REGISTRY.clear_collectors()
+    metrics.register_collector(lambda: pipeline_samples(stages, replayer))
+    metrics.register_collector(lambda: reader_samples(readers))
+    metrics.register_collector(weather_samples)
+    metrics.register_collector(anchor_samples)
+    metrics.register_collector(rollup_samples)
+    metrics_server = start_metrics_server()
+    last_metrics_log = time.monotonic()
 
-    with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=SERIAL_TIMEOUT_SEC) as ser:
+    # The only blocking weather fetch: fill known locations before the first reading.
+    _weather_cache.warm(load_device_locations())
+    _weather_cache.start()
+
+    try:
+        for reader in readers:
+            reader.start()
+
+        # Readers run until stopped; a serial reader also ends on an unrecoverable error.
         while True:
-            raw = ser.readline().decode("utf-8", errors="ignore").strip()
-            if not raw:
-                continue
-
-            print("STM:", raw)
-            parsed = parse_stm_line(raw)
-            if parsed is not None:
-                temp_c, humidity = parsed
-                sensor = {
-                    "temperature": temp_c,
-                    "humidity": humidity,
-                }
-                ok, status, body = send_to_atlas(sensor, source="stm-dht11")
-                if ok:
-                    print("Inserted:", status, body)
-                else:
-                    print("Insert failed:", status, body)
-                continue
-
-            command = parse_dummy_command(raw)
-            if command is None:
-                print("Ignored line (unknown format)")
-                continue
-
-            sensor = create_dummy_measurement(command)
-            ok, status, body = send_to_atlas(sensor, source=f"dummy-{command.lower()}")
-            if ok:
-                print("Inserted:", status, body)
-            else:
-                print("Insert failed:", status, body)
+            alive = [reader for reader in readers if reader.is_alive()]
+            if not alive:
+                break
+            alive[0].join(timeout=1.0)
+
+            if time.monotonic() - last_metrics_log >= PIPELINE_METRICS_INTERVAL_SEC:
+                print("Metrics:", metrics_log_line(stages, replayer, readers))
+                save_rollups()
+                last_metrics_log = time.monotonic()
+    finally:
+        for reader in readers:
+            reader.stop()
+        for reader in readers:
+            reader.join()
+        close_pipeline(stages, replayer)
+        # After the last inserts, so final statuses can find their records.
+        stop_anchor_worker()
+        _weather_cache.stop()
+        save_rollups()
+        print("Metrics:", metrics_log_line(stages, replayer, readers))
+        if metrics_server is not None:
+            metrics_server.stop()
 
 # -----------------------------------------------------------------------------
 # MQTT over TTN/TNN example 
@@ -385,4 +1048,5 @@ def main():
 # # llm_result = infer_from_filtered_history(filtered_history)
 # # print(llm_result)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Merkle tree helpers for batched proof anchoring.
+
+Leaves are the per-record `actualHash` values (hex SHA-256). Leaf and inner
+nodes are hashed with distinct prefixes (0x00 / 0x01, as in RFC 6962) so an
+inner node can never be passed off as a leaf. An odd node at the end of a level
+is promoted unchanged to the next level instead of being duplicated.
+"""
+
+import hashlib
+import time
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+TREE_ALGORITHM = "sha256(0x00|leaf), sha256(0x01|left|right), odd node promoted"
+
+
+def hash_leaf(leaf_hex):
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(leaf_hex)).digest()
+
+
+def hash_node(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def build_levels(leaf_hexes):
+    if not leaf_hexes:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+
+    levels = [[hash_leaf(h) for h in leaf_hexes]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = []
+        for i in range(0, len(level) - 1, 2):
+            parent.append(hash_node(level[i], level[i + 1]))
+        if len(level) % 2 == 1:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def merkle_root(leaf_hexes):
+    return build_levels(leaf_hexes)[-1][0].hex()
+
+
+def inclusion_path(levels, leaf_index):
+    """Sibling hashes from leaf to root, each tagged with the side it sits on."""
+    path = []
+    index = leaf_index
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            position = "left" if sibling < index else "right"
+            path.append({"position": position, "hash": level[sibling].hex()})
+        index //= 2
+    return path
+
+
+def root_from_path(leaf_hex, path):
+    node = hash_leaf(leaf_hex)
+    for step in path:
+        sibling = bytes.fromhex(step["hash"])
+        if step["position"] == "left":
+            node = hash_node(sibling, node)
+        else:
+            node = hash_node(node, sibling)
+    return node.hex()
+
+
+def verify_inclusion(leaf_hex, path, root_hex):
+    try:
+        return root_from_path(leaf_hex, path) == root_hex.lower()
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+class AnchorBatch:
+    """Collects records until either the count or the age window is reached."""
+
+    def __init__(self, max_size, max_age_sec):
+        self.max_size = max(1, int(max_size))
+        self.max_age_sec = max_age_sec
+        self.records = []
+        self.opened_at = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record):
+        if not self.records:
+            self.opened_at = time.monotonic()
+        self.records.append(record)
+
+    def is_due(self, now=None):
+        if not self.records:
+            return False
+        if len(self.records) >= self.max_size:
+            return True
+        if self.max_age_sec is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return (now - self.opened_at) >= self.max_age_sec
+
+    def drain(self):
+        records = self.records
+        self.records = []
+        self.opened_at = None
+        return records
@@ -0,0 +1,236 @@
+"""
+Hot-path timing and error metrics for the gateway.
+
+Operations (serial decoding, line parsing, hashing, Solana anchoring, weather
+fetch, Atlas POSTs) are timed with `timed(name)` or the `instrumented(name)`
+decorator into fixed-bucket latency histograms. Exceptions raised inside a
+timed block, and failures reported with `error(name)`, feed per-operation
+error counters. Collectors registered with `register_collector` add gauges
+and counters that are read at scrape time, such as stage queue depths.
+
+Everything is exported two ways: Prometheus text format from a small local
+HTTP endpoint (MetricsServer, GET /metrics), and `snapshot()` for the
+gateway's periodic JSON log line.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "gateway"
+DEFAULT_BUCKETS_SEC = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def bucket_quantile(buckets, counts, max_value, q):
+    """Upper bound of the bucket holding the q-quantile, capped at the largest value seen."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= q * total:
+            return min(buckets[index], max_value) if index < len(buckets) else max_value
+    return max_value
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS_SEC):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, value):
+        # bisect_left puts a value equal to a bound in that bucket (Prometheus "le").
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def state(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._max
+
+
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS_SEC):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._errors = {}
+        self._collectors = []
+
+    def histogram(self, operation):
+        with self._lock:
+            histogram = self._timings.get(operation)
+            if histogram is None:
+                histogram = self._timings[operation] = Histogram(self.buckets)
+                self._errors.setdefault(operation, 0)
+            return histogram
+
+    def observe(self, operation, elapsed_sec):
+        self.histogram(operation).observe(elapsed_sec)
+
+    def error(self, operation, amount=1):
+        with self._lock:
+            self._errors[operation] = self._errors.get(operation, 0) + amount
+
+    @contextmanager
+    def timed(self, operation):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.error(operation)
+            raise
+        finally:
+            self.observe(operation, time.perf_counter() - started)
+
+    def instrumented(self, operation):
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timed(operation):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def register_collector(self, collector):
+        """collector() returns [(name, type, labels dict, value), ...]; names get the PREFIX."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def clear_collectors(self):
+        with self._lock:
+            self._collectors = []
+
+    def _collected(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        samples = []
+        for collector in collectors:
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                print("Metrics collector error:", e)
+        return samples
+
+    def snapshot(self):
+        with self._lock:
+            timings = dict(self._timings)
+            errors = dict(self._errors)
+
+        operations = {}
+        for operation in sorted(set(timings) | set(errors)):
+            entry = {"errors": errors.get(operation, 0)}
+            histogram = timings.get(operation)
+            if histogram is not None:
+                counts, total, max_value = histogram.state()
+                count = sum(counts)
+                entry.update({
+                    "count": count,
+                    "avgMs": round(1000.0 * total / count, 3) if count else 0.0,
+                    "p50Ms": round(1000.0 * bucket_quantile(histogram.buckets, counts, max_value, 0.50), 3),
+                    "p95Ms": round(1000.0 * bucket_quantile(histogram.buckets, counts, max_value, 0.95), 3),
+                    "p99Ms": round(1000.0 * bucket_quantile(histogram.buckets, counts, max_value, 0.99), 3),
+                    "maxMs": round(1000.0 * max_value, 3),
+                })
+            operations[operation] = entry
+        return operations
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            timings = dict(self._timings)
+            errors = dict(self._errors)
+
+        duration = f"{PREFIX}_operation_duration_seconds"
+        lines = [
+            f"# HELP {duration} Latency of gateway hot-path operations.",
+            f"# TYPE {duration} histogram",
+        ]
+        for operation in sorted(timings):
+            counts, total, _ = timings[operation].state()
+            cumulative = 0
+            for bound, count in zip(timings[operation].buckets, counts):
+                cumulative += count
+                lines.append(f'{duration}_bucket{{operation="{operation}",le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{duration}_bucket{{operation="{operation}",le="+Inf"}} {cumulative}')
+            lines.append(f'{duration}_sum{{operation="{operation}"}} {total:.9g}')
+            lines.append(f'{duration}_count{{operation="{operation}"}} {cumulative}')
+
+        failures = f"{PREFIX}_operation_errors_total"
+        lines.append(f"# HELP {failures} Failed gateway hot-path operations.")
+        lines.append(f"# TYPE {failures} counter")
+        for operation in sorted(errors):
+            lines.append(f'{failures}{{operation="{operation}"}} {errors[operation]}')
+
+        typed = set()
+        for name, kind, labels, value in sorted(self._collected(), key=lambda s: s[0]):
+            full_name = f"{PREFIX}_{name}"
+            if full_name not in typed:
+                lines.append(f"# TYPE {full_name} {kind}")
+                typed.add(full_name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+            lines.append(f"{full_name}{{{label_text}}} {value}" if label_text else f"{full_name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+timed = REGISTRY.timed
+instrumented = REGISTRY.instrumented
+observe = REGISTRY.observe
+error = REGISTRY.error
+register_collector = REGISTRY.register_collector
+snapshot = REGISTRY.snapshot
+render = REGISTRY.render
+
+
+class MetricsServer:
+    """Serves GET /metrics in Prometheus text format on a background thread."""
+
+    def __init__(self, host, port, registry=REGISTRY):
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
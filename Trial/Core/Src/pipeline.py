@@ -0,0 +1,128 @@
+"""
+Bounded thread-pool pipeline stages for the gateway.
+
+Each Stage owns a bounded queue and one or more worker threads. A handler
+returns an iterable of outputs (or None) that are forwarded to the downstream
+stage with a blocking put, so a slow stage applies backpressure to the stage in
+front of it. The serial reader submits with block=False: when the first queue
+is full the reading is counted as dropped instead of stalling the UART.
+"""
+
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class StageMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.busy_sec = 0.0
+        self.max_latency_sec = 0.0
+
+    def count(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def observe(self, elapsed_sec, ok):
+        with self._lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.errors += 1
+            self.busy_sec += elapsed_sec
+            self.max_latency_sec = max(self.max_latency_sec, elapsed_sec)
+
+    def snapshot(self):
+        with self._lock:
+            handled = self.processed + self.errors
+            return {
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "avgLatencyMs": round(1000.0 * self.busy_sec / handled, 2) if handled else 0.0,
+                "maxLatencyMs": round(1000.0 * self.max_latency_sec, 2),
+            }
+
+
+class Stage:
+    def __init__(self, name, handler, maxsize, downstream=None, workers=1, idle_handler=None, idle_interval_sec=1.0):
+        self.name = name
+        self.handler = handler
+        self.downstream = downstream
+        self.workers = max(1, int(workers))
+        self.idle_handler = idle_handler
+        self.idle_interval_sec = idle_interval_sec
+        self.metrics = StageMetrics()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, item, block=True):
+        try:
+            self._queue.put(item, block=block)
+        except queue.Full:
+            self.metrics.count("dropped")
+            return False
+        self.metrics.count("submitted")
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """Lets queued items drain, then stops the workers."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def snapshot(self):
+        snap = self.metrics.snapshot()
+        snap["queueDepth"] = self.depth()
+        return snap
+
+    def _forward(self, outputs):
+        if outputs is None or self.downstream is None:
+            return
+        for output in outputs:
+            self.downstream.submit(output)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_interval_sec)
+            except queue.Empty:
+                if self.idle_handler is not None:
+                    try:
+                        self._forward(self.idle_handler())
+                    except Exception as e:
+                        self.metrics.count("errors")
+                        print(f"[{self.name}] idle error:", e)
+                continue
+
+            if item is _STOP:
+                return
+
+            started = time.perf_counter()
+            try:
+                outputs = self.handler(item)
+            except Exception as e:
+                self.metrics.observe(time.perf_counter() - started, ok=False)
+                print(f"[{self.name}] error:", e)
+                continue
+            self.metrics.observe(time.perf_counter() - started, ok=True)
+            self._forward(outputs)
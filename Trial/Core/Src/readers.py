@@ -0,0 +1,212 @@
+"""
+Concurrent uplink readers for a multi-device gateway.
+
+Every attached board gets its own reader thread, tagged with the device id
+its readings are recorded under:
+- SerialReader: one UART (an STM32 on a COM/tty port). Reads raw bytes into a
+  FrameDecoder, so binary frames (serial_frame.py) and text lines can share
+  the link. Reopens the port with backoff when it disappears, e.g. when a
+  board is unplugged.
+- MqttUplinkReader: a TTN/TNN (LoRaWAN) application uplink subscription.
+  Each end device id maps to a gateway device id; unmapped devices keep their
+  TTN id. frm_payload is decoded to the same text lines the boards print over
+  serial; a decoded_payload object is used as sensor data directly.
+
+Readers only decode lines and call `on_line(raw, device_id, transport)` or
+`on_sensor(sensor, source, device_id, transport)`. Building, anchoring and
+inserting stay in the shared pipeline.
+"""
+
+import base64
+import json
+import threading
+
+import serial
+
+import metrics
+from serial_frame import FRAME, FrameDecoder
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+SERIAL_TRANSPORT = "wired-serial"
+MQTT_TRANSPORT = "lorawan-mqtt"
+FRAME_SOURCE = "stm-frame"
+
+
+class ReaderStats:
+    def __init__(self, decoder=None):
+        self._lock = threading.Lock()
+        self.decoder = decoder
+        self.lines = 0
+        self.bytes = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    def count(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def snapshot(self):
+        framing = self.decoder.stats if self.decoder is not None else {}
+        with self._lock:
+            return {
+                "lines": self.lines,
+                "bytes": self.bytes,
+                "frames": framing.get("frames", 0),
+                "droppedFrames": framing.get("dropped", 0),
+                "crcErrors": framing.get("crcErrors", 0),
+                "reconnects": self.reconnects,
+                "errors": self.errors,
+            }
+
+
+class SerialReader:
+    def __init__(self, port, device_id, on_line, on_sensor, baud_rate=115200, timeout=2, opener=None, max_backoff_sec=30.0):
+        self.name = f"serial:{port}"
+        self.port = port
+        self.device_id = device_id
+        self.on_line = on_line
+        self.on_sensor = on_sensor
+        self.baud_rate = baud_rate
+        self.timeout = timeout
+        self.opener = opener or serial.Serial
+        self.max_backoff_sec = max_backoff_sec
+        self.decoder = FrameDecoder()
+        self.stats = ReaderStats(self.decoder)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with self.opener(self.port, self.baud_rate, timeout=self.timeout) as ser:
+                    print(f"Listening on {self.port} @ {self.baud_rate} as {self.device_id}...")
+                    backoff = 1.0
+                    self._read_stream(ser)
+            except (serial.SerialException, OSError) as e:
+                self.stats.count("reconnects")
+                print(f"[{self.name}] port error, reopening in {backoff:.0f}s:", e)
+                if self._stop.wait(backoff):
+                    return
+                backoff = min(self.max_backoff_sec, backoff * 2)
+            except Exception as e:
+                self.stats.count("errors")
+                print(f"[{self.name}] reader stopped:", e)
+                return
+
+    def _read_stream(self, ser):
+        while not self._stop.is_set():
+            # Whatever the UART has buffered, or block (up to the timeout) for one
+            # byte. Not timed: the wait is idle line time, not gateway latency.
+            data = ser.read(ser.in_waiting or 1)
+            if not data:
+                continue
+            self.stats.count("bytes", len(data))
+            with metrics.timed("serial_decode"):
+                for kind, item in self.decoder.feed(data):
+                    if kind == FRAME:
+                        if item.sensor:
+                            self.on_sensor(item.sensor, FRAME_SOURCE, item.device_id or self.device_id, SERIAL_TRANSPORT)
+                    else:
+                        self.stats.count("lines")
+                        self.on_line(item, self.device_id, SERIAL_TRANSPORT)
+
+
+class MqttUplinkReader:
+    def __init__(
+        self,
+        host,
+        topic,
+        on_line,
+        on_sensor,
+        port=1883,
+        username=None,
+        password=None,
+        device_ids=None,
+        client_id=None,
+        keepalive=60,
+    ):
+        if mqtt is None:
+            raise RuntimeError("Missing MQTT dependency. Install 'paho-mqtt'.")
+        self.name = f"mqtt:{host}/{topic}"
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.on_line = on_line
+        self.on_sensor = on_sensor
+        self.device_ids = device_ids or {}
+        self.keepalive = keepalive
+        self.stats = ReaderStats()
+        self._stopped = threading.Event()
+
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id or "")
+        else:
+            self.client = mqtt.Client(client_id=client_id or "")
+        if username:
+            self.client.username_pw_set(username=username, password=password)
+        if port == 8883:
+            self.client.tls_set()
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+
+    def start(self):
+        self.client.connect_async(self.host, self.port, keepalive=self.keepalive)
+        self.client.loop_start()
+        print(f"Subscribing to {self.topic} on {self.host}:{self.port}...")
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def join(self, timeout=None):
+        self._stopped.wait(timeout)
+
+    def is_alive(self):
+        return not self._stopped.is_set()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        # (Re)subscribe on every connect so a broker reconnect keeps the subscription.
+        client.subscribe(self.topic, qos=1)
+
+    def _on_message(self, client, userdata, message):
+        try:
+            self.stats.count("bytes", len(message.payload))
+            uplink = json.loads(message.payload.decode("utf-8"))
+            ttn_id = uplink.get("end_device_ids", {}).get("device_id")
+            device_id = self.device_ids.get(ttn_id, ttn_id)
+            payload = uplink.get("uplink_message", {})
+            if not device_id or not payload:
+                return
+
+            self.stats.count("lines")
+            if payload.get("decoded_payload"):
+                self.on_sensor(payload["decoded_payload"], "lorawan-decoded", device_id, MQTT_TRANSPORT)
+            elif payload.get("frm_payload"):
+                raw = base64.b64decode(payload["frm_payload"]).decode("utf-8", errors="ignore").strip()
+                self.on_line(raw, device_id, MQTT_TRANSPORT)
+        except Exception as e:
+            self.stats.count("errors")
+            print(f"[{self.name}] bad uplink:", e)
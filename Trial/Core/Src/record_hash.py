@@ -0,0 +1,82 @@
+"""
+Canonical record hashing shared by the gateway (main.py) and the verifier.
+
+actualHash is the SHA-256 of a record's canonical JSON without its `_id` and
+`proof` fields; canonical JSON is json.dumps(..., separators=(",", ":"),
+sort_keys=True). modifiedHash is HMAC-SHA256(actualHash, secret).
+
+The encoder and the keyed HMAC state are built once and reused, and stored
+documents are hashed through a shallow filtered view instead of a deep copy.
+record_hash_vectors.json holds golden vectors computed with the original
+implementation; `python record_hash.py` checks that every one still hashes
+byte for byte the same.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+from functools import lru_cache
+
+NON_HASHED_FIELDS = ("_id", "proof")
+GOLDEN_VECTORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "record_hash_vectors.json")
+
+_ENCODER = json.JSONEncoder(separators=(",", ":"), sort_keys=True)
+
+
+def canonical_json(payload):
+    return _ENCODER.encode(payload)
+
+
+def hashed_view(document):
+    """The fields covered by actualHash, sharing values with `document` (no copy of nested data)."""
+    return {key: value for key, value in document.items() if key not in NON_HASHED_FIELDS}
+
+
+def compute_actual_hash(payload):
+    return hashlib.sha256(canonical_json(payload).encode("utf-8")).hexdigest()
+
+
+def compute_document_hash(document):
+    """actualHash of a stored document, ignoring `_id` and `proof`."""
+    return compute_actual_hash(hashed_view(document))
+
+
+@lru_cache(maxsize=8)
+def _keyed_hmac(secret):
+    return hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+
+
+def compute_modified_hash(actual_hash_hex, secret):
+    mac = _keyed_hmac(secret).copy()
+    mac.update(actual_hash_hex.encode("utf-8"))
+    return mac.hexdigest()
+
+
+def check_golden_vectors(path=GOLDEN_VECTORS_PATH):
+    """Returns a list of mismatch messages, empty when every vector matches."""
+    with open(path, "r", encoding="utf-8") as f:
+        vectors = json.load(f)
+
+    failures = []
+    for vector in vectors:
+        name = vector["name"]
+        actual_hash = compute_document_hash(vector["document"])
+        if actual_hash != vector["actualHash"]:
+            failures.append(f"{name}: actualHash {actual_hash} != {vector['actualHash']}")
+        if canonical_json(hashed_view(vector["document"])) != vector["canonical"]:
+            failures.append(f"{name}: canonical JSON differs")
+        modified_hash = compute_modified_hash(vector["actualHash"], vector["secret"])
+        if modified_hash != vector["modifiedHash"]:
+            failures.append(f"{name}: modifiedHash {modified_hash} != {vector['modifiedHash']}")
+    return failures
+
+
+if __name__ == "__main__":
+    problems = check_golden_vectors()
+    for problem in problems:
+        print("FAIL:", problem)
+    if problems:
+        sys.exit(1)
+    print("PASS: all record hash golden vectors match")
@@ -0,0 +1,170 @@
+"""
+Binary sensor frames on the STM32 serial link, with text lines as fallback.
+
+Frame layout (little-endian):
+
+    A5 5A | version u8 | length u16 | body (length bytes) | crc u16
+
+    body = device id length u8 | device id (ASCII) | sequence u16 | fields
+    field = type u8 | size u8 | value
+
+CRC is CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over version, length and
+body. A 2-byte value is int16 hundredths of the unit (23.45 C -> 2345), a
+4-byte value is a float32. Field types are in FIELD_TYPES; unknown types are
+skipped, so boards can add metrics before the gateway knows them.
+
+FrameDecoder takes raw bytes as they arrive and returns frames and text lines
+in stream order. Frames are parsed in place from its buffer (struct.unpack_from
+and a memoryview for the CRC), so no per-frame copies are made. A bad CRC or
+an unknown version skips one byte and resyncs on the next magic. Sequence
+numbers are tracked per device; a gap counts the missing frames as dropped
+(a jump backwards is taken as a board restart).
+"""
+
+import binascii
+import struct
+from collections import namedtuple
+
+MAGIC = b"\xa5\x5a"
+VERSION = 1
+HEADER = struct.Struct("<BH")  # version, body length
+SEQUENCE = struct.Struct("<H")
+CRC = struct.Struct("<H")
+HEADER_SIZE = len(MAGIC) + HEADER.size
+MAX_BODY = 512
+MAX_LINE = 256
+CRC_INIT = 0xFFFF
+
+FIELD_TYPES = {
+    1: "temperature",
+    2: "humidity",
+    3: "moisture",
+    4: "salinity",
+    5: "ph",
+}
+FIELD_IDS = {name: field_type for field_type, name in FIELD_TYPES.items()}
+INT16 = struct.Struct("<h")
+FLOAT32 = struct.Struct("<f")
+
+FRAME = "frame"
+LINE = "line"
+
+Frame = namedtuple("Frame", "version device_id seq sensor")
+
+
+def encode_frame(device_id, seq, sensor):
+    """Reference encoder (what the firmware sends): int16 hundredths per known metric."""
+    device = device_id.encode("ascii")
+    body = bytearray([len(device)]) + device + SEQUENCE.pack(seq & 0xFFFF)
+    for name, value in sensor.items():
+        body += bytes([FIELD_IDS[name], INT16.size]) + INT16.pack(int(round(value * 100)))
+    header = HEADER.pack(VERSION, len(body))
+    crc = binascii.crc_hqx(header + body, CRC_INIT)
+    return MAGIC + header + bytes(body) + CRC.pack(crc)
+
+
+class FrameDecoder:
+    def __init__(self, max_line=MAX_LINE):
+        self.max_line = max_line
+        self.stats = {"frames": 0, "lines": 0, "crcErrors": 0, "malformed": 0, "dropped": 0, "skippedBytes": 0}
+        self._buf = bytearray()
+        self._last_seq = {}
+
+    def feed(self, data):
+        """Appends `data`; returns [(FRAME, Frame) or (LINE, str), ...] for everything now complete."""
+        self._buf += data
+        events = []
+        with memoryview(self._buf) as view:
+            consumed = self._parse(view, events)
+        # Compact: drop what was parsed, keep the partial tail.
+        del self._buf[:consumed]
+        return events
+
+    def pending(self):
+        return len(self._buf)
+
+    def _parse(self, view, events):
+        buf = self._buf
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            if buf[pos] == MAGIC[0] and (end - pos < 2 or buf[pos + 1] == MAGIC[1]):
+                if end - pos < HEADER_SIZE:
+                    break
+                version, length = HEADER.unpack_from(buf, pos + len(MAGIC))
+                if version != VERSION or length > MAX_BODY:
+                    self.stats["skippedBytes"] += 1
+                    pos += 1
+                    continue
+                frame_end = pos + HEADER_SIZE + length + CRC.size
+                if frame_end > end:
+                    break
+                body_end = frame_end - CRC.size
+                (crc,) = CRC.unpack_from(buf, body_end)
+                if binascii.crc_hqx(view[pos + len(MAGIC):body_end], CRC_INIT) != crc:
+                    self.stats["crcErrors"] += 1
+                    self.stats["skippedBytes"] += 1
+                    pos += 1
+                    continue
+                frame = self._decode_body(view, pos + HEADER_SIZE, body_end)
+                if frame is not None:
+                    events.append((FRAME, frame))
+                pos = frame_end
+                continue
+
+            newline = buf.find(b"\n", pos)
+            magic = buf.find(MAGIC, pos)
+            if magic != -1 and (newline == -1 or magic < newline):
+                # Unterminated text before a frame (e.g. a boot banner cut short).
+                self.stats["skippedBytes"] += magic - pos
+                pos = magic
+            elif newline != -1:
+                line = bytes(view[pos:newline]).decode("utf-8", errors="ignore").strip()
+                if line:
+                    self.stats["lines"] += 1
+                    events.append((LINE, line))
+                pos = newline + 1
+            elif end - pos > self.max_line:
+                self.stats["skippedBytes"] += end - pos
+                pos = end
+            else:
+                break
+        return pos
+
+    def _decode_body(self, view, start, stop):
+        buf = self._buf
+        device_len = buf[start]
+        seq_at = start + 1 + device_len
+        if seq_at + SEQUENCE.size > stop:
+            self.stats["malformed"] += 1
+            return None
+        device_id = bytes(view[start + 1:seq_at]).decode("ascii", errors="replace")
+        (seq,) = SEQUENCE.unpack_from(buf, seq_at)
+
+        sensor = {}
+        at = seq_at + SEQUENCE.size
+        while at + 2 <= stop:
+            field_type, size = buf[at], buf[at + 1]
+            at += 2
+            if at + size > stop:
+                self.stats["malformed"] += 1
+                return None
+            name = FIELD_TYPES.get(field_type)
+            if name is not None and size == INT16.size:
+                sensor[name] = INT16.unpack_from(buf, at)[0] / 100.0
+            elif name is not None and size == FLOAT32.size:
+                sensor[name] = round(FLOAT32.unpack_from(buf, at)[0], 4)
+            at += size
+
+        self._track_sequence(device_id, seq)
+        self.stats["frames"] += 1
+        return Frame(VERSION, device_id, seq, sensor)
+
+    def _track_sequence(self, device_id, seq):
+        last = self._last_seq.get(device_id)
+        self._last_seq[device_id] = seq
+        if last is None:
+            return
+        gap = (seq - last - 1) & 0xFFFF
+        if gap < 0x8000:
+            self.stats["dropped"] += gap
@@ -0,0 +1,303 @@
+"""
+Asynchronous Solana memo anchoring.
+
+The reading path only signs: AnchorWorker.submit() builds the memo
+transaction against a cached recent blockhash (refreshed in the background
+well inside its ~60s validity), takes the signature from the signed
+transaction and returns it immediately. A sender thread broadcasts queued
+transactions with preflight skipped, and a confirmer thread checks every
+outstanding signature in bulk with getSignatureStatuses (256 per call).
+
+Pending state lives in memory only. Records carry their signature and
+status "pending" until an outcome is recorded, so after a restart (or a
+crash, or signatures left unconfirmed by stop()) the gateway hands them back
+with adopt(). An adopted signature is confirmed if it reached the chain and
+re-signed once its blockhash must have expired otherwise, the same as a
+dropped transaction.
+
+Outcomes are reported through `on_status(signature, status, detail,
+new_signature)`, which returns True once the update has been recorded (for
+the gateway, once Atlas matched the record). Unrecorded outcomes are retried
+on the next round, since a record can be confirmed on chain before it is
+inserted. Signatures still unseen are rebroadcast while their blockhash is
+valid, and re-signed with a fresh blockhash once it has expired (reported as
+status "pending" with the new signature) up to `max_attempts` times.
+"""
+
+import queue
+import threading
+import time
+
+import metrics
+import transport
+
+try:
+    from solana.rpc.types import TxOpts
+except ImportError:
+    TxOpts = None
+
+SIGNATURE_STATUS_BATCH = 256  # getSignatureStatuses accepts at most 256 signatures per call
+COMMITMENT_RANK = {"processed": 0, "confirmed": 1, "finalized": 2}
+
+
+def fetch_signature_statuses(rpc_url, signatures):
+    """Returns {signature: status or None}, batching up to 256 signatures per RPC call."""
+    statuses = {}
+    unique = list(dict.fromkeys(sig for sig in signatures if sig))
+    for i in range(0, len(unique), SIGNATURE_STATUS_BATCH):
+        chunk = unique[i:i + SIGNATURE_STATUS_BATCH]
+        rpc_payload = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "getSignatureStatuses",
+            "params": [chunk, {"searchTransactionHistory": True}],
+        }
+
+        response = transport.session("solana-rpc").post(rpc_url, json=rpc_payload, timeout=15)
+        response.raise_for_status()
+        body = response.json()
+
+        value = body.get("result", {}).get("value", [])
+        for index, signature in enumerate(chunk):
+            statuses[signature] = value[index] if index < len(value) else None
+    return statuses
+
+
+class BlockhashCache:
+    def __init__(self, client, refresh_interval_sec=20.0, max_age_sec=50.0):
+        self.client = client
+        self.refresh_interval_sec = refresh_interval_sec
+        self.max_age_sec = max_age_sec
+        self._lock = threading.Lock()
+        self._blockhash = None
+        self._fetched_at = 0.0
+
+    def refresh(self):
+        with metrics.timed("solana_blockhash"):
+            blockhash = self.client.get_latest_blockhash().value.blockhash
+        with self._lock:
+            self._blockhash = blockhash
+            self._fetched_at = time.monotonic()
+        return blockhash
+
+    def get(self):
+        """The cached blockhash; fetched inline only when missing or too old to sign with."""
+        with self._lock:
+            if self._blockhash is not None and time.monotonic() - self._fetched_at < self.max_age_sec:
+                return self._blockhash
+        return self.refresh()
+
+    def refresh_if_due(self):
+        with self._lock:
+            due = self._blockhash is None or time.monotonic() - self._fetched_at >= self.refresh_interval_sec
+        if due:
+            self.refresh()
+
+
+class _Pending:
+    __slots__ = ("hash_hex", "tx", "signature", "signed_at", "sent_at", "attempts", "outcome")
+
+    def __init__(self, hash_hex, tx, signature, attempts):
+        self.hash_hex = hash_hex
+        self.tx = tx
+        self.signature = signature
+        self.signed_at = time.monotonic()
+        self.sent_at = None
+        self.attempts = attempts
+        self.outcome = None  # (status, detail, new_signature) waiting to be recorded
+
+
+class AnchorWorker:
+    def __init__(
+        self,
+        client,
+        rpc_url,
+        sign_memo,
+        on_status,
+        commitment="confirmed",
+        blockhash_refresh_sec=20.0,
+        confirm_interval_sec=5.0,
+        rebroadcast_sec=10.0,
+        expire_after_sec=90.0,
+        max_attempts=3,
+        outcome_retry_sec=3600.0,
+    ):
+        """sign_memo(hash_hex, blockhash) returns a signed transaction for the memo."""
+        self.client = client
+        self.rpc_url = rpc_url
+        self.sign_memo = sign_memo
+        self.on_status = on_status
+        self.commitment = commitment
+        self.blockhashes = BlockhashCache(client, refresh_interval_sec=blockhash_refresh_sec)
+        self.confirm_interval_sec = confirm_interval_sec
+        self.rebroadcast_sec = rebroadcast_sec
+        self.expire_after_sec = expire_after_sec
+        self.max_attempts = max(1, int(max_attempts))
+        self.outcome_retry_sec = outcome_retry_sec
+        self.stats = {"signed": 0, "adopted": 0, "sent": 0, "sendErrors": 0, "confirmed": 0, "failed": 0, "resigned": 0}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._send_queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # -- hot path -------------------------------------------------------------
+
+    def submit(self, hash_hex):
+        """Signs a memo for hash_hex and queues it for sending; returns the signature."""
+        return self._sign(hash_hex, attempts=1).signature
+
+    def adopt(self, signature, hash_hex, attempts=1):
+        """
+        Tracks a signature signed before this worker existed (no transaction
+        bytes, so it cannot be rebroadcast). Returns False if already tracked.
+        """
+        entry = _Pending(hash_hex, None, signature, attempts)
+        with self._lock:
+            if signature in self._pending:
+                return False
+            self._pending[signature] = entry
+            self.stats["adopted"] += 1
+        return True
+
+    def _sign(self, hash_hex, attempts):
+        with metrics.timed("anchor_sign"):
+            tx = self.sign_memo(hash_hex, self.blockhashes.get())
+        entry = _Pending(hash_hex, tx, str(tx.signatures[0]), attempts)
+        with self._lock:
+            self._pending[entry.signature] = entry
+            self.stats["signed"] += 1
+        self._send_queue.put(entry)
+        return entry
+
+    # -- background -----------------------------------------------------------
+
+    def start(self):
+        for name, target in (("anchor-sender", self._send_loop), ("anchor-confirmer", self._confirm_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Sends whatever is queued, runs a last confirmation round, then stops."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._drain_send_queue()
+        try:
+            self.confirm_once()
+        except Exception as e:
+            print("Anchor confirmation error:", e)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def snapshot(self):
+        with self._lock:
+            snap = dict(self.stats)
+            snap["pending"] = len(self._pending)
+        return snap
+
+    def _send(self, entry):
+        opts = TxOpts(skip_preflight=True) if TxOpts is not None else None
+        try:
+            with metrics.timed("anchor_send"):
+                self.client.send_raw_transaction(bytes(entry.tx), opts=opts)
+        except Exception as e:
+            with self._lock:
+                self.stats["sendErrors"] += 1
+            print(f"Anchor send failed for {entry.signature} (will retry):", e)
+            return
+        entry.sent_at = time.monotonic()
+        with self._lock:
+            self.stats["sent"] += 1
+
+    def _drain_send_queue(self):
+        while True:
+            try:
+                self._send(self._send_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            try:
+                entry = self._send_queue.get(timeout=1.0)
+            except queue.Empty:
+                try:
+                    self.blockhashes.refresh_if_due()
+                except Exception as e:
+                    print("Blockhash refresh failed:", e)
+                continue
+            self._send(entry)
+
+    def _confirm_loop(self):
+        while not self._stop.wait(self.confirm_interval_sec):
+            try:
+                self.confirm_once()
+            except Exception as e:
+                print("Anchor confirmation error:", e)
+
+    def confirm_once(self):
+        """One bulk status round over every outstanding signature."""
+        with self._lock:
+            entries = list(self._pending.values())
+        unresolved = [e for e in entries if e.outcome is None]
+        if unresolved:
+            with metrics.timed("anchor_confirm"):
+                statuses = fetch_signature_statuses(self.rpc_url, [e.signature for e in unresolved])
+            now = time.monotonic()
+            for entry in unresolved:
+                self._resolve(entry, statuses.get(entry.signature), now)
+
+        for entry in entries:
+            if entry.outcome is not None:
+                self._record(entry)
+
+    def _resolve(self, entry, status, now):
+        if status is not None:
+            if status.get("err") is not None:
+                entry.outcome = ("failed", f"On-chain error: {status.get('err')}", None)
+            elif COMMITMENT_RANK.get(status.get("confirmationStatus"), -1) >= COMMITMENT_RANK[self.commitment]:
+                entry.outcome = (status.get("confirmationStatus"), None, None)
+            return
+
+        age = now - entry.signed_at
+        if age >= self.expire_after_sec:
+            if entry.attempts >= self.max_attempts:
+                entry.outcome = ("failed", f"Not confirmed after {entry.attempts} attempt(s)", None)
+                return
+            try:
+                replacement = self._sign(entry.hash_hex, entry.attempts + 1)
+            except Exception as e:
+                print(f"Anchor re-sign failed for {entry.signature}:", e)
+                return
+            with self._lock:
+                self.stats["resigned"] += 1
+            entry.outcome = ("pending", None, replacement.signature)
+        elif entry.tx is not None and (entry.sent_at is None or now - entry.sent_at >= self.rebroadcast_sec):
+            # Dropped or never sent: the same signed bytes are safe to send again.
+            entry.sent_at = now
+            self._send_queue.put(entry)
+
+    def _record(self, entry):
+        status, detail, new_signature = entry.outcome
+        try:
+            recorded = self.on_status(entry.signature, status, detail, new_signature)
+        except Exception as e:
+            print(f"Anchor status update failed for {entry.signature}:", e)
+            recorded = False
+
+        expired = time.monotonic() - entry.signed_at >= self.outcome_retry_sec
+        if recorded or expired:
+            if not recorded:
+                print(f"Giving up recording anchor status {status} for {entry.signature}")
+            with self._lock:
+                self._pending.pop(entry.signature, None)
+                if status == "failed":
+                    self.stats["failed"] += 1
+                elif new_signature is None:
+                    self.stats["confirmed"] += 1
@@ -0,0 +1,340 @@
+"""
+Durable on-disk spool for built records, drained by a background replayer.
+
+Records are appended to numbered segment files as length + CRC32 framed JSON.
+Appends are flushed to the OS immediately and fsync'd in groups (every
+`fsync_every` records or `fsync_interval_sec` seconds), so a power cut loses at
+most that window. A torn entry at the tail of the last segment is truncated on
+open. `index.json` holds the replay cursor (segment, offset) and is replaced
+atomically; segments entirely behind the cursor are deleted on commit.
+
+The Replayer hands batches to a delivery callback and commits the cursor only
+after the callback succeeds. On failure the same batch objects are retried
+with exponential backoff, so a callback can record partial progress on them
+(e.g. an anchor signature) and skip that work on the next attempt. Progress
+that must survive a restart goes to `progress.json` through save_progress();
+its contents are up to the callback.
+
+A callback that finds records it can never deliver (rejected as invalid)
+raises Rejected after delivering the rest. Those records are appended to
+`dead-letter.log` (same framing, with the reason) and the batch is committed,
+so one bad record does not block everything spooled behind it.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+HEADER = struct.Struct(">II")  # payload length, crc32
+INDEX_NAME = "index.json"
+PROGRESS_NAME = "progress.json"
+DEAD_LETTER_NAME = "dead-letter.log"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+
+
+def _fsync_dir(directory):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _entry(record):
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_entry(f):
+    """Returns the decoded payload, or None at EOF / on a torn or corrupt entry."""
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    length, crc = HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+
+class Rejected(Exception):
+    """Raised by a delivery callback for records that will never be accepted."""
+
+    def __init__(self, records, reason):
+        super().__init__(reason)
+        self.records = records
+        self.reason = reason
+
+
+class Spool:
+    def __init__(self, directory, segment_max_bytes=8 * 1024 * 1024, fsync_every=32, fsync_interval_sec=1.0):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_every = max(1, int(fsync_every))
+        self.fsync_interval_sec = fsync_interval_sec
+        self._lock = threading.RLock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self._cursor = self._load_index()
+
+        segments = self._segments()
+        self._write_seq = segments[-1] if segments else max(self._cursor[0], 1)
+        self._repair_tail(self._write_seq)
+        self._writer = open(self._segment_path(self._write_seq), "ab")
+
+    # -- layout -------------------------------------------------------------
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        seqs = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                seqs.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(seqs)
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_NAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return int(index["segment"]), int(index["offset"])
+        except (OSError, ValueError, KeyError):
+            segments = self._segments()
+            return (segments[0] if segments else 1), 0
+
+    def _write_json(self, name, data):
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(self.directory)
+
+    def _write_index(self, cursor):
+        self._write_json(INDEX_NAME, {"segment": cursor[0], "offset": cursor[1]})
+
+    def _repair_tail(self, seq):
+        path = self._segment_path(seq)
+        if not os.path.exists(path):
+            return
+        valid = 0
+        with open(path, "rb") as f:
+            while _read_entry(f) is not None:
+                valid = f.tell()
+        if valid < os.path.getsize(path):
+            print(f"Spool: truncating torn tail of {path} at byte {valid}")
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+
+    # -- writing ------------------------------------------------------------
+
+    def append(self, record):
+        entry = _entry(record)
+        with self._lock:
+            self._writer.write(entry)
+            self._writer.flush()
+            self._unsynced += 1
+
+            if self._writer.tell() >= self.segment_max_bytes:
+                self._rotate()
+            elif self._unsynced >= self.fsync_every:
+                self.sync()
+
+    def sync_if_due(self):
+        with self._lock:
+            if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval_sec:
+                self.sync()
+
+    def sync(self):
+        with self._lock:
+            if self._unsynced:
+                os.fsync(self._writer.fileno())
+                self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def _rotate(self):
+        self.sync()
+        self._writer.close()
+        self._write_seq += 1
+        self._writer = open(self._segment_path(self._write_seq), "ab")
+        _fsync_dir(self.directory)
+
+    # -- reading ------------------------------------------------------------
+
+    def read_batch(self, max_records):
+        """Returns (records, cursor_after); pass the cursor to commit() once delivered."""
+        records = []
+        with self._lock:
+            seq, offset = self._cursor
+            while len(records) < max_records:
+                path = self._segment_path(seq)
+                if not os.path.exists(path):
+                    if seq >= self._write_seq:
+                        break
+                    seq, offset = seq + 1, 0
+                    continue
+
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while len(records) < max_records:
+                        record = _read_entry(f)
+                        if record is None:
+                            break
+                        records.append(record)
+                        offset = f.tell()
+                    at_end = offset >= os.path.getsize(path)
+
+                if len(records) >= max_records:
+                    break
+                if seq >= self._write_seq:
+                    break
+                if not at_end:
+                    print(f"Spool: skipping corrupt remainder of {path} from byte {offset}")
+                seq, offset = seq + 1, 0
+
+        return records, (seq, offset)
+
+    def commit(self, cursor):
+        with self._lock:
+            self._cursor = cursor
+            self._write_index(cursor)
+            for seq in self._segments():
+                if seq < cursor[0]:
+                    os.remove(self._segment_path(seq))
+
+    def load_progress(self):
+        try:
+            with open(os.path.join(self.directory, PROGRESS_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_progress(self, progress):
+        """Durably replaces the delivery callback's progress (any JSON object)."""
+        with self._lock:
+            self._write_json(PROGRESS_NAME, progress)
+
+    def dead_letter(self, records, reason):
+        with self._lock:
+            with open(os.path.join(self.directory, DEAD_LETTER_NAME), "ab") as f:
+                for record in records:
+                    f.write(_entry({"reason": reason, "deadLetteredAt": int(time.time()), "record": record}))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read_dead_letters(self):
+        entries = []
+        try:
+            with open(os.path.join(self.directory, DEAD_LETTER_NAME), "rb") as f:
+                while True:
+                    entry = _read_entry(f)
+                    if entry is None:
+                        return entries
+                    entries.append(entry)
+        except OSError:
+            return entries
+
+    def backlog_bytes(self):
+        with self._lock:
+            total = 0
+            for seq in self._segments():
+                if seq < self._cursor[0]:
+                    continue
+                size = os.path.getsize(self._segment_path(seq))
+                total += size - (self._cursor[1] if seq == self._cursor[0] else 0)
+            return total
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            self._writer.close()
+
+
+class Replayer:
+    def __init__(self, spool, deliver, batch_size, max_wait_sec, idle_sec=0.5, max_backoff_sec=60.0):
+        self.spool = spool
+        self.deliver = deliver
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait_sec = max_wait_sec
+        self.idle_sec = idle_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.delivered = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="spool-replayer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def drain_once(self, force=False):
+        """Delivers at most one batch. Returns the number of records committed."""
+        records, cursor = self.spool.read_batch(self.batch_size)
+        if not records:
+            return 0
+        if not self._deliver_with_backoff(records, retry=not force):
+            return 0
+        self.spool.commit(cursor)
+        self.delivered += len(records)
+        return len(records)
+
+    def _deliver_with_backoff(self, records, retry=True):
+        backoff = 1.0
+        while True:
+            try:
+                if self.deliver(records):
+                    return True
+                error = "delivery incomplete"
+            except Rejected as e:
+                # Everything else in the batch was delivered; park the rest.
+                self.spool.dead_letter(e.records, e.reason)
+                self.dead_lettered += len(e.records)
+                print(f"Spool: dead-lettered {len(e.records)} record(s):", e.reason)
+                return True
+            except Exception as e:
+                error = str(e)
+            self.failures += 1
+            print(f"Spool replay failed ({len(records)} records), retrying in {backoff:.0f}s:", error)
+            if not retry or self._stop.wait(backoff):
+                return False
+            backoff = min(self.max_backoff_sec, backoff * 2)
+
+    def _run(self):
+        first_seen = None
+        while not self._stop.is_set():
+            self.spool.sync_if_due()
+            records, _ = self.spool.read_batch(self.batch_size)
+            if not records:
+                first_seen = None
+                self._stop.wait(self.idle_sec)
+                continue
+
+            # Let a batch fill up, but never hold the oldest record past max_wait_sec.
+            if len(records) < self.batch_size:
+                first_seen = first_seen or time.monotonic()
+                if time.monotonic() - first_seen < self.max_wait_sec:
+                    self._stop.wait(self.idle_sec)
+                    continue
+
+            first_seen = None
+            self.drain_once()
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The gateway modules are flat scripts run from Src/; import them the same way.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# main.py and verify_record.py read their settings from a `secrets` module;
+# use the benchmark's stand-in values.
+import benchmark  # noqa: E402,F401
@@ -0,0 +1,113 @@
+"""
+A Data API `find` stand-in with BSON comparison semantics, for paging tests.
+
+Stored `_id`s are either strings or ObjectId; like the Data API, ObjectIds are
+returned as plain 24-hex strings and must be sent back as {"$oid": ...}.
+Comparisons follow BSON type bracketing: $gt/$lt only match values of the
+same type, and sorting puts strings before ObjectIds.
+"""
+
+from json import dumps, loads
+
+TYPE_ORDER = {"number": 1, "string": 2, "objectId": 7}
+
+
+class ObjectId(str):
+    pass
+
+
+def _type(value):
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, str):
+        return "string"
+    return "number"
+
+
+def _decode(value):
+    if isinstance(value, dict) and "$oid" in value:
+        return ObjectId(value["$oid"])
+    return value
+
+
+def _same(a, b):
+    return a is not None and b is not None and _type(a) == _type(b)
+
+
+def _lookup(document, dotted):
+    value = document
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def matches(document, filter_doc):
+    for path, cond in filter_doc.items():
+        if path == "$and":
+            if not all(matches(document, sub) for sub in cond):
+                return False
+            continue
+        if path == "$or":
+            if not any(matches(document, sub) for sub in cond):
+                return False
+            continue
+        value = _lookup(document, path)
+        if not isinstance(cond, dict) or "$oid" in cond:
+            cond = _decode(cond)
+            if not (_same(value, cond) and value == cond):
+                return False
+            continue
+        for op, operand in cond.items():
+            if op in ("$in", "$nin"):
+                hit = any(_same(value, v) and value == v for v in map(_decode, operand))
+                if hit != (op == "$in"):
+                    return False
+                continue
+            operand = _decode(operand)
+            if not _same(value, operand):
+                return False
+            if op == "$gt" and not value > operand:
+                return False
+            if op == "$gte" and not value >= operand:
+                return False
+            if op == "$lt" and not value < operand:
+                return False
+    return True
+
+
+def sort_key(document):
+    doc_id = document["_id"]
+    return document.get("ts", 0), TYPE_ORDER[_type(doc_id)], doc_id
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self._body = body
+        self.status_code = status_code
+        self.text = dumps(body)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+    def close(self):
+        pass
+
+
+class FakeFindSession:
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = 0
+
+    def post(self, url, headers=None, data=None, json=None, timeout=None):
+        body = loads(data)
+        self.calls += 1
+        found = sorted((d for d in self.documents if matches(d, body.get("filter", {}))), key=sort_key)
+        found = found[body.get("skip", 0):][:body.get("limit", len(found))]
+        # ObjectIds go over the wire as plain strings.
+        return FakeResponse({"documents": [dict(d, _id=str(d["_id"])) for d in found]})
+
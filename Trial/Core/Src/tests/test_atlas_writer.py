@@ -0,0 +1,100 @@
+import json
+
+from atlas_writer import AtlasBatchWriter
+
+DUPLICATE = '{"error": "E11000 duplicate key error collection: db.readings index: _id_"}'
+
+
+class StubResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def close(self):
+        pass
+
+
+class StubSession:
+    """Replies from `reply(action, body)` -> (status, text); records each request."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        action = url.rsplit("/", 1)[-1]
+        body = json.loads(data)
+        self.requests.append((action, body))
+        return StubResponse(*self.reply(action, body))
+
+
+def make_writer(reply, **kwargs):
+    session = StubSession(reply)
+    writer = AtlasBatchWriter("https://data.example/action", "key", "src", "db", "readings", session=session, **kwargs)
+    return writer, session
+
+
+def record(hash_hex):
+    return {"ts": 1, "proof": {"actualHash": hash_hex}}
+
+
+def test_insert_many_sets_proof_ids():
+    writer, session = make_writer(lambda action, body: (201, json.dumps({"insertedIds": [d["_id"] for d in body["documents"]]})))
+    results = writer.write_batch([record("a"), record("b")])
+    assert [ok for ok, _, _ in results] == [True, True]
+    assert [action for action, _ in session.requests] == ["insertMany"]
+    assert [d["_id"] for d in session.requests[0][1]["documents"]] == ["a", "b"]
+
+
+def test_partial_insert_many_falls_back_to_insert_one():
+    def reply(action, body):
+        if action == "insertMany":
+            # Ordered insert stopped at the duplicate: the batch reply is an error.
+            return 400, DUPLICATE
+        if body["document"]["_id"] == "dup":
+            return 400, DUPLICATE
+        if body["document"]["_id"] == "bad":
+            return 400, '{"error": "Document failed validation"}'
+        return 201, json.dumps({"insertedId": body["document"]["_id"]})
+
+    writer, session = make_writer(reply)
+    results = writer.write_batch([record("a"), record("dup"), record("bad"), record("b")])
+
+    assert [action for action, _ in session.requests] == ["insertMany"] + ["insertOne"] * 4
+    assert [(ok, status) for ok, status, _ in results] == [(True, 201), (True, 400), (False, 400), (True, 201)]
+    # A duplicate key on the fallback means the record is already stored.
+    assert json.loads(results[1][2]) == {"alreadyStoredId": "dup"}
+    assert "validation" in results[2][2]
+
+
+def test_short_insert_many_reply_settles_each_document():
+    def reply(action, body):
+        if action == "insertMany":
+            return 201, json.dumps({"insertedIds": ["a"]})
+        return 201, json.dumps({"insertedId": body["document"]["_id"]})
+
+    writer, session = make_writer(reply)
+    results = writer.write_batch([record("a"), record("b")])
+    assert all(ok for ok, _, _ in results)
+    assert [action for action, _ in session.requests] == ["insertMany", "insertOne", "insertOne"]
+
+
+def test_connection_error_is_reported_per_document():
+    def reply(action, body):
+        raise OSError("connection reset")
+
+    writer, _ = make_writer(reply)
+    results = writer.write_batch([record("a")])
+    assert results == [(False, -1, "connection reset")]
+
+
+def test_buffer_flushes_at_max_docs():
+    writer, session = make_writer(
+        lambda action, body: (201, json.dumps({"insertedIds": [d["_id"] for d in body["documents"]]})),
+        max_docs=2,
+        max_age_sec=None,
+    )
+    assert writer.add(record("a")) == []
+    assert len(writer.add(record("b"))) == 2
+    assert len(writer) == 0
+    assert len(session.requests) == 1
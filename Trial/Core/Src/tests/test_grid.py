@@ -0,0 +1,156 @@
+import hashlib
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import benchmark
+
+if str(benchmark.GRID_SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(benchmark.GRID_SCRIPTS_DIR))
+grid = pytest.importorskip("regenerate_cambodia_grid")
+
+MASK64 = (1 << 64) - 1
+# sha256 of write_grid() for cambodia at step 0.2, as produced by the original
+# single-loop generator.
+COARSE_STEP = 0.2
+COARSE_GRID_SHA256 = "c01ece1d1fa1491121db15d77b811026186b03a4e4db787d2fcfaeb4d3fce5de"
+
+
+# Scalar reference implementations of the vectorized noise schemes.
+
+def stable_noise(key, amplitude=1.0):
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    raw = int.from_bytes(digest[:8], "big") / float(2**64 - 1)
+    return (raw * 2.0 - 1.0) * amplitude
+
+
+def mix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def counter_noise(prefix, lon, lat, amplitude=1.0):
+    ix = int(round(lon * 1000.0)) & MASK64
+    iy = int(round(lat * 1000.0)) & MASK64
+    h = mix64(mix64(grid.noise_seed(prefix) ^ ix) ^ iy)
+    return ((h >> 11) * 2.0 ** -53 * 2.0 - 1.0) * amplitude
+
+
+def sample_points(count=500):
+    rng = np.random.default_rng(7)
+    # Negative coordinates exercise the two's complement keying.
+    lons = np.round(rng.uniform(-180.0, 180.0, count), 3)
+    lats = np.round(rng.uniform(-90.0, 90.0, count), 3)
+    return lons, lats
+
+
+def test_stable_noise_grid_matches_scalar():
+    lons, lats = sample_points()
+    expected = [stable_noise(f"jlon:{lon:.3f}:{lat:.3f}", 0.01) for lon, lat in zip(lons.tolist(), lats.tolist())]
+    assert grid.stable_noise_grid("jlon:", lons, lats, 0.01).tolist() == expected
+
+
+def test_counter_noise_grid_matches_scalar():
+    lons, lats = sample_points()
+    expected = [counter_noise("micro:", lon, lat, 0.18) for lon, lat in zip(lons.tolist(), lats.tolist())]
+    assert grid.counter_noise_grid("micro:", lons, lats, 0.18).tolist() == expected
+
+
+def point_in_polygon(lon, lat, polygon):
+    """Brute-force ray cast over every edge, as the original generator did."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        intersects = ((yi > lat) != (yj > lat)) and (
+            lon < (xj - xi) * (lat - yi) / ((yj - yi) + 1e-12) + xi
+        )
+        if intersects:
+            inside = not inside
+        j = i
+    return inside
+
+
+def coarse_region():
+    region = grid.load_region(grid.DEFAULT_REGION)
+    region["step"] = COARSE_STEP
+    return region
+
+
+def test_coarse_grid_matches_checked_in_digest(tmp_path):
+    path = tmp_path / "grid.json"
+    assert grid.write_grid(coarse_region(), path) == 494
+    assert hashlib.sha256(path.read_bytes()).hexdigest() == COARSE_GRID_SHA256
+
+
+def grid_rows(bands):
+    return [(point, row) for points, columns in bands for point, row in zip(points, zip(*columns.values()))]
+
+
+def test_band_size_and_cache_do_not_change_output(tmp_path):
+    region = coarse_region()
+    expected = grid_rows(grid.iter_grid_bands(region))
+    for band_rows in (1, 3):
+        assert sorted(grid_rows(grid.iter_grid_bands(region, band_rows))) == sorted(expected)
+
+    for _ in range(2):  # the first run writes the cache, the second reads it
+        assert grid_rows(grid.iter_grid_bands(region, cache_dir=tmp_path)) == expected
+
+
+def test_boundary_index_matches_brute_force():
+    region = grid.load_region(grid.DEFAULT_REGION)
+    ring = region["boundary"][0]
+    # A square hole inside the country: even-odd makes it outside.
+    hole = [[104.0, 12.0], [104.6, 12.0], [104.6, 12.6], [104.0, 12.6], [104.0, 12.0]]
+    rings = [ring, hole]
+    index = grid.BoundaryIndex(rings)
+
+    def brute(lon, lat):
+        return sum(point_in_polygon(lon, lat, r) for r in rings) % 2 == 1
+
+    min_lon, min_lat, max_lon, max_lat = grid.region_bbox(region)
+    rng = np.random.default_rng(11)
+    lons = rng.uniform(min_lon - 0.5, max_lon + 0.5, 5000)
+    lats = rng.uniform(min_lat - 0.5, max_lat + 0.5, 5000)
+    # Points on vertex latitudes and longitudes hit the tie cases.
+    vertices = np.array(ring + hole, dtype=np.float64)
+    lons = np.concatenate([lons, vertices[:, 0], vertices[:, 0] + 0.01])
+    lats = np.concatenate([lats, vertices[:, 1], vertices[:, 1]])
+
+    expected = [brute(lon, lat) for lon, lat in zip(lons.tolist(), lats.tolist())]
+    assert index.contains(lons, lats).tolist() == expected
+
+    row_lats = grid.lattice(min_lat, max_lat, 0.1)
+    grid_lons = grid.lattice(min_lon, max_lon, 0.1)
+    rows = index.contains_rows(row_lats, grid_lons)
+    assert rows.tolist() == [[brute(lon, lat) for lon in grid_lons.tolist()] for lat in row_lats.tolist()]
+
+
+def test_region_property_model_overrides_default():
+    region = coarse_region()
+    geography_bands = list(grid.iter_geography_bands(region))
+    base = [grid.property_columns(points, region, geography) for points, geography in geography_bands]
+
+    warmer = dict(grid.DEFAULT_PROPERTY_MODEL["temperature"], base=30.8)
+    region["properties"] = {"temperature": warmer}
+    cooler = [grid.property_columns(points, region, geography) for points, geography in geography_bands]
+
+    before = [t for columns in base for t in columns.get("temperature", [])]
+    after = [t for columns in cooler for t in columns.get("temperature", [])]
+    assert all(b <= a for a, b in zip(before, after)) and sum(before) - sum(after) > 0.9 * len(before)
+    for a, b in zip(base, cooler):
+        assert all(b[key] == a[key] for key in a if key not in ("temperature", "riskLevel"))
+
+
+def test_load_region_rejects_unknown_property_input(tmp_path):
+    region = grid.load_region(grid.DEFAULT_REGION)
+    region["properties"] = {"humidity": {"base": 60.0, "terms": [["rainfall", 1.0]]}}
+    path = tmp_path / "bad.json"
+    path.write_text(json.dumps(region), encoding="utf-8")
+    with pytest.raises(ValueError, match="rainfall"):
+        grid.load_region(path)
@@ -0,0 +1,40 @@
+import hashlib
+
+import history_analysis
+import transport
+from fake_atlas import FakeFindSession, ObjectId
+
+
+def mixed_history(devices=("stm32-01", "stm32-02", "stm32-03"), seconds=12):
+    """Several devices per second; legacy ObjectId ids and proof-hash ids mixed."""
+    documents = []
+    for ts in range(1_767_225_600, 1_767_225_600 + seconds):
+        for n, device in enumerate(devices):
+            digest = hashlib.sha256(f"{device}:{ts}".encode()).hexdigest()
+            doc_id = ObjectId(digest[:24]) if (ts + n) % 2 else digest
+            documents.append({"_id": doc_id, "deviceId": device, "ts": ts, "sensor": {"temperature": 20.0 + n}})
+    return documents
+
+
+def test_keyset_pages_keep_every_document(monkeypatch):
+    documents = mixed_history()
+    fake = FakeFindSession(documents)
+    monkeypatch.setattr(transport, "session", lambda name: fake)
+
+    for page_size in (1, 2, 3, 4, 7, 100):
+        got = list(history_analysis.find_history({}, ["temperature"], page_size=page_size))
+        assert sorted(d["_id"] for d in got) == sorted(str(d["_id"]) for d in documents)
+        assert [d["ts"] for d in got] == sorted(d["ts"] for d in got)
+
+
+def test_keyset_pages_respect_the_caller_filter(monkeypatch):
+    documents = mixed_history()
+    fake = FakeFindSession(documents)
+    monkeypatch.setattr(transport, "session", lambda name: fake)
+
+    since = documents[0]["ts"] + 3
+    filter_doc = history_analysis.history_filter(since=since, device_ids=["stm32-02"])
+    got = list(history_analysis.find_history(filter_doc, ["temperature"], page_size=2))
+    expected = [d for d in documents if d["deviceId"] == "stm32-02" and d["ts"] >= since]
+    assert len(got) == len(expected)
+    assert {d["deviceId"] for d in got} == {"stm32-02"}
@@ -0,0 +1,52 @@
+import hashlib
+
+import pytest
+
+from merkle import build_levels, hash_leaf, hash_node, inclusion_path, merkle_root, verify_inclusion
+
+
+def leaves(count):
+    return [hashlib.sha256(f"record-{i}".encode()).hexdigest() for i in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4, 5, 7, 8, 9, 16, 33])
+def test_every_leaf_verifies(count):
+    hexes = leaves(count)
+    levels = build_levels(hexes)
+    root = merkle_root(hexes)
+    for index, leaf in enumerate(hexes):
+        assert verify_inclusion(leaf, inclusion_path(levels, index), root)
+
+
+def test_odd_node_is_promoted_not_duplicated():
+    a, b, c = leaves(3)
+    expected = hash_node(hash_node(hash_leaf(a), hash_leaf(b)), hash_leaf(c)).hex()
+    assert merkle_root([a, b, c]) == expected
+    assert inclusion_path(build_levels([a, b, c]), 2) == [{"position": "left", "hash": hash_node(hash_leaf(a), hash_leaf(b)).hex()}]
+
+
+def test_tampering_is_rejected():
+    hexes = leaves(6)
+    levels = build_levels(hexes)
+    root = merkle_root(hexes)
+    path = inclusion_path(levels, 2)
+
+    assert not verify_inclusion(hexes[3], path, root)
+    assert not verify_inclusion(hexes[2], inclusion_path(levels, 3), root)
+    assert not verify_inclusion(hexes[2], path, merkle_root(hexes[:5]))
+    flipped = [dict(step, position="right" if step["position"] == "left" else "left") for step in path]
+    assert not verify_inclusion(hexes[2], flipped, root)
+
+
+def test_inner_node_cannot_pass_as_leaf():
+    hexes = leaves(4)
+    levels = build_levels(hexes)
+    inner = levels[1][0].hex()
+    assert not verify_inclusion(inner, [{"position": "right", "hash": levels[1][1].hex()}], merkle_root(hexes))
+
+
+def test_malformed_input_is_rejected():
+    root = merkle_root(leaves(2))
+    assert not verify_inclusion("not-hex", [], root)
+    assert not verify_inclusion(leaves(1)[0], [{"position": "left"}], root)
+    assert not verify_inclusion(leaves(1)[0], None, root)
@@ -0,0 +1,134 @@
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import Histogram, MetricsServer, Registry, bucket_quantile
+from readers import SerialReader
+
+
+def test_histogram_buckets_are_le_bounds():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 3.0):
+        histogram.observe(value)
+    counts, total, max_value = histogram.state()
+    # A value equal to a bound falls in that bucket; the last slot is +Inf.
+    assert counts == [2, 2, 1]
+    assert total == pytest.approx(4.65)
+    assert max_value == 3.0
+
+
+def test_bucket_quantile():
+    buckets = (0.1, 1.0)
+    assert bucket_quantile(buckets, [0, 0, 0], 0.0, 0.5) == 0.0
+    assert bucket_quantile(buckets, [9, 1, 0], 0.5, 0.5) == 0.1
+    assert bucket_quantile(buckets, [9, 1, 0], 0.5, 0.99) == 0.5  # capped at the max seen
+    assert bucket_quantile(buckets, [1, 0, 1], 7.0, 0.99) == 7.0
+
+
+def test_timed_counts_errors_and_still_observes():
+    registry = Registry(buckets=(1.0,))
+    with registry.timed("op"):
+        pass
+    with pytest.raises(ValueError):
+        with registry.timed("op"):
+            raise ValueError("boom")
+    registry.error("other", 2)
+
+    snap = registry.snapshot()
+    assert snap["op"]["count"] == 2 and snap["op"]["errors"] == 1
+    assert snap["other"] == {"errors": 2}
+
+
+def test_render_exposition_format():
+    registry = Registry(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 2.0):
+        registry.observe("atlas_insertMany", value)
+    registry.error("atlas_insertMany")
+    registry.register_collector(lambda: [
+        ("stage_queue_depth", "gauge", {"stage": "anchor"}, 3),
+        ("stage_queue_depth", "gauge", {"stage": "insert"}, 0),
+        ("uptime_seconds", "gauge", {}, 12),
+    ])
+
+    lines = registry.render().splitlines()
+    duration = "gateway_operation_duration_seconds"
+    assert lines[:2] == [
+        f"# HELP {duration} Latency of gateway hot-path operations.",
+        f"# TYPE {duration} histogram",
+    ]
+    assert lines[2:7] == [
+        f'{duration}_bucket{{operation="atlas_insertMany",le="0.1"}} 1',
+        f'{duration}_bucket{{operation="atlas_insertMany",le="1"}} 2',
+        f'{duration}_bucket{{operation="atlas_insertMany",le="+Inf"}} 3',
+        f'{duration}_sum{{operation="atlas_insertMany"}} 2.55',
+        f'{duration}_count{{operation="atlas_insertMany"}} 3',
+    ]
+    assert 'gateway_operation_errors_total{operation="atlas_insertMany"} 1' in lines
+    assert lines.count("# TYPE gateway_stage_queue_depth gauge") == 1
+    assert 'gateway_stage_queue_depth{stage="anchor"} 3' in lines
+    assert "gateway_uptime_seconds 12" in lines
+
+
+def test_failing_collector_does_not_break_render():
+    registry = Registry()
+    registry.register_collector(lambda: 1 / 0)
+    assert registry.render().endswith("\n")
+
+
+def test_metrics_server():
+    registry = Registry()
+    registry.observe("parse_stm_line", 0.001)
+    server = MetricsServer("127.0.0.1", 0, registry).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert 'operation="parse_stm_line"' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other", timeout=5)
+    finally:
+        server.stop()
+
+
+class SlowPort:
+    """A port whose reads block like an idle UART before returning each chunk."""
+
+    def __init__(self, chunks, delay):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.reader = None
+        self.in_waiting = 0
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def read(self, size=1):
+        time.sleep(self.delay)
+        if not self.chunks:
+            self.reader.stop()
+            return b""
+        return self.chunks.pop(0)
+
+
+def test_serial_reader_times_decoding_not_blocking_reads(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(metrics, "timed", registry.timed)
+    port = SlowPort([b"Temp: 24.00 C\r\n", b"Hum: 60.00 %\r\n"], delay=0.05)
+    reader = SerialReader("COM9", "stm32-01", lambda *args: None, lambda *args: None, opener=port)
+    port.reader = reader
+    reader.start()
+    reader.join(timeout=5)
+
+    snap = registry.snapshot()
+    assert "serial_read" not in snap
+    assert snap["serial_decode"]["count"] == 2
+    assert snap["serial_decode"]["maxMs"] < 50
+    assert reader.stats.snapshot()["bytes"] == 29
@@ -0,0 +1,203 @@
+import base64
+import json
+from types import SimpleNamespace
+
+import pytest
+import serial
+
+import readers
+from readers import MQTT_TRANSPORT, SERIAL_TRANSPORT, MqttUplinkReader, SerialReader
+from serial_frame import encode_frame
+
+
+class Collector:
+    def __init__(self):
+        self.lines = []
+        self.sensors = []
+
+    def on_line(self, raw, device_id, link):
+        self.lines.append((raw, device_id, link))
+
+    def on_sensor(self, sensor, source, device_id, link):
+        self.sensors.append((sensor, source, device_id, link))
+
+
+class FlakyOpener:
+    """Opens fail `failures` times, then each open serves one chunk list until it runs dry."""
+
+    def __init__(self, failures, sessions):
+        self.failures = failures
+        self.sessions = list(sessions)
+        self.opens = 0
+        self.reader = None
+
+    def __call__(self, port, baud_rate, timeout=None):
+        self.opens += 1
+        if self.failures:
+            self.failures -= 1
+            raise serial.SerialException(f"could not open port {port}")
+        return OpenPort(self, self.sessions.pop(0))
+
+
+class OpenPort:
+    def __init__(self, opener, chunks):
+        self.opener = opener
+        self.chunks = list(chunks)
+        self.in_waiting = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def read(self, size=1):
+        if self.chunks:
+            return self.chunks.pop(0)
+        if self.opener.sessions:
+            raise serial.SerialException("device reports readiness to read but returned no data")
+        self.opener.reader.stop()
+        return b""
+
+
+def run_serial(opener, device_id="stm32-01"):
+    collected = Collector()
+    reader = SerialReader("COM9", device_id, collected.on_line, collected.on_sensor, opener=opener, max_backoff_sec=1.0)
+    opener.reader = reader
+    reader.start()
+    reader.join(timeout=10)
+    assert not reader.is_alive()
+    return reader, collected
+
+
+def test_serial_reader_routes_by_frame_device_id():
+    opener = FlakyOpener(0, [[
+        encode_frame("stm32-07", 1, {"temperature": 21.5}),
+        b"H=60.0%, T=24.0C\r\n",
+        encode_frame("", 2, {"ph": 6.5}),
+    ]])
+    reader, collected = run_serial(opener, device_id="stm32-01")
+    assert [(device_id, link) for _, _, device_id, link in collected.sensors] == [
+        ("stm32-07", SERIAL_TRANSPORT),
+        ("stm32-01", SERIAL_TRANSPORT),
+    ]
+    # Text lines always belong to the board on the port.
+    assert collected.lines == [("H=60.0%, T=24.0C", "stm32-01", SERIAL_TRANSPORT)]
+
+
+def test_serial_reader_reopens_after_port_errors():
+    # One failed open, then a session that drops mid-stream, then a clean one.
+    opener = FlakyOpener(1, [[b"H=60.0%, T=24.0C\r\n"], [b"H=61.0%, T=24.5C\r\n"]])
+    reader, collected = run_serial(opener)
+    assert opener.opens == 3
+    assert [raw for raw, _, _ in collected.lines] == ["H=60.0%, T=24.0C", "H=61.0%, T=24.5C"]
+    snap = reader.stats.snapshot()
+    assert (snap["reconnects"], snap["errors"], snap["lines"]) == (2, 0, 2)
+
+
+def test_serial_reader_stops_on_unexpected_errors():
+    def opener(port, baud_rate, timeout=None):
+        raise ValueError("bad baud rate")
+
+    collected = Collector()
+    reader = SerialReader("COM9", "stm32-01", collected.on_line, collected.on_sensor, opener=opener)
+    reader.start()
+    reader.join(timeout=5)
+    assert not reader.is_alive()
+    assert reader.stats.snapshot()["errors"] == 1
+
+
+class FakeMqttClient:
+    def __init__(self, client_id=""):
+        self.client_id = client_id
+        self.subscriptions = []
+        self.events = []
+
+    def username_pw_set(self, username=None, password=None):
+        self.events.append(("auth", username))
+
+    def tls_set(self):
+        self.events.append(("tls",))
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        self.events.append(("reconnect_delay", min_delay, max_delay))
+
+    def connect_async(self, host, port, keepalive=60):
+        self.events.append(("connect", host, port))
+
+    def loop_start(self):
+        self.events.append(("loop_start",))
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append((topic, qos))
+
+    def disconnect(self):
+        self.events.append(("disconnect",))
+
+    def loop_stop(self):
+        self.events.append(("loop_stop",))
+
+
+@pytest.fixture
+def fake_mqtt(monkeypatch):
+    monkeypatch.setattr(readers, "mqtt", SimpleNamespace(Client=FakeMqttClient))
+
+
+def uplink(device_id, **message):
+    body = {"end_device_ids": {"device_id": device_id}, "uplink_message": message}
+    return SimpleNamespace(payload=json.dumps(body).encode("utf-8"))
+
+
+def make_mqtt_reader(**kwargs):
+    collected = Collector()
+    reader = MqttUplinkReader(
+        "eu1.cloud.thethings.network",
+        "v3/app@ttn/devices/+/up",
+        collected.on_line,
+        collected.on_sensor,
+        device_ids={"field-node-1": "stm32-lora-01"},
+        **kwargs,
+    )
+    return reader, collected
+
+
+def test_mqtt_reader_requires_paho(monkeypatch):
+    monkeypatch.setattr(readers, "mqtt", None)
+    with pytest.raises(RuntimeError, match="paho-mqtt"):
+        make_mqtt_reader()
+
+
+def test_mqtt_reader_connects_and_resubscribes(fake_mqtt):
+    reader, _ = make_mqtt_reader(port=8883, username="app@ttn", password="key")
+    client = reader.client
+    reader.start()
+    assert ("tls",) in client.events and ("auth", "app@ttn") in client.events
+    assert ("connect", "eu1.cloud.thethings.network", 8883) in client.events
+
+    # paho calls on_connect after every (re)connect; each must subscribe again.
+    for _ in range(2):
+        client.on_connect(client, None, {}, 0)
+    assert client.subscriptions == [("v3/app@ttn/devices/+/up", 1)] * 2
+
+    assert reader.is_alive()
+    reader.stop()
+    assert not reader.is_alive()
+    assert client.events[-2:] == [("disconnect",), ("loop_stop",)]
+
+
+def test_mqtt_payload_decoding_and_routing(fake_mqtt):
+    reader, collected = make_mqtt_reader()
+    client = reader.client
+    frm = base64.b64encode(b"H=55.0%, T=30.5C\r\n").decode("ascii")
+
+    client.on_message(client, None, uplink("field-node-1", frm_payload=frm))
+    client.on_message(client, None, uplink("field-node-2", decoded_payload={"moisture": 41.0}))
+    client.on_message(client, None, uplink("field-node-1"))  # no uplink message: ignored
+    client.on_message(client, None, SimpleNamespace(payload=b"not json"))
+
+    # Mapped devices take the gateway id; unmapped ones keep their TTN id.
+    assert collected.lines == [("H=55.0%, T=30.5C", "stm32-lora-01", MQTT_TRANSPORT)]
+    assert collected.sensors == [({"moisture": 41.0}, "lorawan-decoded", "field-node-2", MQTT_TRANSPORT)]
+    snap = reader.stats.snapshot()
+    assert (snap["lines"], snap["errors"]) == (2, 1)
+
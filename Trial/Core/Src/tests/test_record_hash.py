@@ -0,0 +1,46 @@
+import copy
+import hashlib
+import hmac
+import json
+
+import pytest
+
+import record_hash
+
+with open(record_hash.GOLDEN_VECTORS_PATH, "r", encoding="utf-8") as f:
+    VECTORS = json.load(f)
+
+
+def test_golden_vectors_match():
+    assert record_hash.check_golden_vectors() == []
+
+
+@pytest.mark.parametrize("vector", VECTORS, ids=[v["name"] for v in VECTORS])
+def test_vector_against_deep_copy_hash(vector):
+    # The original implementation: deep copy, drop _id and proof, hash.
+    stripped = copy.deepcopy(vector["document"])
+    for key in ("_id", "proof"):
+        stripped.pop(key, None)
+    expected = hashlib.sha256(json.dumps(stripped, separators=(",", ":"), sort_keys=True).encode("utf-8")).hexdigest()
+    assert expected == vector["actualHash"]
+    assert record_hash.compute_document_hash(vector["document"]) == expected
+
+
+def test_hashing_leaves_the_document_unmodified():
+    document = copy.deepcopy(VECTORS[0]["document"])
+    document["_id"] = "some-id"
+    document["proof"] = {"actualHash": "x", "solana": {"txSignature": None}}
+    before = copy.deepcopy(document)
+
+    record_hash.compute_document_hash(document)
+    view = record_hash.hashed_view(document)
+
+    assert document == before
+    assert "_id" not in view and "proof" not in view
+    assert "_id" in document and "proof" in document
+
+
+def test_cached_hmac_state_is_not_consumed():
+    for message in ("aa", "bb", "aa"):
+        expected = hmac.new(b"secret", message.encode("utf-8"), hashlib.sha256).hexdigest()
+        assert record_hash.compute_modified_hash(message, "secret") == expected
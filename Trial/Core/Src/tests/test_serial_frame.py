@@ -0,0 +1,116 @@
+import binascii
+import struct
+
+from readers import FRAME_SOURCE, SERIAL_TRANSPORT, SerialReader
+from serial_frame import CRC, CRC_INIT, FRAME, HEADER, LINE, MAGIC, VERSION, FrameDecoder, encode_frame
+
+SENSOR = {"temperature": 23.45, "humidity": 61.0}
+
+
+def test_round_trip():
+    events = FrameDecoder().feed(encode_frame("dev-7", 1, SENSOR))
+    assert len(events) == 1
+    kind, frame = events[0]
+    assert kind == FRAME
+    assert (frame.device_id, frame.seq, frame.sensor) == ("dev-7", 1, SENSOR)
+
+
+def test_split_across_reads():
+    data = b"boot ok\r\n" + encode_frame("dev-7", 1, SENSOR) + b"Temp: 24.00 C\r\n"
+    decoder = FrameDecoder()
+    events = []
+    for i in range(len(data)):
+        events += decoder.feed(data[i:i + 1])
+    assert [kind for kind, _ in events] == [LINE, FRAME, LINE]
+    assert events[0][1] == "boot ok"
+    assert events[2][1] == "Temp: 24.00 C"
+    assert decoder.pending() == 0
+
+
+def test_bad_crc_resyncs_on_next_frame():
+    bad = bytearray(encode_frame("dev-7", 1, SENSOR))
+    bad[-1] ^= 0xFF
+    decoder = FrameDecoder()
+    frames = [item for kind, item in decoder.feed(bytes(bad) + encode_frame("dev-7", 2, SENSOR)) if kind == FRAME]
+    assert [frame.seq for frame in frames] == [2]
+    assert decoder.stats["crcErrors"] == 1
+
+
+def test_float32_and_unknown_fields():
+    body = bytes([3]) + b"dev" + struct.pack("<H", 5)
+    body += bytes([5, 4]) + struct.pack("<f", 6.5)  # ph as float32
+    body += bytes([99, 3]) + b"xyz"  # unknown type, skipped
+    frame = _frame(body)
+    (kind, decoded), = FrameDecoder().feed(frame)
+    assert kind == FRAME
+    assert decoded.sensor == {"ph": 6.5}
+
+
+def test_sequence_gaps_count_dropped_frames():
+    decoder = FrameDecoder()
+    # dev-7 misses 3 and 4, then restarts; dev-8 wraps at 0xFFFF and misses 1.
+    for seq in (1, 2, 5, 6, 1, 2):
+        decoder.feed(encode_frame("dev-7", seq, SENSOR))
+    for seq in (0xFFFE, 0xFFFF, 0, 2):
+        decoder.feed(encode_frame("dev-8", seq, SENSOR))
+    assert decoder.stats["dropped"] == 2 + 1
+    assert decoder.stats["frames"] == 10
+
+
+def _frame(body):
+    header = HEADER.pack(VERSION, len(body))
+    return MAGIC + header + body + CRC.pack(binascii.crc_hqx(header + body, CRC_INIT))
+
+
+class FakePort:
+    """serial.Serial stand-in that returns `chunks` and then stops its reader."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.reader = None
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        if not self.chunks:
+            self.reader.stop()
+            return b""
+        return self.chunks.pop(0)
+
+
+def test_serial_reader_delivers_frames_and_lines():
+    lines, sensors = [], []
+    port = FakePort([
+        encode_frame("dev-7", 1, SENSOR) + b"Temp: 24.00 C Hum: 60.00 %\r\n",
+        encode_frame("", 2, {"ph": 6.8}),
+    ])
+    reader = SerialReader(
+        "COM9",
+        "stm32-01",
+        lambda raw, device_id, link: lines.append((raw, device_id, link)),
+        lambda sensor, source, device_id, link: sensors.append((sensor, source, device_id, link)),
+        opener=port,
+    )
+    port.reader = reader
+    reader.start()
+    reader.join(timeout=5)
+
+    assert not reader.is_alive()
+    assert sensors == [
+        (SENSOR, FRAME_SOURCE, "dev-7", SERIAL_TRANSPORT),
+        ({"ph": 6.8}, FRAME_SOURCE, "stm32-01", SERIAL_TRANSPORT),  # no id in the frame: the port's device
+    ]
+    assert lines == [("Temp: 24.00 C Hum: 60.00 %", "stm32-01", SERIAL_TRANSPORT)]
+    snapshot = reader.stats.snapshot()
+    assert (snapshot["frames"], snapshot["lines"], snapshot["errors"]) == (2, 1, 0)
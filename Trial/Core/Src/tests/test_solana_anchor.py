@@ -0,0 +1,170 @@
+from types import SimpleNamespace
+
+import main as gateway
+import solana_anchor
+from fake_atlas import FakeFindSession
+from solana_anchor import AnchorWorker
+
+
+class FakeClient:
+    def __init__(self):
+        self.blockhashes = 0
+        self.sent = []
+
+    def get_latest_blockhash(self):
+        self.blockhashes += 1
+        return SimpleNamespace(value=SimpleNamespace(blockhash=f"blockhash-{self.blockhashes}"))
+
+    def send_raw_transaction(self, raw, opts=None):
+        self.sent.append(raw)
+
+
+class FakeTransaction:
+    def __init__(self, hash_hex, blockhash):
+        self.signatures = [f"sig-{hash_hex}-{blockhash}"]
+
+    def __bytes__(self):
+        return self.signatures[0].encode()
+
+
+class Chain:
+    """getSignatureStatuses stand-in: signatures mapped to their status."""
+
+    def __init__(self):
+        self.statuses = {}
+        self.queries = []
+
+    def fetch(self, rpc_url, signatures):
+        self.queries.append(list(signatures))
+        return {sig: self.statuses.get(sig) for sig in signatures}
+
+
+def make_worker(monkeypatch, **kwargs):
+    chain = Chain()
+    monkeypatch.setattr(solana_anchor, "fetch_signature_statuses", chain.fetch)
+    outcomes = []
+
+    def on_status(signature, status, detail=None, new_signature=None):
+        outcomes.append((signature, status, detail, new_signature))
+        return True
+
+    worker = AnchorWorker(FakeClient(), "http://rpc", FakeTransaction, on_status, **kwargs)
+    return worker, chain, outcomes
+
+
+def test_sign_send_confirm(monkeypatch):
+    worker, chain, outcomes = make_worker(monkeypatch)
+    signature = worker.submit("aa")
+    assert signature == "sig-aa-blockhash-1"
+    assert worker.client.sent == []
+
+    worker._drain_send_queue()
+    assert worker.client.sent == [signature.encode()]
+
+    worker.confirm_once()
+    assert outcomes == [] and worker.pending_count() == 1
+
+    chain.statuses[signature] = {"err": None, "confirmationStatus": "confirmed"}
+    worker.confirm_once()
+    assert outcomes == [(signature, "confirmed", None, None)]
+    assert worker.pending_count() == 0
+    assert worker.snapshot()["confirmed"] == 1
+
+
+def test_on_chain_error_is_failed(monkeypatch):
+    worker, chain, outcomes = make_worker(monkeypatch)
+    signature = worker.submit("aa")
+    chain.statuses[signature] = {"err": {"InstructionError": [0, "Custom"]}, "confirmationStatus": "confirmed"}
+    worker.confirm_once()
+    assert outcomes[0][:2] == (signature, "failed")
+    assert worker.snapshot()["failed"] == 1
+
+
+def test_expired_signature_is_resigned_then_failed(monkeypatch):
+    worker, chain, outcomes = make_worker(monkeypatch, expire_after_sec=0, max_attempts=2)
+    first = worker.submit("aa")
+    worker.blockhashes.refresh()
+
+    worker.confirm_once()
+    second = "sig-aa-blockhash-2"
+    assert outcomes == [(first, "pending", None, second)]
+    assert worker.snapshot()["resigned"] == 1
+
+    worker.confirm_once()
+    assert outcomes[1][:2] == (second, "failed")
+    assert worker.pending_count() == 0
+
+
+def test_unrecorded_outcome_is_retried(monkeypatch):
+    worker, chain, _ = make_worker(monkeypatch)
+    calls = []
+    worker.on_status = lambda *args: calls.append(args) or len(calls) > 1
+    signature = worker.submit("aa")
+    chain.statuses[signature] = {"err": None, "confirmationStatus": "finalized"}
+
+    worker.confirm_once()
+    assert worker.pending_count() == 1
+    worker.confirm_once()
+    assert worker.pending_count() == 0
+    # The outcome was resolved once and only the recording was repeated.
+    assert len(chain.queries) == 1 and len(calls) == 2
+
+
+def test_adopted_signature_is_confirmed_or_resigned(monkeypatch):
+    worker, chain, outcomes = make_worker(monkeypatch, expire_after_sec=0)
+    assert worker.adopt("old-1", "aa")
+    assert worker.adopt("old-2", "bb")
+    assert not worker.adopt("old-1", "aa")
+    chain.statuses["old-1"] = {"err": None, "confirmationStatus": "confirmed"}
+
+    worker.confirm_once()
+    assert sorted(outcomes) == [("old-1", "confirmed", None, None), ("old-2", "pending", None, "sig-bb-blockhash-1")]
+    # Adopted entries have no transaction bytes; only the replacement is sent.
+    worker._drain_send_queue()
+    assert worker.client.sent == [b"sig-bb-blockhash-1"]
+
+
+class FakeUpdateWriter:
+    def __init__(self, matched):
+        self.matched = matched
+        self.updates = []
+
+    def update_many(self, filter_doc, update):
+        self.updates.append((filter_doc, update))
+        return self.matched
+
+
+def test_record_anchor_status_updates_by_signature(monkeypatch):
+    writer = FakeUpdateWriter(matched=3)
+    monkeypatch.setattr(gateway, "_atlas_writer", writer)
+
+    assert gateway.record_anchor_status("old", "pending", new_signature="new")
+    assert writer.updates == [(
+        {"proof.solana.txSignature": "old"},
+        {"$set": {"proof.solana.status": "pending", "proof.solana.txSignature": "new"}},
+    )]
+
+    writer.matched = 0
+    assert not gateway.record_anchor_status("old", "failed", "Not confirmed")
+    assert writer.updates[-1][1] == {"$set": {"proof.solana.status": "failed", "proof.solana.error": "Not confirmed"}}
+
+
+def test_reconcile_adopts_stored_pending_records(monkeypatch):
+    def stored(doc_id, ts, signature, status, root=None):
+        proof = {"actualHash": doc_id, "solana": {"txSignature": signature, "status": status, "error": None}}
+        if root:
+            proof["merkle"] = {"root": root}
+        return {"_id": doc_id, "ts": ts, "proof": proof}
+
+    documents = [
+        stored("h1", 1, "sig-1", "pending"),
+        stored("h2", 1, "sig-2", "pending", root="r"),
+        stored("h3", 1, "sig-2", "pending", root="r"),
+        stored("h4", 2, "sig-3", "confirmed"),
+    ]
+    monkeypatch.setattr(gateway._atlas_writer, "session", FakeFindSession(documents))
+    worker, _, _ = make_worker(monkeypatch)
+    monkeypatch.setattr(gateway, "_anchor_worker", worker)
+
+    assert gateway.reconcile_pending_anchors() == 2
+    assert {sig: entry.hash_hex for sig, entry in worker._pending.items()} == {"sig-1": "h1", "sig-2": "r"}
@@ -0,0 +1,111 @@
+import os
+
+from spool import Rejected, Replayer, Spool
+
+
+def records(start, count):
+    return [{"n": i} for i in range(start, start + count)]
+
+
+def fill(directory, items, **kwargs):
+    spool = Spool(str(directory), **kwargs)
+    for record in items:
+        spool.append(record)
+    return spool
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("segment-"))
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    fill(tmp_path, records(0, 3)).close()
+    path = tmp_path / segment_files(tmp_path)[-1]
+    intact = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b"\x00\x00\x00\x40\x12\x34")  # header of an entry the crash cut short
+
+    spool = Spool(str(tmp_path))
+    assert path.stat().st_size == intact
+    spool.append({"n": 3})
+    assert spool.read_batch(10)[0] == records(0, 4)
+    spool.close()
+
+
+def test_corrupt_entry_in_tail_drops_the_rest(tmp_path):
+    fill(tmp_path, records(0, 3)).close()
+    path = tmp_path / segment_files(tmp_path)[-1]
+    data = bytearray(path.read_bytes())
+    data[-2] ^= 0xFF  # last payload no longer matches its CRC
+    path.write_bytes(bytes(data))
+
+    spool = Spool(str(tmp_path))
+    assert spool.read_batch(10)[0] == records(0, 2)
+    spool.close()
+
+
+def test_replay_commits_and_survives_reopen(tmp_path):
+    spool = fill(tmp_path, records(0, 5), segment_max_bytes=40)
+    delivered = []
+    replayer = Replayer(spool, lambda batch: delivered.extend(batch) or True, batch_size=2, max_wait_sec=0)
+    assert replayer.drain_once() == 2
+    spool.close()
+
+    spool = Spool(str(tmp_path), segment_max_bytes=40)
+    replayer = Replayer(spool, lambda batch: delivered.extend(batch) or True, batch_size=2, max_wait_sec=0)
+    while replayer.drain_once():
+        pass
+    assert delivered == records(0, 5)
+    assert spool.backlog_bytes() == 0
+    # Fully delivered segments are deleted; only the one being written remains.
+    assert len(segment_files(tmp_path)) == 1
+    spool.close()
+
+
+def test_failed_delivery_keeps_the_batch(tmp_path):
+    spool = fill(tmp_path, records(0, 3))
+    attempts = []
+
+    def deliver(batch):
+        attempts.append(list(batch))
+        if len(attempts) == 1:
+            raise RuntimeError("atlas down")
+        return True
+
+    replayer = Replayer(spool, deliver, batch_size=3, max_wait_sec=0)
+    assert replayer.drain_once(force=True) == 0
+    assert replayer.failures == 1
+    assert replayer.drain_once(force=True) == 3
+    assert attempts == [records(0, 3), records(0, 3)]
+    spool.close()
+
+
+def test_rejected_records_are_dead_lettered(tmp_path):
+    spool = fill(tmp_path, records(0, 4))
+    delivered = []
+
+    def deliver(batch):
+        bad = [record for record in batch if record["n"] == 1]
+        delivered.extend(record for record in batch if record not in bad)
+        if bad:
+            raise Rejected(bad, "invalid")
+        return True
+
+    replayer = Replayer(spool, deliver, batch_size=2, max_wait_sec=0)
+    while replayer.drain_once():
+        pass
+    assert delivered == [{"n": 0}, {"n": 2}, {"n": 3}]
+    assert replayer.dead_lettered == 1
+    assert [(e["reason"], e["record"]) for e in spool.read_dead_letters()] == [("invalid", {"n": 1})]
+    assert spool.read_batch(10)[0] == []
+    spool.close()
+
+
+def test_progress_round_trip(tmp_path):
+    spool = fill(tmp_path, records(0, 1))
+    assert spool.load_progress() == {}
+    spool.save_progress({"abc": {"txSignature": "sig"}})
+    spool.close()
+    spool = Spool(str(tmp_path))
+    assert spool.load_progress() == {"abc": {"txSignature": "sig"}}
+    spool.close()
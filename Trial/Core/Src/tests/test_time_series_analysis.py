@@ -0,0 +1,146 @@
+import json
+import random
+from dataclasses import asdict
+
+import pytest
+
+from time_series_analysis import KalmanConfig, MetricSeries, StreamingSeriesState, analyze_metric_history
+from time_series_rollup import MetricRollup, bucket_start
+
+
+def history(seed, count):
+    rng = random.Random(seed)
+    ts = 1_767_225_600
+    docs = []
+    for i in range(count):
+        ts += rng.choice([60, 300, 300, 900])
+        spike = 12.0 if rng.random() < 0.03 else 0.0
+        docs.append({"ts": ts, "sensor": {"temperature": 28.0 + 0.01 * i + rng.random() + spike}})
+    return docs
+
+
+def assert_same_trend(got, expected):
+    assert got.points_used == expected.points_used
+    assert got.anomaly_count == expected.anomaly_count
+    assert got.slope == pytest.approx(expected.slope, rel=1e-9, abs=1e-12)
+    assert got.confidence == pytest.approx(expected.confidence, rel=1e-9, abs=1e-12)
+    assert got.direction == expected.direction
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_streaming_matches_batch_analysis(seed):
+    docs = history(seed, 400)
+    state = StreamingSeriesState()
+    for i, doc in enumerate(docs):
+        state.update_from_record(doc, "temperature")
+        if i in (0, 1, 2, 50, len(docs) - 1):
+            batch = analyze_metric_history(docs[:i + 1], "temperature")
+            assert_same_trend(state.trend(), batch.trend)
+            assert state.last_filtered == pytest.approx(batch.filtered_values[-1], rel=1e-12)
+            assert state.last_is_anomaly == (i in batch.anomaly_indices)
+
+
+def test_round_trip_through_json_continues_identically():
+    docs = history(4, 200)
+    cfg = KalmanConfig(measurement_noise=0.2)
+    uninterrupted = StreamingSeriesState(cfg=cfg)
+    resumed = StreamingSeriesState(cfg=cfg)
+
+    for doc in docs[:120]:
+        uninterrupted.update_from_record(doc, "temperature")
+        resumed.update_from_record(doc, "temperature")
+    checkpoint = json.dumps(resumed.to_dict())
+    resumed = StreamingSeriesState.from_dict(json.loads(checkpoint))
+    assert resumed == uninterrupted
+    assert resumed.cfg == cfg
+
+    for doc in docs[120:]:
+        assert uninterrupted.update_from_record(doc, "temperature") == resumed.update_from_record(doc, "temperature")
+    assert resumed.trend() == uninterrupted.trend()
+
+
+def test_out_of_order_readings_are_skipped():
+    state = StreamingSeriesState()
+    assert state.update(1000, 20.0) is not None
+    assert state.update(2000, 20.5) is not None
+    before = state.to_dict()
+
+    assert state.update(1500, 99.0) is None
+    assert state.skipped == 1
+    assert {k: v for k, v in state.to_dict().items() if k != "skipped"} == {k: v for k, v in before.items() if k != "skipped"}
+
+    # Equal timestamps are not out of order.
+    assert state.update(2000, 20.6) is not None
+    assert state.count == 3
+
+
+def test_records_without_the_metric_are_ignored():
+    state = StreamingSeriesState()
+    assert state.update_from_record({"ts": 1, "sensor": {"humidity": 60.0}}, "temperature") is None
+    assert state.update_from_record({"sensor": {"temperature": 30.0}}, "temperature") is None
+    assert state.count == 0 and state.trend().points_used == 0
+
+
+def test_between_is_a_zero_copy_half_open_slice():
+    series = MetricSeries([10, 20, 20, 30, 40], [1.0, 2.0, 3.0, 4.0, 5.0])
+    window = series.between(20, 40)
+    assert list(window.timestamps) == [20, 20, 30]
+    assert list(window.values) == [2.0, 3.0, 4.0]
+    assert window.timestamps.obj is series.timestamps.obj
+
+    assert list(series.between(None, 20).timestamps) == [10]
+    assert list(series.between(35).timestamps) == [40]
+    assert len(series.between(50)) == 0
+    assert len(series.between(30, 20)) == 0
+    assert len(series.between()) == len(series)
+
+
+def test_from_records_sorts_and_skips_incomplete_records():
+    docs = [
+        {"ts": 30, "sensor": {"temperature": 3.0}},
+        {"ts": 10, "temperature": 1.0},
+        {"ts": 20, "sensor": {"humidity": 50.0}},
+        {"sensor": {"temperature": 9.0}},
+        {"ts": "20", "sensor": {"temperature": "2.0"}},
+    ]
+    series = MetricSeries.from_records(docs, "temperature")
+    assert list(series.timestamps) == [10, 20, 30]
+    assert list(series.values) == [1.0, 2.0, 3.0]
+    assert series.nbytes == 3 * 16
+
+    with pytest.raises(ValueError):
+        MetricSeries([1, 2], [1.0])
+
+
+def test_series_analysis_matches_record_analysis():
+    docs = history(5, 300)
+    from_records = analyze_metric_history(docs, "temperature")
+    from_series = analyze_metric_history(MetricSeries.from_records(docs, "temperature"))
+    assert from_series.to_dict() == from_records.to_dict()
+
+
+def test_series_analysis_to_dict_is_json_ready():
+    analysis = analyze_metric_history(MetricSeries.from_records(history(6, 50), "temperature"))
+    with pytest.raises(TypeError):
+        asdict(analysis)
+    data = json.loads(json.dumps(analysis.to_dict()))
+    assert data["timestamps"] == list(analysis.timestamps)
+    assert data["trend"]["points_used"] == 50
+
+
+def test_tier_analysis_uses_one_point_per_bucket():
+    rollup = MetricRollup()
+    docs = history(7, 500)
+    # Late readings land in buckets that already exist or sit between them.
+    for doc in docs[::2] + docs[1::2]:
+        rollup.add(doc["ts"], doc["sensor"]["temperature"])
+
+    hourly = rollup.tier_series("1h")
+    assert list(hourly.timestamps) == sorted(hourly.timestamps)
+    assert len(hourly) == len({bucket_start(doc["ts"], "1h") for doc in docs})
+
+    by_tier = analyze_metric_history(rollup, tier="1h")
+    assert by_tier.to_dict() == analyze_metric_history(hourly).to_dict()
+
+    with pytest.raises(TypeError):
+        analyze_metric_history(docs, "temperature", tier="1h")
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+import time_series_batch
+from time_series_analysis import MetricSeries, analyze_metric_history
+from time_series_batch import analyze_series_batch
+
+
+def random_series(rng, length):
+    ts = sorted(rng.sample(range(1_700_000_000, 1_700_000_000 + 90 * 86400), length))
+    return ts, [rng.gauss(25.0, 2.0) + 0.01 * i for i in range(length)]
+
+
+def assert_matches_scalar(series, analysis):
+    expected = analyze_metric_history(MetricSeries(*series))
+    assert list(analysis.timestamps) == list(expected.timestamps)
+    assert list(analysis.filtered_values) == list(expected.filtered_values)
+    assert list(analysis.anomaly_indices) == list(expected.anomaly_indices)
+    assert analysis.trend.direction == expected.trend.direction
+    assert analysis.trend.points_used == expected.trend.points_used
+    assert analysis.trend.anomaly_count == expected.trend.anomaly_count
+    assert analysis.trend.slope == pytest.approx(expected.trend.slope, rel=1e-9, abs=1e-12)
+    assert analysis.trend.confidence == pytest.approx(expected.trend.confidence, rel=1e-9, abs=1e-12)
+
+
+def test_matches_scalar_analysis_in_input_order():
+    rng = random.Random(7)
+    series = [random_series(rng, length) for length in (0, 1, 2, 3, 40, 500, 5, 120)]
+    analyses = analyze_series_batch(series)
+    assert len(analyses) == len(series)
+    for item, analysis in zip(series, analyses):
+        assert_matches_scalar(item, analysis)
+
+
+def test_long_series_gets_its_own_pass(monkeypatch):
+    monkeypatch.setattr(time_series_batch, "COLUMN_CHUNK", 4)
+    monkeypatch.setattr(time_series_batch, "CHUNK_CELLS", 1000)
+    lengths = [10, 900, 10, 20, 10, 30, 10, 10, 10]
+    chunks = time_series_batch._length_chunks(lengths)
+    assert [i for chunk in chunks for i in chunk] == sorted(range(len(lengths)), key=lengths.__getitem__)
+    for chunk in chunks:
+        assert len(chunk) <= 4
+        assert len(chunk) == 1 or len(chunk) * max(lengths[i] for i in chunk) <= 1000
+    assert [1] in chunks
+
+    rng = random.Random(3)
+    series = [random_series(rng, length) for length in lengths]
+    for item, analysis in zip(series, analyze_series_batch(series)):
+        assert_matches_scalar(item, analysis)
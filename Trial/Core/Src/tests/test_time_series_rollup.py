@@ -0,0 +1,110 @@
+import json
+import random
+import threading
+
+import pytest
+
+from time_series_analysis import _linear_slope
+from time_series_rollup import MetricRollup, RollupStore, bucket_start
+
+MONDAY = 1_767_571_200  # 2026-01-05 00:00 UTC
+
+
+def test_buckets_align_to_utc_and_monday():
+    ts = MONDAY + 3 * 86400 + 5 * 3600 + 17
+    assert bucket_start(ts, "1h") == MONDAY + 3 * 86400 + 5 * 3600
+    assert bucket_start(ts, "1d") == MONDAY + 3 * 86400
+    assert bucket_start(ts, "1w") == MONDAY
+
+
+def test_bucket_aggregates_and_late_readings():
+    rollup = MetricRollup()
+    for ts, value in [(MONDAY + 10, 3.0), (MONDAY + 3000, 1.0), (MONDAY + 20, 5.0), (MONDAY + 7200, 9.0)]:
+        rollup.add(ts, value)
+    first, second = rollup.buckets("1h")
+    assert (first.count, first.min, first.max, first.mean, first.last) == (3, 1.0, 5.0, 3.0, 1.0)
+    assert (second.start, second.count) == (MONDAY + 7200, 1)
+    assert [b.count for b in rollup.buckets("1d")] == [4]
+
+
+def test_regression_over_buckets_matches_raw_points():
+    rng = random.Random(5)
+    rollup = MetricRollup()
+    points = sorted((MONDAY + rng.randrange(0, 20 * 86400), rng.gauss(20.0, 1.0)) for _ in range(2000))
+    for ts, value in points:
+        rollup.add(ts, value)
+
+    t0 = points[0][0]
+    raw = _linear_slope([(ts - t0) / 3600.0 for ts, _ in points], [v for _, v in points])
+    for tier in ("1h", "1d", "1w"):
+        assert rollup.regression(tier).slope() == pytest.approx(raw, rel=1e-6, abs=1e-12)
+
+
+def test_store_round_trips_through_json():
+    store = RollupStore(("temperature",))
+    store.add_records([
+        {"deviceId": "stm32-01", "ts": MONDAY + i * 600, "sensor": {"temperature": 20 + i}} for i in range(30)
+    ])
+    restored = RollupStore.from_dict(json.loads(json.dumps(store.to_dict())))
+    assert restored.bucket_count() == store.bucket_count()
+    original = store.get("stm32-01", "temperature").tier_series("1h")
+    copy = restored.get("stm32-01", "temperature").tier_series("1h")
+    assert list(copy.timestamps) == list(original.timestamps)
+    assert list(copy.values) == list(original.values)
+
+
+def test_retention_keeps_the_newest_buckets():
+    store = RollupStore(("temperature",), retention={"1h": 24, "1d": 3, "1w": None})
+    for i in range(5 * 24):
+        store.add("stm32-01", "temperature", MONDAY + i * 3600, float(i))
+    rollup = store.get("stm32-01", "temperature")
+    assert [b.start for b in rollup.buckets("1h")] == [MONDAY + i * 3600 for i in range(4 * 24, 5 * 24)]
+    assert [b.start for b in rollup.buckets("1d")] == [MONDAY + d * 86400 for d in (2, 3, 4)]
+    assert store.bucket_count() == {"1h": 24, "1d": 3, "1w": 1}
+
+    # A reading older than the retained window does not bring its bucket back.
+    store.add("stm32-01", "temperature", MONDAY, 99.0)
+    assert store.get("stm32-01", "temperature").buckets("1h")[0].start == MONDAY + 4 * 24 * 3600
+
+    restored = RollupStore.from_dict(store.to_dict(), retention={"1h": 6})
+    assert restored.bucket_count()["1h"] == 6
+
+
+def test_get_returns_a_snapshot():
+    store = RollupStore(("temperature",))
+    store.add("stm32-01", "temperature", MONDAY, 1.0)
+    snapshot = store.get("stm32-01", "temperature")
+    store.add("stm32-01", "temperature", MONDAY + 10, 3.0)
+    store.add("stm32-01", "temperature", MONDAY + 7200, 5.0)
+    assert [(b.count, b.mean) for b in snapshot.buckets("1h")] == [(1, 1.0)]
+    assert [b.count for b in store.get("stm32-01", "temperature").buckets("1h")] == [2, 1]
+    assert store.get("stm32-02", "temperature") is None
+
+
+def test_concurrent_adds_and_reads():
+    store = RollupStore(("temperature",), retention={"1h": 48, "1d": None, "1w": None})
+    errors = []
+
+    def writer(offset):
+        for i in range(2000):
+            store.add("stm32-01", "temperature", MONDAY + (i * 4 + offset) * 60, float(i))
+
+    def reader():
+        try:
+            for _ in range(200):
+                rollup = store.get("stm32-01", "temperature")
+                if rollup is not None:
+                    series = rollup.tier_series("1h")
+                    assert list(series.timestamps) == sorted(series.timestamps)
+        except Exception as e:  # surfaced below; a thread cannot fail the test itself
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in range(4)] + [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    rollup = store.get("stm32-01", "temperature")
+    assert sum(b.count for b in rollup.buckets("1d")) == 8000
+    assert len(rollup.buckets("1h")) == 48
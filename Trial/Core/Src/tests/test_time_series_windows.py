@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from time_series_analysis import KalmanConfig, evaluate_trend, kalman_filter
+from time_series_windows import DEFAULT_WINDOWS, SlidingWindowTrend, WindowedTrendState, iter_window_trends
+
+
+def stream(seed, count):
+    rng = random.Random(seed)
+    ts = 1_767_225_600
+    timestamps, values = [], []
+    for i in range(count):
+        ts += rng.choice([30, 60, 60, 120, 900, 3600])
+        timestamps.append(ts)
+        spike = 15.0 if rng.random() < 0.02 else 0.0
+        values.append(25.0 + 0.002 * i + 2.0 * rng.random() + spike)
+    return timestamps, values
+
+
+def reference(timestamps, filtered, anomalies, latest, window_sec):
+    """evaluate_trend over the points of (latest - window_sec, latest]."""
+    picked = [i for i, ts in enumerate(timestamps) if latest - window_sec < ts <= latest]
+    anomaly_count = sum(1 for i in picked if i in anomalies)
+    return evaluate_trend([timestamps[i] for i in picked], [filtered[i] for i in picked], anomaly_count)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_windows_match_evaluate_trend(seed):
+    timestamps, values = stream(seed, 1500)
+    filtered, anomaly_indices = kalman_filter(values, KalmanConfig())
+    anomalies = set(anomaly_indices)
+
+    for step, (ts, trends) in enumerate(iter_window_trends(timestamps, values)):
+        if step % 97 and step != len(timestamps) - 1:
+            continue
+        for name, window_sec in DEFAULT_WINDOWS.items():
+            expected = reference(timestamps[:step + 1], filtered, anomalies, ts, window_sec)
+            got = trends[name]
+            assert got.points_used == expected.points_used
+            assert got.anomaly_count == expected.anomaly_count
+            assert got.slope == pytest.approx(expected.slope, rel=1e-6, abs=1e-9)
+            assert got.confidence == pytest.approx(expected.confidence, rel=1e-6, abs=1e-9)
+            if abs(abs(expected.slope) - 0.01) > 1e-6:
+                assert got.direction == expected.direction
+
+
+def test_eviction_rebases_without_drift():
+    window = SlidingWindowTrend(3600)
+    # Months of points through a one-hour window: the origin must keep moving.
+    for i in range(200_000):
+        window.add(i * 60, 0.5 * i / 60.0)  # exactly 0.5 per hour
+    assert len(window) == 60
+    assert window.slope() == pytest.approx(0.5, rel=1e-9)
+
+
+def test_out_of_order_readings_are_skipped():
+    state = WindowedTrendState({"1h": 3600})
+    assert state.update(100, 1.0) is not None
+    assert state.update(50, 2.0) is None
+    assert state.update(100, 3.0) is not None
+    assert (state.count, state.skipped) == (2, 1)
@@ -0,0 +1,45 @@
+from argparse import Namespace
+
+import main as gateway
+import transport
+import verify_record
+from fake_atlas import FakeFindSession, ObjectId
+
+
+def stored_records(seconds=10, per_second=3):
+    documents = []
+    for i in range(seconds * per_second):
+        ts = 1_767_225_600 + i // per_second
+        record = gateway.build_record({"temperature": 20.0 + i % 7}, "stm-dht11", None, anchor=False, ts=ts, device_id=f"stm32-{i % per_second}")
+        actual_hash = record["proof"]["actualHash"]
+        # Records stored before proof-derived ids carry ObjectIds.
+        record["_id"] = ObjectId(actual_hash[:24]) if i % 2 else actual_hash
+        documents.append(record)
+    return documents
+
+
+def test_since_audit_sees_every_record_across_pages(monkeypatch):
+    documents = stored_records()
+    fake = FakeFindSession(documents)
+    monkeypatch.setattr(transport, "session", lambda name: fake)
+    monkeypatch.setattr(verify_record, "FIND_PAGE_SIZE", 4)
+
+    got = list(verify_record.find_documents({"ts": {"$gte": 0}}, page_size=4))
+    assert sorted(d["_id"] for d in got) == sorted(str(d["_id"]) for d in documents)
+
+    args = Namespace(hashes_file=None, since="0", until=None, check_chain=False, workers=1)
+    report = verify_record.run_batch(args)
+    assert report["summary"] == {"total": len(documents), "pass": len(documents), "fail": 0, "missing": 0}
+
+
+def test_duplicate_stored_hash_keeps_both_results(monkeypatch):
+    documents = stored_records(seconds=2, per_second=2)
+    tampered = dict(documents[1], sensor={"temperature": 99.0}, _id="tampered")
+    tampered["proof"] = dict(documents[1]["proof"], actualHash=documents[0]["proof"]["actualHash"])
+    fake = FakeFindSession(documents + [tampered])
+    monkeypatch.setattr(transport, "session", lambda name: fake)
+
+    args = Namespace(hashes_file=None, since="0", until=None, check_chain=False, workers=1)
+    report = verify_record.run_batch(args)
+    assert report["summary"]["total"] == len(documents) + 1
+    assert report["summary"]["fail"] == 1
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+import weather_cache
+from weather_cache import WeatherCache
+
+
+class Clock:
+    """Stands in for the time module: wall and monotonic time move together."""
+
+    def __init__(self, now=1_767_225_600.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = []
+        self.fail = None  # an exception to raise, or "short" to drop a payload
+        self.version = 0
+
+    def __call__(self, coords):
+        self.calls.append(list(coords))
+        if isinstance(self.fail, Exception):
+            raise self.fail
+        payloads = [{"lat": lat, "lon": lon, "version": self.version} for lat, lon in coords]
+        return payloads[:-1] if self.fail == "short" else payloads
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(weather_cache, "time", clock)
+    return clock
+
+
+def make_cache(**kwargs):
+    fetch = Fetcher()
+    options = dict(ttl_sec=300, refresh_ahead_sec=60, max_stale_sec=3600, poll_interval_sec=5.0, max_backoff_sec=40.0)
+    options.update(kwargs)
+    return WeatherCache(fetch, **options), fetch
+
+
+def test_stale_while_revalidate(clock):
+    cache, fetch = make_cache()
+    assert cache.get(11.5624, 104.9163) is None  # a miss only marks the tile as wanted
+    assert fetch.calls == []
+
+    assert cache.refresh_due() == 1
+    assert fetch.calls == [[(11.6, 104.9)]]
+    assert cache.get(11.58, 104.91)["version"] == 0
+    assert cache.due_tiles() == []
+
+    # Inside refresh-ahead: still fresh for readers, already due for the refresher.
+    clock.advance(250)
+    assert cache.due_tiles() == [(11.6, 104.9)]
+
+    # Past the TTL the old payload is still served, counted as stale.
+    clock.advance(100)
+    fetch.version = 1
+    assert cache.get(11.6, 104.9)["version"] == 0
+    cache.refresh_due()
+    assert cache.get(11.6, 104.9)["version"] == 1
+
+    # Past max_stale_sec nothing is served.
+    clock.advance(3601)
+    assert cache.get(11.6, 104.9) is None
+    assert cache.snapshot() == {"hits": 2, "stale": 1, "misses": 2, "refreshes": 2, "failures": 0, "entries": 1}
+
+
+def test_batches_follow_batch_size(clock):
+    cache, fetch = make_cache(batch_size=2)
+    cache.warm([(10.0, 104.0), (10.0, 105.0), (11.0, 104.0), (10.01, 104.01)])
+    assert [len(chunk) for chunk in fetch.calls] == [2, 1]
+    assert cache.snapshot()["entries"] == 3
+
+
+@pytest.mark.parametrize("failure", [RuntimeError("HTTP 503"), "short"])
+def test_failed_or_short_batch_backs_off(clock, failure):
+    cache, fetch = make_cache()
+    cache.get(10.0, 104.0)
+    cache.get(10.0, 105.0)
+    fetch.fail = failure
+
+    assert cache.refresh_due() == 0
+    assert cache.snapshot()["entries"] == 0  # a short reply stores nothing
+    assert cache.refresh_due() == 0
+    assert len(fetch.calls) == 1  # still backing off
+
+    # Backoff doubles per failure up to max_backoff_sec.
+    waits = []
+    for _ in range(5):
+        start = clock.now
+        while cache.refresh_due() == 0 and len(fetch.calls) == 1 + len(waits):
+            clock.advance(1)
+        waits.append(clock.now - start)
+    assert waits == [5, 10, 20, 40, 40]
+
+    fetch.fail = None
+    clock.advance(40)
+    assert cache.refresh_due() == 2
+    assert cache.snapshot()["failures"] == 6
+    # Success resets the backoff to the poll interval.
+    fetch.fail = failure
+    clock.advance(300)
+    cache.refresh_due()
+    clock.advance(4)
+    cache.refresh_due()
+    assert len(fetch.calls) == 8
+    clock.advance(1)
+    cache.refresh_due()
+    assert len(fetch.calls) == 9
+
+
+def test_persistence_round_trip(clock, tmp_path):
+    path = str(tmp_path / "weather.json")
+    cache, _ = make_cache(persist_path=path)
+    cache.warm([(10.0, 104.0), (11.0, 105.0)])
+    assert not (tmp_path / "weather.json.tmp").exists()
+
+    restarted, fetch = make_cache(persist_path=path)
+    assert restarted.get(10.0, 104.0) == {"lat": 10.0, "lon": 104.0, "version": 0}
+    assert fetch.calls == []
+    # Restored tiles are wanted again, so they keep being refreshed.
+    clock.advance(300)
+    assert restarted.due_tiles() == [(10.0, 104.0), (11.0, 105.0)]
+
+    # A file written with another tile size is ignored.
+    with open(path, "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    assert stored["tileDeg"] == 0.1
+    other, _ = make_cache(persist_path=path, tile_deg=0.5)
+    assert other.snapshot()["entries"] == 0
@@ -5,12 +5,15 @@ Purpose:
 - Apply Kalman filtering to smooth anomalies/outliers.
 - Evaluate trend direction/strength from filtered data.
 - Keep this logic outside database writes (evaluation-time only).
+- Hold long histories in a compact columnar MetricSeries (int64/float64 arrays).
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from array import array
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 
 @dataclass
@@ -32,12 +35,29 @@ class TrendResult:
 
 @dataclass
 class SeriesAnalysis:
-    timestamps: List[int]
-    raw_values: List[float]
-    filtered_values: List[float]
-    anomaly_indices: List[int]
+    # Lists for record input; int64/float64 arrays (or views) for MetricSeries input.
+    # dataclasses.asdict() cannot copy memoryviews; use to_dict() to serialize.
+    timestamps: Sequence[int]
+    raw_values: Sequence[float]
+    filtered_values: Sequence[float]
+    anomaly_indices: Sequence[int]
     trend: TrendResult
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain lists and dicts, ready for json.dumps, whatever the column types."""
+        return {
+            "timestamps": _as_list(self.timestamps),
+            "raw_values": _as_list(self.raw_values),
+            "filtered_values": _as_list(self.filtered_values),
+            "anomaly_indices": _as_list(self.anomaly_indices),
+            "trend": asdict(self.trend),
+        }
+
+
+def _as_list(values: Sequence[Any]) -> List[Any]:
+    # memoryview, array.array and numpy arrays all convert to Python scalars via tolist().
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
 
 def _to_float(value: Any) -> Optional[float]:
     try:
@@ -70,41 +90,97 @@ def _extract_ts(record: Dict[str, Any]) -> Optional[int]:
         return None
 
 
-def kalman_filter(values: Sequence[float], cfg: KalmanConfig) -> Tuple[List[float], List[int]]:
-    """Returns (filtered_values, anomaly_indices)."""
-    if not values:
-        return [], []
+def _kalman_step(x: float, p: float, z: float, cfg: KalmanConfig) -> Tuple[float, float, bool]:
+    """One predict/update cycle. Returns (x, p, is_anomaly)."""
+    # Predict
+    p_pred = p + cfg.process_noise
+    x_pred = x
 
-    x = float(values[0])
-    p = float(cfg.initial_error)
+    # Innovation
+    innovation = z - x_pred
+    innovation_var = p_pred + cfg.measurement_noise
+    innovation_std = max(innovation_var, 1e-9) ** 0.5
 
-    filtered: List[float] = []
-    anomalies: List[int] = []
+    is_anomaly = abs(innovation) > (cfg.anomaly_sigma_threshold * innovation_std)
 
-    for i, z in enumerate(values):
-        # Predict
-        p_pred = p + cfg.process_noise
-        x_pred = x
+    # Downweight anomalous measurements
+    r_eff = cfg.measurement_noise * (6.0 if is_anomaly else 1.0)
 
-        # Innovation
-        innovation = z - x_pred
-        innovation_var = p_pred + cfg.measurement_noise
-        innovation_std = max(innovation_var, 1e-9) ** 0.5
+    # Update
+    k = p_pred / (p_pred + r_eff)
+    x = x_pred + k * innovation
+    p = (1.0 - k) * p_pred
+    return x, p, is_anomaly
 
-        is_anomaly = abs(innovation) > (cfg.anomaly_sigma_threshold * innovation_std)
-        if is_anomaly:
-            anomalies.append(i)
 
-        # Downweight anomalous measurements
-        r_eff = cfg.measurement_noise * (6.0 if is_anomaly else 1.0)
+class MetricSeries:
+    """
+    Columnar series for one device/metric: contiguous int64 timestamps and
+    float64 values, sorted by timestamp.
+
+    About 16 bytes per point versus ~150+ for a dict record, or ~64 for two
+    lists of boxed numbers. `timestamps`/`values` are memoryviews, so
+    between() slices without copying and np.asarray() wraps them without
+    copying either. Instances are immutable.
+    """
 
-        # Update
-        k = p_pred / (p_pred + r_eff)
-        x = x_pred + k * innovation
-        p = (1.0 - k) * p_pred
+    __slots__ = ("timestamps", "values")
+
+    def __init__(self, timestamps: Iterable[int] = (), values: Iterable[float] = ()):
+        ts = timestamps if isinstance(timestamps, memoryview) else memoryview(array("q", timestamps))
+        vals = values if isinstance(values, memoryview) else memoryview(array("d", values))
+        if len(ts) != len(vals):
+            raise ValueError("timestamps and values must have the same length")
+        self.timestamps = ts
+        self.values = vals
+
+    @classmethod
+    def from_records(cls, history: Iterable[Dict[str, Any]], metric_key: str) -> "MetricSeries":
+        parsed: List[Tuple[int, float]] = []
+        for rec in history:
+            ts = _extract_ts(rec)
+            val = _extract_metric(rec, metric_key)
+            if ts is None or val is None:
+                continue
+            parsed.append((ts, val))
+        parsed.sort(key=lambda x: x[0])
+        return cls((t for t, _ in parsed), (v for _, v in parsed))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def between(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> "MetricSeries":
+        """Zero-copy view of points with start_ts <= ts < end_ts."""
+        lo = 0 if start_ts is None else bisect_left(self.timestamps, start_ts)
+        hi = len(self) if end_ts is None else bisect_left(self.timestamps, end_ts)
+        hi = max(lo, hi)
+        return MetricSeries(self.timestamps[lo:hi], self.values[lo:hi])
+
+
+def _kalman_filter_into(values: Sequence[float], cfg: KalmanConfig, filtered: Any, anomalies: Any) -> None:
+    """Appends filtered values and anomaly indices to the given list/array outputs."""
+    if not len(values):
+        return
+
+    x = float(values[0])
+    p = float(cfg.initial_error)
 
+    for i, z in enumerate(values):
+        x, p, is_anomaly = _kalman_step(x, p, z, cfg)
+        if is_anomaly:
+            anomalies.append(i)
         filtered.append(x)
 
+
+def kalman_filter(values: Sequence[float], cfg: KalmanConfig) -> Tuple[List[float], List[int]]:
+    """Returns (filtered_values, anomaly_indices)."""
+    filtered: List[float] = []
+    anomalies: List[int] = []
+    _kalman_filter_into(values, cfg, filtered, anomalies)
     return filtered, anomalies
 
 
@@ -139,10 +215,12 @@ def evaluate_trend(timestamps: Sequence[int], filtered_values: Sequence[float],
     ys = list(filtered_values[:n])
 
     slope = _linear_slope(xs, ys)
+    return _trend_from_stats(slope, max(ys) - min(ys), xs[-1] - xs[0], anomaly_count, n)
+
 
+def _trend_from_stats(slope: float, y_span: float, x_range: float, anomaly_count: int, n: int) -> TrendResult:
     # Scale confidence from slope magnitude and anomaly ratio.
-    y_span = max(ys) - min(ys)
-    slope_strength = min(1.0, abs(slope) / max(0.1, y_span / max(1.0, xs[-1] - xs[0])))
+    slope_strength = min(1.0, abs(slope) / max(0.1, y_span / max(1.0, x_range)))
     anomaly_penalty = min(0.6, anomaly_count / max(1.0, n))
     confidence = max(0.0, min(1.0, slope_strength * (1.0 - anomaly_penalty)))
 
@@ -163,9 +241,10 @@ def evaluate_trend(timestamps: Sequence[int], filtered_values: Sequence[float],
 
 
 def analyze_metric_history(
-    history: Sequence[Dict[str, Any]],
-    metric_key: str,
+    history: Union[Sequence[Dict[str, Any]], MetricSeries, Any],
+    metric_key: Optional[str] = None,
     cfg: Optional[KalmanConfig] = None,
+    tier: Optional[str] = None,
 ) -> SeriesAnalysis:
     """
     Analyze a metric from historical records in memory.
@@ -173,9 +252,35 @@ def analyze_metric_history(
     Expected record examples:
     - {"ts": 1739990000, "sensor": {"temperature": 31.2}}
     - {"ts": 1739990000, "temperature": 31.2}
+
+    A MetricSeries is analyzed directly (metric_key is not needed) and the
+    result holds arrays instead of lists. With `tier` ("1h", "1d", "1w"),
+    `history` is a time_series_rollup.MetricRollup and the analysis runs on
+    one mean point per bucket of that tier.
     """
     cfg = cfg or KalmanConfig()
 
+    if tier is not None:
+        if not hasattr(history, "tier_series"):
+            raise TypeError("tier requires a MetricRollup (see time_series_rollup)")
+        history = history.tier_series(tier)
+
+    if isinstance(history, MetricSeries):
+        filtered_array = array("d")
+        anomaly_array = array("q")
+        _kalman_filter_into(history.values, cfg, filtered_array, anomaly_array)
+        trend = evaluate_trend(history.timestamps, filtered_array, anomaly_count=len(anomaly_array))
+        return SeriesAnalysis(
+            timestamps=history.timestamps,
+            raw_values=history.values,
+            filtered_values=filtered_array,
+            anomaly_indices=anomaly_array,
+            trend=trend,
+        )
+
+    if metric_key is None:
+        raise ValueError("metric_key is required when analyzing raw records")
+
     parsed: List[Tuple[int, float]] = []
     for rec in history:
         ts = _extract_ts(rec)
@@ -201,6 +306,101 @@ def analyze_metric_history(
     )
 
 
+@dataclass
+class StreamingSeriesState:
+    """
+    Incremental Kalman filter + trend state for one device/metric.
+
+    Each update() is O(1): the filter carries (x, p) and the regression keeps
+    running means and co-moments (Welford), so the slope matches
+    evaluate_trend up to floating-point rounding without revisiting history.
+    Readings older than the last accepted timestamp are skipped. The state is
+    plain data; to_dict()/from_dict() round-trip it through JSON.
+    """
+
+    cfg: KalmanConfig = field(default_factory=KalmanConfig)
+    x: float = 0.0
+    p: float = 0.0
+    count: int = 0
+    anomaly_count: int = 0
+    skipped: int = 0
+    first_ts: Optional[int] = None
+    last_ts: Optional[int] = None
+    last_filtered: Optional[float] = None
+    last_is_anomaly: bool = False
+    # Regression over (hours since first_ts, filtered value).
+    mean_x: float = 0.0
+    mean_y: float = 0.0
+    m2_x: float = 0.0
+    c_xy: float = 0.0
+    min_y: float = 0.0
+    max_y: float = 0.0
+
+    def update(self, ts: int, value: float) -> Optional[Tuple[float, bool]]:
+        """Ingest one reading. Returns (filtered_value, is_anomaly), or None if skipped."""
+        if self.last_ts is not None and ts < self.last_ts:
+            self.skipped += 1
+            return None
+
+        if self.count == 0:
+            self.x = float(value)
+            self.p = float(self.cfg.initial_error)
+            self.first_ts = ts
+
+        self.x, self.p, is_anomaly = _kalman_step(self.x, self.p, value, self.cfg)
+        if is_anomaly:
+            self.anomaly_count += 1
+
+        hours = max(0.0, (ts - self.first_ts) / 3600.0)
+        y = self.x
+        self.count += 1
+        dx = hours - self.mean_x
+        self.mean_x += dx / self.count
+        self.mean_y += (y - self.mean_y) / self.count
+        self.m2_x += dx * (hours - self.mean_x)
+        self.c_xy += dx * (y - self.mean_y)
+        self.min_y = y if self.count == 1 else min(self.min_y, y)
+        self.max_y = y if self.count == 1 else max(self.max_y, y)
+
+        self.last_ts = ts
+        self.last_filtered = y
+        self.last_is_anomaly = is_anomaly
+        return y, is_anomaly
+
+    def update_from_record(self, record: Dict[str, Any], metric_key: str) -> Optional[Tuple[float, bool]]:
+        ts = _extract_ts(record)
+        val = _extract_metric(record, metric_key)
+        if ts is None or val is None:
+            return None
+        return self.update(ts, val)
+
+    def slope(self) -> float:
+        if self.count < 2 or self.m2_x == 0:
+            return 0.0
+        return self.c_xy / self.m2_x
+
+    def trend(self) -> TrendResult:
+        if self.count < 3:
+            return TrendResult(
+                direction="stable",
+                slope=0.0,
+                confidence=0.0,
+                anomaly_count=self.anomaly_count,
+                points_used=self.count,
+            )
+        x_range = max(0.0, (self.last_ts - self.first_ts) / 3600.0)
+        return _trend_from_stats(self.slope(), self.max_y - self.min_y, x_range, self.anomaly_count, self.count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingSeriesState":
+        data = dict(data)
+        data["cfg"] = KalmanConfig(**data.get("cfg", {}))
+        return cls(**data)
+
+
 # Example usage (evaluation-only, no DB writes):
 #
 # docs = [
@@ -210,3 +410,19 @@ def analyze_metric_history(
 # ]
 # result = analyze_metric_history(docs, "temperature")
 # print(result.trend)
+#
+# Columnar storage for long histories (zero-copy time slicing):
+#
+# series = MetricSeries.from_records(docs, "temperature")
+# last_day = series.between(1739990000, 1739990000 + 86400)
+# print(analyze_metric_history(last_day).trend)
+#
+# Live updates without re-reading history:
+#
+# state = StreamingSeriesState()
+# for doc in docs:
+#     state.update_from_record(doc, "temperature")
+# checkpoint = json.dumps(state.to_dict())
+# state = StreamingSeriesState.from_dict(json.loads(checkpoint))
+# state.update(1739990900, 30.5)
+# print(state.trend(), state.last_is_anomaly)
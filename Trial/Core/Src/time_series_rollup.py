@@ -0,0 +1,260 @@
+"""
+Downsampled rollup tiers for long sensor histories.
+
+Purpose:
+- Keep 1-hour, 1-day and 1-week aggregates per device/metric (count, min,
+  max, mean, last) so long-range queries read buckets instead of raw points.
+- Update every tier in O(1) per reading as readings are ingested.
+- Keep regression sums per bucket (x = hours since bucket start), so the
+  least-squares slope over any run of buckets is exact for the raw points.
+- Feed analyze_metric_history(rollup, tier="1d") with one point per bucket.
+
+Buckets are aligned to UTC: hours and days on their boundaries, weeks on
+Mondays. Late readings update the bucket they belong to. RollupStore keeps
+at most `retention[tier]` buckets per series (DEFAULT_RETENTION: 90 days of
+hours, 2 years of days, 10 years of weeks), dropping the oldest first.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from dataclasses import asdict, dataclass, field, replace
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from time_series_analysis import MetricSeries, _extract_metric, _extract_ts
+
+TIER_SECONDS: Dict[str, int] = {"1h": 3600, "1d": 86400, "1w": 7 * 86400}
+# 1970-01-01 was a Thursday; shifting by four days starts weeks on Monday.
+TIER_OFFSETS: Dict[str, int] = {"1h": 0, "1d": 0, "1w": 4 * 86400}
+DEFAULT_METRICS: Tuple[str, ...] = ("temperature", "humidity", "moisture", "salinity", "ph")
+# Buckets kept per series and tier; None keeps every bucket.
+DEFAULT_RETENTION: Dict[str, Optional[int]] = {"1h": 90 * 24, "1d": 2 * 366, "1w": 10 * 53}
+
+
+def bucket_start(ts: int, tier: str) -> int:
+    width = TIER_SECONDS[tier]
+    return ts - (ts - TIER_OFFSETS[tier]) % width
+
+
+@dataclass
+class RollupBucket:
+    start: int
+    count: int = 0
+    min: float = 0.0
+    max: float = 0.0
+    sum: float = 0.0
+    last: float = 0.0
+    last_ts: int = 0
+    # Regression sums over (hours since start, value).
+    sum_x: float = 0.0
+    sum_xx: float = 0.0
+    sum_xy: float = 0.0
+
+    def add(self, ts: int, value: float) -> None:
+        x = (ts - self.start) / 3600.0
+        if self.count == 0:
+            self.min = self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        if self.count == 0 or ts >= self.last_ts:
+            self.last = value
+            self.last_ts = ts
+        self.count += 1
+        self.sum += value
+        self.sum_x += x
+        self.sum_xx += x * x
+        self.sum_xy += x * value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def mean_ts(self) -> int:
+        """Average timestamp of the bucket's readings."""
+        return self.start + int(round(3600.0 * self.sum_x / self.count)) if self.count else self.start
+
+
+@dataclass
+class RegressionSums:
+    """Least-squares sums for many buckets, with x in hours since `origin`."""
+
+    origin: int
+    n: int = 0
+    sum_x: float = 0.0
+    sum_y: float = 0.0
+    sum_xx: float = 0.0
+    sum_xy: float = 0.0
+
+    def add_bucket(self, bucket: RollupBucket) -> None:
+        # Shift the bucket's x (hours since its start) by d to the shared origin.
+        d = (bucket.start - self.origin) / 3600.0
+        n = bucket.count
+        self.n += n
+        self.sum_x += bucket.sum_x + n * d
+        self.sum_y += bucket.sum
+        self.sum_xx += bucket.sum_xx + 2.0 * d * bucket.sum_x + n * d * d
+        self.sum_xy += bucket.sum_xy + d * bucket.sum
+
+    def slope(self) -> float:
+        """Units per hour; 0.0 with fewer than two points or no spread in time."""
+        if self.n < 2:
+            return 0.0
+        den = self.n * self.sum_xx - self.sum_x * self.sum_x
+        if den <= 0:
+            return 0.0
+        return (self.n * self.sum_xy - self.sum_x * self.sum_y) / den
+
+
+@dataclass
+class MetricRollup:
+    """All tiers for one device/metric."""
+
+    tiers: Dict[str, Dict[int, RollupBucket]] = field(default_factory=lambda: {tier: {} for tier in TIER_SECONDS})
+    _starts: Dict[str, List[int]] = field(default_factory=lambda: {tier: [] for tier in TIER_SECONDS}, repr=False)
+
+    def add(self, ts: int, value: float) -> None:
+        for tier, buckets in self.tiers.items():
+            start = bucket_start(ts, tier)
+            bucket = buckets.get(start)
+            if bucket is None:
+                bucket = buckets[start] = RollupBucket(start)
+                starts = self._starts[tier]
+                if not starts or start > starts[-1]:
+                    starts.append(start)
+                else:
+                    insort(starts, start)
+            bucket.add(ts, value)
+
+    def buckets(self, tier: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> List[RollupBucket]:
+        """Buckets of `tier` whose start is in [start_ts, end_ts), in time order."""
+        starts = self._starts[tier]
+        lo = 0 if start_ts is None else bisect_left(starts, bucket_start(start_ts, tier))
+        hi = len(starts) if end_ts is None else bisect_left(starts, end_ts)
+        buckets = self.tiers[tier]
+        return [buckets[s] for s in starts[lo:hi]]
+
+    def tier_series(self, tier: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None, value: str = "mean") -> MetricSeries:
+        """One point per bucket (at its mean timestamp) for analyze_metric_history."""
+        buckets = self.buckets(tier, start_ts, end_ts)
+        return MetricSeries((b.mean_ts for b in buckets), (getattr(b, value) for b in buckets))
+
+    def regression(self, tier: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> RegressionSums:
+        buckets = self.buckets(tier, start_ts, end_ts)
+        sums = RegressionSums(origin=buckets[0].start if buckets else 0)
+        for bucket in buckets:
+            sums.add_bucket(bucket)
+        return sums
+
+    def trim(self, retention: Dict[str, Optional[int]]) -> int:
+        """Drops the oldest buckets beyond `retention[tier]`; returns how many were dropped."""
+        dropped = 0
+        for tier, limit in retention.items():
+            starts = self._starts.get(tier)
+            if limit is None or starts is None or len(starts) <= limit:
+                continue
+            excess = len(starts) - limit
+            buckets = self.tiers[tier]
+            for start in starts[:excess]:
+                del buckets[start]
+            del starts[:excess]
+            dropped += excess
+        return dropped
+
+    def copy(self) -> "MetricRollup":
+        """An independent copy (buckets included) that later adds do not touch."""
+        return MetricRollup(
+            tiers={tier: {s: replace(b) for s, b in buckets.items()} for tier, buckets in self.tiers.items()},
+            _starts={tier: list(starts) for tier, starts in self._starts.items()},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {tier: [asdict(buckets[s]) for s in self._starts[tier]] for tier, buckets in self.tiers.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MetricRollup":
+        rollup = cls()
+        for tier, stored in data.items():
+            if tier not in TIER_SECONDS:
+                continue
+            buckets = sorted((RollupBucket(**b) for b in stored), key=lambda b: b.start)
+            rollup.tiers[tier] = {b.start: b for b in buckets}
+            rollup._starts[tier] = [b.start for b in buckets]
+        return rollup
+
+
+class RollupStore:
+    """
+    Rollups for every (deviceId, metric), updated as records are ingested.
+    Thread-safe: get() returns a copy, so readers never see a rollup while an
+    add is changing it. to_dict()/from_dict() round-trip through JSON.
+    """
+
+    def __init__(self, metric_keys: Sequence[str] = DEFAULT_METRICS, retention: Optional[Dict[str, Optional[int]]] = None):
+        self.metric_keys = tuple(metric_keys)
+        self.retention = dict(DEFAULT_RETENTION if retention is None else retention)
+        self.rollups: Dict[Tuple[Any, str], MetricRollup] = {}
+        self._lock = Lock()
+
+    def add(self, device_id: Any, metric_key: str, ts: int, value: float) -> None:
+        with self._lock:
+            rollup = self.rollups.get((device_id, metric_key))
+            if rollup is None:
+                rollup = self.rollups[(device_id, metric_key)] = MetricRollup()
+            rollup.add(ts, value)
+            rollup.trim(self.retention)
+
+    def add_record(self, record: Dict[str, Any], group_key: str = "deviceId") -> int:
+        """Ingests every known metric in `record`; returns how many were added."""
+        ts = _extract_ts(record)
+        if ts is None:
+            return 0
+        added = 0
+        for metric_key in self.metric_keys:
+            value = _extract_metric(record, metric_key)
+            if value is not None:
+                self.add(record.get(group_key), metric_key, ts, value)
+                added += 1
+        return added
+
+    def add_records(self, records: Iterable[Dict[str, Any]], group_key: str = "deviceId") -> int:
+        return sum(self.add_record(record, group_key) for record in records)
+
+    def get(self, device_id: Any, metric_key: str) -> Optional[MetricRollup]:
+        with self._lock:
+            rollup = self.rollups.get((device_id, metric_key))
+            return rollup.copy() if rollup is not None else None
+
+    def bucket_count(self) -> Dict[str, int]:
+        with self._lock:
+            return {tier: sum(len(r.tiers[tier]) for r in self.rollups.values()) for tier in TIER_SECONDS}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "metrics": list(self.metric_keys),
+                "series": [
+                    {"deviceId": device_id, "metric": metric_key, "tiers": rollup.to_dict()}
+                    for (device_id, metric_key), rollup in self.rollups.items()
+                ],
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], retention: Optional[Dict[str, Optional[int]]] = None) -> "RollupStore":
+        store = cls(data.get("metrics", DEFAULT_METRICS), retention)
+        for item in data.get("series", []):
+            rollup = store.rollups[(item["deviceId"], item["metric"])] = MetricRollup.from_dict(item["tiers"])
+            rollup.trim(store.retention)
+        return store
+
+
+# Example usage:
+#
+# store = RollupStore()
+# store.add_records(docs)                       # or store.add_record(doc) per ingest
+# rollup = store.get("stm32-01", "temperature")
+# daily = analyze_metric_history(rollup, tier="1d")
+# weekly_means = rollup.tier_series("1w", start_ts=1735689600)
+# raw_slope_per_hour = rollup.regression("1h", start_ts=1735689600).slope()
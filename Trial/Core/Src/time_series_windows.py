@@ -0,0 +1,208 @@
+"""
+Sliding-window trend evaluation with O(1) updates.
+
+Purpose:
+- Report trend (slope, confidence, direction) over the last 1h, 24h and 7d
+  continuously, instead of one slope over the whole history.
+- Keep per-window regression sums that are updated as points enter and leave
+  the window, and monotonic deques for the window min/max, so each new point
+  costs amortized O(1) per window.
+
+A window covers (latest_ts - window_sec, latest_ts]. Its trend matches
+evaluate_trend over the same filtered points up to floating-point rounding.
+Regression x values are hours since an origin that is moved up to the oldest
+point in the window whenever as many points have left as remain, and the
+sums are recomputed then. This keeps x small (no precision loss on long runs)
+and still costs amortized O(1).
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+from time_series_analysis import (
+    KalmanConfig,
+    TrendResult,
+    _extract_metric,
+    _extract_ts,
+    _kalman_step,
+    _trend_from_stats,
+)
+
+DEFAULT_WINDOWS: Dict[str, int] = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+
+
+class SlidingWindowTrend:
+    """Trend over the filtered values of the last `window_sec` seconds."""
+
+    def __init__(self, window_sec: int):
+        self.window_sec = window_sec
+        self.anomaly_count = 0
+        self._points: Deque[Tuple[int, float, bool]] = deque()  # (ts, y, is_anomaly)
+        self._max: Deque[Tuple[int, float]] = deque()  # decreasing y
+        self._min: Deque[Tuple[int, float]] = deque()  # increasing y
+        self._origin: Optional[int] = None
+        self._evicted = 0
+        self._sx = 0.0
+        self._sy = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def add(self, ts: int, y: float, is_anomaly: bool = False) -> None:
+        """Appends a point; timestamps must not decrease."""
+        if self._origin is None:
+            self._origin = ts
+        x = (ts - self._origin) / 3600.0
+        self._points.append((ts, y, is_anomaly))
+        self._sx += x
+        self._sy += y
+        self._sxx += x * x
+        self._sxy += x * y
+        if is_anomaly:
+            self.anomaly_count += 1
+
+        while self._max and self._max[-1][1] <= y:
+            self._max.pop()
+        self._max.append((ts, y))
+        while self._min and self._min[-1][1] >= y:
+            self._min.pop()
+        self._min.append((ts, y))
+
+        self._evict(ts - self.window_sec)
+
+    def _evict(self, cutoff: int) -> None:
+        points = self._points
+        while points and points[0][0] <= cutoff:
+            ts, y, is_anomaly = points.popleft()
+            x = (ts - self._origin) / 3600.0
+            self._sx -= x
+            self._sy -= y
+            self._sxx -= x * x
+            self._sxy -= x * y
+            if is_anomaly:
+                self.anomaly_count -= 1
+            self._evicted += 1
+        while self._max and self._max[0][0] <= cutoff:
+            self._max.popleft()
+        while self._min and self._min[0][0] <= cutoff:
+            self._min.popleft()
+
+        if self._evicted and self._evicted >= len(points):
+            self._rebase()
+
+    def _rebase(self) -> None:
+        """Moves the origin to the oldest point and recomputes the sums exactly."""
+        self._evicted = 0
+        self._origin = self._points[0][0] if self._points else None
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+        for ts, y, _ in self._points:
+            x = (ts - self._origin) / 3600.0
+            self._sx += x
+            self._sy += y
+            self._sxx += x * x
+            self._sxy += x * y
+
+    def slope(self) -> float:
+        n = len(self._points)
+        if n < 2:
+            return 0.0
+        den = n * self._sxx - self._sx * self._sx
+        if den <= 0:
+            return 0.0
+        return (n * self._sxy - self._sx * self._sy) / den
+
+    def trend(self) -> TrendResult:
+        n = len(self._points)
+        if n < 3:
+            return TrendResult(
+                direction="stable",
+                slope=0.0,
+                confidence=0.0,
+                anomaly_count=self.anomaly_count,
+                points_used=n,
+            )
+        y_span = self._max[0][1] - self._min[0][1]
+        x_range = (self._points[-1][0] - self._points[0][0]) / 3600.0
+        return _trend_from_stats(self.slope(), y_span, x_range, self.anomaly_count, n)
+
+
+@dataclass
+class WindowedTrendState:
+    """
+    Incremental Kalman filter feeding one SlidingWindowTrend per window.
+
+    Filtering runs over the whole stream (as in StreamingSeriesState); each
+    window sees the filtered values and anomaly flags of its own points.
+    Readings older than the last accepted timestamp are skipped.
+    """
+
+    windows: Mapping[str, int] = field(default_factory=lambda: dict(DEFAULT_WINDOWS))
+    cfg: KalmanConfig = field(default_factory=KalmanConfig)
+    x: float = 0.0
+    p: float = 0.0
+    count: int = 0
+    skipped: int = 0
+    last_ts: Optional[int] = None
+    _trends: Dict[str, SlidingWindowTrend] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._trends = {name: SlidingWindowTrend(sec) for name, sec in self.windows.items()}
+
+    def update(self, ts: int, value: float) -> Optional[Tuple[float, bool]]:
+        """Ingest one reading. Returns (filtered_value, is_anomaly), or None if skipped."""
+        if self.last_ts is not None and ts < self.last_ts:
+            self.skipped += 1
+            return None
+
+        if self.count == 0:
+            self.x = float(value)
+            self.p = float(self.cfg.initial_error)
+
+        self.x, self.p, is_anomaly = _kalman_step(self.x, self.p, value, self.cfg)
+        self.count += 1
+        self.last_ts = ts
+        for window in self._trends.values():
+            window.add(ts, self.x, is_anomaly)
+        return self.x, is_anomaly
+
+    def update_from_record(self, record: Dict[str, Any], metric_key: str) -> Optional[Tuple[float, bool]]:
+        ts = _extract_ts(record)
+        val = _extract_metric(record, metric_key)
+        if ts is None or val is None:
+            return None
+        return self.update(ts, val)
+
+    def trends(self) -> Dict[str, TrendResult]:
+        return {name: window.trend() for name, window in self._trends.items()}
+
+
+def iter_window_trends(
+    timestamps: Iterable[int],
+    values: Iterable[float],
+    windows: Optional[Mapping[str, int]] = None,
+    cfg: Optional[KalmanConfig] = None,
+) -> Iterator[Tuple[int, Dict[str, TrendResult]]]:
+    """Yields (ts, {window: TrendResult}) after every accepted point of a sorted series."""
+    state = WindowedTrendState(dict(windows or DEFAULT_WINDOWS), cfg or KalmanConfig())
+    for ts, value in zip(timestamps, values):
+        if state.update(ts, value) is not None:
+            yield ts, state.trends()
+
+
+# Example usage:
+#
+# state = WindowedTrendState()
+# for doc in docs:
+#     state.update_from_record(doc, "temperature")
+# state.trends()["24h"].direction
+#
+# Per-point trend lines for a chart:
+#
+# series = MetricSeries.from_records(docs, "temperature")
+# for ts, trends in iter_window_trends(series.timestamps, series.values, {"1h": 3600}):
+#     ...
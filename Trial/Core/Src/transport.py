@@ -0,0 +1,88 @@
+"""
+Shared network transport for the gateway and the verifier.
+
+One pooled keep-alive requests.Session per remote service (Atlas, Open-Meteo,
+Solana JSON-RPC), plus a long-lived Solana client and the parsed payer keypair,
+so no reading pays for a TLS handshake or for rebuilding client objects.
+
+Connection errors and 429/502/503/504 replies are retried, POSTs included. A
+502/504 can come back after the upstream applied the request, so a retried
+POST may repeat a write; the writes sent here are safe to repeat. Atlas
+documents are inserted with _id set to the proof hash (a repeat fails with
+E11000, which the writer counts as stored), status updates are idempotent
+$sets, and Solana resends carry the same signed transaction, hence the same
+signature. Read timeouts are not retried and are surfaced to the caller.
+"""
+
+import threading
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from solana.rpc.api import Client as SolanaClient
+    from solders.keypair import Keypair
+except ImportError:
+    SolanaClient = None
+    Keypair = None
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+RETRY_TOTAL = 3
+RETRY_BACKOFF_SEC = 0.5
+RETRY_STATUSES = (429, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=0,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_SEC,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session(service):
+    """Returns the shared session for a named service, e.g. "atlas" or "open-meteo"."""
+    with _sessions_lock:
+        if service not in _sessions:
+            _sessions[service] = _build_session()
+        return _sessions[service]
+
+
+def close_all():
+    with _sessions_lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+    solana_client.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def solana_client(rpc_url):
+    if SolanaClient is None:
+        raise RuntimeError("Missing Solana dependencies. Install 'solana' and 'solders'.")
+    return SolanaClient(rpc_url)
+
+
+@lru_cache(maxsize=None)
+def payer_keypair(private_key_b58):
+    if Keypair is None:
+        raise RuntimeError("Missing Solana dependencies. Install 'solana' and 'solders'.")
+    return Keypair.from_base58_string(private_key_b58)
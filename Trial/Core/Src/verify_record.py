@@ -1,12 +1,15 @@
 import argparse
-import copy
-import hashlib
-import hmac
 import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-import requests
+import record_hash
 import secrets as app_secrets
+import solana_anchor
+import transport
+from atlas_writer import KeysetPager
+from merkle import verify_inclusion
 
 ATLAS_APP_ID = app_secrets.ATLAS_APP_ID
 ATLAS_API_KEY = app_secrets.ATLAS_API_KEY
@@ -16,84 +19,221 @@ ATLAS_COLLECTION = app_secrets.ATLAS_COLLECTION
 HASH_TWEAK_SECRET = app_secrets.HASH_TWEAK_SECRET
 SOLANA_RPC_URL = getattr(app_secrets, "SOLANA_RPC_URL", "https://api.devnet.solana.com")
 
-ATLAS_FIND_ONE_URL = f"https://data.mongodb-api.com/app/{ATLAS_APP_ID}/endpoint/data/v1/action/findOne"
-
-
-def canonical_json(payload):
-    return json.dumps(payload, separators=(",", ":"), sort_keys=True)
-
-
-def compute_actual_hash(payload):
-    canonical = canonical_json(payload).encode("utf-8")
-    return hashlib.sha256(canonical).hexdigest()
+ATLAS_ACTION_URL = f"https://data.mongodb-api.com/app/{ATLAS_APP_ID}/endpoint/data/v1/action"
+ATLAS_FIND_ONE_URL = f"{ATLAS_ACTION_URL}/findOne"
+ATLAS_FIND_URL = f"{ATLAS_ACTION_URL}/find"
+FIND_PAGE_SIZE = 1000
+POOL_MIN_ENTRIES = 500  # below this, hashing in-process beats starting workers
 
 
 def compute_modified_hash(actual_hash_hex):
-    digest = hmac.new(
-        HASH_TWEAK_SECRET.encode("utf-8"),
-        actual_hash_hex.encode("utf-8"),
-        hashlib.sha256,
-    ).hexdigest()
-    return digest
+    return record_hash.compute_modified_hash(actual_hash_hex, HASH_TWEAK_SECRET)
 
 
-def find_document_by_modified_hash(modified_hash):
-    headers = {
+def atlas_headers():
+    return {
         "Content-Type": "application/json",
         "api-key": ATLAS_API_KEY,
     }
-    payload = {
+
+
+def atlas_target():
+    return {
         "dataSource": ATLAS_DATA_SOURCE,
         "database": ATLAS_DB,
         "collection": ATLAS_COLLECTION,
-        "filter": {"proof.modifiedHash": modified_hash},
     }
 
-    response = requests.post(ATLAS_FIND_ONE_URL, headers=headers, data=json.dumps(payload), timeout=15)
+
+def find_document_by_modified_hash(modified_hash):
+    payload = atlas_target()
+    payload["filter"] = {"proof.modifiedHash": modified_hash}
+
+    response = transport.session("atlas").post(ATLAS_FIND_ONE_URL, headers=atlas_headers(), data=json.dumps(payload), timeout=15)
     response.raise_for_status()
     body = response.json()
     return body.get("document")
 
 
+def find_documents(filter_doc, page_size=FIND_PAGE_SIZE):
+    """Yields every document matching filter_doc in (ts, _id) order, one find call per page."""
+    pager = KeysetPager(filter_doc)
+    while True:
+        payload = atlas_target()
+        payload.update({
+            "filter": pager.filter(),
+            "sort": {"ts": 1, "_id": 1},
+            "limit": page_size,
+        })
+        response = transport.session("atlas").post(ATLAS_FIND_URL, headers=atlas_headers(), data=json.dumps(payload), timeout=30)
+        response.raise_for_status()
+        documents = response.json().get("documents", [])
+        yield from documents
+        if len(documents) < page_size:
+            return
+        pager.advance(documents)
+
+
+def find_documents_by_modified_hashes(modified_hashes):
+    found = {}
+    for i in range(0, len(modified_hashes), FIND_PAGE_SIZE):
+        chunk = modified_hashes[i:i + FIND_PAGE_SIZE]
+        for document in find_documents({"proof.modifiedHash": {"$in": chunk}}):
+            found.setdefault(str(document.get("proof", {}).get("modifiedHash", "")).lower(), document)
+    return found
+
+
+def fetch_signature_statuses(signatures):
+    """Returns {signature: status or None}, batching up to 256 signatures per RPC call."""
+    return solana_anchor.fetch_signature_statuses(SOLANA_RPC_URL, signatures)
+
+
+def signature_status_detail(status):
+    if status is None:
+        return False, "Signature not found on RPC"
+    if status.get("err") is not None:
+        return False, f"On-chain error: {status.get('err')}"
+    return True, status.get("confirmationStatus", "unknown")
+
+
 def verify_solana_signature(signature):
     if not signature:
         return False, "No signature present"
+    return signature_status_detail(fetch_signature_statuses([signature]).get(signature))
 
-    rpc_payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getSignatureStatuses",
-        "params": [[signature], {"searchTransactionHistory": True}],
-    }
-
-    response = requests.post(SOLANA_RPC_URL, json=rpc_payload, timeout=15)
-    response.raise_for_status()
-    body = response.json()
-
-    value = body.get("result", {}).get("value", [])
-    if not value or value[0] is None:
-        return False, "Signature not found on RPC"
 
-    status = value[0]
-    if status.get("err") is not None:
-        return False, f"On-chain error: {status.get('err')}"
+def verify_document(document, expected_actual_hash=None):
+    """
+    Offline integrity checks for one stored document. Returns a list of failure
+    messages, empty when the document verifies. Without an expected hash (time
+    range audits) the stored actualHash is checked against the payload itself.
+    """
+    proof = document.get("proof", {})
+    stored_actual_hash = str(proof.get("actualHash", "")).lower()
+    stored_modified_hash = str(proof.get("modifiedHash", "")).lower()
+    expected_actual_hash = expected_actual_hash or stored_actual_hash
 
-    return True, status.get("confirmationStatus", "unknown")
+    if stored_actual_hash != expected_actual_hash:
+        return ["Stored actual hash does not match input actual hash"]
 
+    if stored_modified_hash != compute_modified_hash(expected_actual_hash):
+        return ["Stored modified hash does not match computed modified hash"]
 
-def strip_non_hashed_fields(document):
-    base = copy.deepcopy(document)
-    base.pop("_id", None)
-    base.pop("proof", None)
-    return base
+    recomputed_actual_hash = record_hash.compute_document_hash(document)
+    if recomputed_actual_hash != expected_actual_hash:
+        return [
+            "Payload integrity mismatch (recomputed hash differs): "
+            f"expected {expected_actual_hash}, got {recomputed_actual_hash}"
+        ]
+
+    merkle_proof = proof.get("merkle")
+    if merkle_proof and not verify_inclusion(
+        expected_actual_hash, merkle_proof.get("path", []), str(merkle_proof.get("root", ""))
+    ):
+        return ["Merkle inclusion path does not lead to the anchored root"]
+
+    return []
+
+
+def _verify_entry(entry):
+    document, expected_actual_hash = entry
+    return verify_document(document, expected_actual_hash)
+
+
+def read_hashes(path):
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        return list(dict.fromkeys(line.strip().lower() for line in stream if line.strip()))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def parse_time(value):
+    """Unix seconds or an ISO-8601 timestamp."""
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+def run_batch(args):
+    if args.hashes_file:
+        expected_hashes = read_hashes(args.hashes_file)
+        found = find_documents_by_modified_hashes([compute_modified_hash(h) for h in expected_hashes])
+        entries = [(found.get(compute_modified_hash(h)), h) for h in expected_hashes]
+    else:
+        ts_filter = {"$gte": parse_time(args.since)}
+        if args.until:
+            ts_filter["$lt"] = parse_time(args.until)
+        entries = [
+            (document, str(document.get("proof", {}).get("actualHash", "")).lower())
+            for document in find_documents({"ts": ts_filter})
+        ]
+
+    present = [(document, h) for document, h in entries if document]
+    if len(present) < POOL_MIN_ENTRIES or args.workers == 1:
+        verified = [_verify_entry(entry) for entry in present]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            verified = pool.map(_verify_entry, present, chunksize=64)
+    # Keyed by position in entries: stored hashes need not be unique.
+    failures = dict(zip((i for i, (document, _) in enumerate(entries) if document), verified))
+
+    statuses = {}
+    if args.check_chain:
+        statuses = fetch_signature_statuses([
+            document.get("proof", {}).get("solana", {}).get("txSignature") for document, _ in present
+        ])
+
+    results = []
+    for index, (document, actual_hash) in enumerate(entries):
+        result = {"actualHash": actual_hash}
+        if not document:
+            result.update({"status": "missing", "failures": ["No MongoDB document found for this modified hash"]})
+            results.append(result)
+            continue
+
+        reasons = list(failures[index])
+        if args.check_chain:
+            signature = document.get("proof", {}).get("solana", {}).get("txSignature")
+            ok, detail = signature_status_detail(statuses.get(signature)) if signature else (False, "No signature present")
+            result["chain"] = {"txSignature": signature, "ok": ok, "detail": detail}
+            if not ok:
+                reasons.append(f"Chain verification failed: {detail}")
+
+        result.update({"status": "fail" if reasons else "pass", "failures": reasons})
+        results.append(result)
+
+    summary = {"total": len(results)}
+    for status in ("pass", "fail", "missing"):
+        summary[status] = sum(1 for r in results if r["status"] == status)
+    return {"summary": summary, "results": results}
 
 
 def main():
     parser = argparse.ArgumentParser(description="Verify DB record integrity using blockchain hash + modified hash")
-    parser.add_argument("--actual-hash", required=True, help="Actual SHA-256 hash stored/anchored on-chain")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--actual-hash", help="Actual SHA-256 hash stored/anchored on-chain")
+    source.add_argument("--hashes-file", help="Batch mode: file with one actual hash per line ('-' for stdin)")
+    source.add_argument("--since", help="Batch mode: verify every record with ts >= this (unix seconds or ISO-8601)")
+    parser.add_argument("--until", help="Batch mode: upper bound (exclusive) for --since")
     parser.add_argument("--check-chain", action="store_true", help="Also verify Solana tx signature status")
+    parser.add_argument("--workers", type=int, default=None, help="Batch mode: hash recomputation processes")
+    parser.add_argument("--report", help="Batch mode: write the JSON report here instead of stdout")
     args = parser.parse_args()
 
+    if args.actual_hash is None:
+        report = run_batch(args)
+        text = json.dumps(report, indent=2)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+            print("Summary:", json.dumps(report["summary"]))
+        else:
+            print(text)
+        sys.exit(0 if report["summary"]["pass"] == report["summary"]["total"] else 1)
+
     expected_actual_hash = args.actual_hash.strip().lower()
     expected_modified_hash = compute_modified_hash(expected_actual_hash)
 
@@ -103,30 +243,22 @@ def main():
         print("FAIL: No MongoDB document found for this modified hash")
         sys.exit(1)
 
-    proof = document.get("proof", {})
-    stored_actual_hash = str(proof.get("actualHash", "")).lower()
-    stored_modified_hash = str(proof.get("modifiedHash", "")).lower()
-
-    if stored_actual_hash != expected_actual_hash:
-        print("FAIL: Stored actual hash does not match input actual hash")
-        sys.exit(1)
-
-    if stored_modified_hash != expected_modified_hash:
-        print("FAIL: Stored modified hash does not match computed modified hash")
-        sys.exit(1)
-
-    base = strip_non_hashed_fields(document)
-    recomputed_actual_hash = compute_actual_hash(base).lower()
-    if recomputed_actual_hash != expected_actual_hash:
-        print("FAIL: Payload integrity mismatch (recomputed hash differs)")
-        print("Expected:", expected_actual_hash)
-        print("Got     :", recomputed_actual_hash)
+    failures = verify_document(document, expected_actual_hash)
+    if failures:
+        print("FAIL:", failures[0])
         sys.exit(1)
 
     print("PASS: Hash linkage and payload integrity verified")
 
+    merkle_proof = document.get("proof", {}).get("merkle")
+    if merkle_proof:
+        print(
+            f"PASS: Merkle inclusion verified (leaf {merkle_proof.get('leafIndex')} "
+            f"of {merkle_proof.get('leafCount')}, root {merkle_proof.get('root')})"
+        )
+
     if args.check_chain:
-        signature = proof.get("solana", {}).get("txSignature")
+        signature = document.get("proof", {}).get("solana", {}).get("txSignature")
         ok, detail = verify_solana_signature(signature)
         if not ok:
             print("FAIL: Chain verification failed:", detail)
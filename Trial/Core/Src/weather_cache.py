@@ -0,0 +1,176 @@
+"""
+Location-keyed weather cache with background refresh.
+
+Coordinates are snapped to a tile grid (`tile_deg`, 0.1 degrees by default),
+so boards on the same site share one entry. `get()` never does network I/O:
+it returns the cached payload for the tile, even when it is past its TTL (up
+to `max_stale_sec`, stale-while-revalidate), and marks the tile for refresh.
+A background thread refreshes every tile that is missing or within
+`refresh_ahead_sec` of expiry, in one batched multi-coordinate request per
+`batch_size` tiles, so readings never wait on the weather API.
+
+With `persist_path` set, entries are written to a JSON file after each
+refresh (atomically replaced) and loaded on start, so a restarted gateway has
+weather for its first readings.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class WeatherCache:
+    def __init__(
+        self,
+        fetch_many,
+        ttl_sec=300,
+        refresh_ahead_sec=60,
+        max_stale_sec=3600,
+        tile_deg=0.1,
+        batch_size=50,
+        poll_interval_sec=5.0,
+        max_backoff_sec=300.0,
+        persist_path=None,
+    ):
+        """fetch_many([(lat, lon), ...]) returns one weather payload per coordinate, in order."""
+        self.fetch_many = fetch_many
+        self.ttl_sec = ttl_sec
+        self.refresh_ahead_sec = min(refresh_ahead_sec, ttl_sec)
+        self.max_stale_sec = max_stale_sec
+        self.tile_deg = tile_deg
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval_sec = poll_interval_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.persist_path = persist_path
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "failures": 0}
+        self._lock = threading.Lock()
+        self._entries = {}  # tile -> {"weather": payload, "fetchedAt": unix seconds}
+        self._wanted = set()
+        self._retry_at = 0.0
+        self._backoff = self.poll_interval_sec
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    def tile(self, lat, lon):
+        step = self.tile_deg
+        return round(round(lat / step) * step, 6), round(round(lon / step) * step, 6)
+
+    def get(self, lat, lon):
+        """Cached weather for the tile holding (lat, lon), or None; never blocks on I/O."""
+        key = self.tile(lat, lon)
+        now = time.time()
+        with self._lock:
+            self._wanted.add(key)
+            entry = self._entries.get(key)
+            if entry is None or now - entry["fetchedAt"] > self.max_stale_sec:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits" if now - entry["fetchedAt"] < self.ttl_sec else "stale"] += 1
+            return entry["weather"]
+
+    def warm(self, locations):
+        """Blocking first fill for known locations, e.g. at startup; errors are logged, not raised."""
+        with self._lock:
+            self._wanted.update(self.tile(lat, lon) for lat, lon in locations)
+        self.refresh_due(force=True)
+
+    def due_tiles(self, now=None):
+        now = time.time() if now is None else now
+        horizon = self.ttl_sec - self.refresh_ahead_sec
+        with self._lock:
+            return sorted(
+                key for key in self._wanted
+                if key not in self._entries or now - self._entries[key]["fetchedAt"] >= horizon
+            )
+
+    def refresh_due(self, force=False):
+        """Fetches every due tile in batches. Returns the number of tiles refreshed."""
+        if not force and time.monotonic() < self._retry_at:
+            return 0
+        due = self.due_tiles()
+        refreshed = 0
+        for i in range(0, len(due), self.batch_size):
+            chunk = due[i:i + self.batch_size]
+            try:
+                payloads = self.fetch_many(chunk)
+                if len(payloads) != len(chunk):
+                    raise ValueError(f"got {len(payloads)} payload(s) for {len(chunk)} location(s)")
+            except Exception as e:
+                with self._lock:
+                    self.stats["failures"] += 1
+                # Keep serving what we have; retry with backoff.
+                self._retry_at = time.monotonic() + self._backoff
+                print(f"Weather refresh failed for {len(chunk)} location(s), retrying in {self._backoff:.0f}s:", e)
+                self._backoff = min(self.max_backoff_sec, self._backoff * 2)
+                break
+
+            fetched_at = time.time()
+            with self._lock:
+                for key, weather in zip(chunk, payloads):
+                    self._entries[key] = {"weather": weather, "fetchedAt": fetched_at}
+                self.stats["refreshes"] += 1
+            refreshed += len(chunk)
+            self._backoff = self.poll_interval_sec
+
+        if refreshed:
+            self._save()
+        return refreshed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="weather-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self):
+        with self._lock:
+            snap = dict(self.stats)
+            snap["entries"] = len(self._entries)
+        return snap
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval_sec):
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print("Weather refresh error:", e)
+
+    # -- persistence ----------------------------------------------------------
+
+    def _load(self):
+        if not self.persist_path:
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if stored.get("tileDeg") != self.tile_deg:
+            return
+        for item in stored.get("entries", []):
+            key = (item["lat"], item["lon"])
+            self._entries[key] = {"weather": item["weather"], "fetchedAt": item["fetchedAt"]}
+            self._wanted.add(key)
+
+    def _save(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            entries = [
+                {"lat": lat, "lon": lon, "weather": entry["weather"], "fetchedAt": entry["fetchedAt"]}
+                for (lat, lon), entry in sorted(self._entries.items())
+            ]
+        tmp_path = self.persist_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"tileDeg": self.tile_deg, "entries": entries}, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            print("Weather cache not persisted:", e)
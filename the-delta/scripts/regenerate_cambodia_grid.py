@@ -1,234 +1,654 @@
+"""
+Regenerates the boundary-clipped sensor grid for a region.
+
+Regions are JSON specs in scripts/regions/ (default: cambodia.json):
+- boundary: list of (lon, lat) rings. Rings are combined with the even-odd
+  rule, so several rings make a multipolygon and a ring inside another cuts
+  a hole.
+- step / jitter: lattice spacing and deterministic jitter in degrees.
+- basis: named Gaussian features [cx, cy, sx, sy]; clumps: [cx, cy, sx, sy, w].
+- fields: how basis features feed wetness, dryness, agriculture, highland and
+  coastal terms; water: rules that mark a point as open water.
+- properties: optional linear model for each numeric property (a base plus
+  weighted inputs, water overrides, pH offsets per soil type); missing
+  entries fall back to DEFAULT_PROPERTY_MODEL, the Cambodia calibration.
+- ranges: clamp range for each output property.
+- noise: "sha256" (default; matches the committed grids) or "counter" (a
+  much cheaper splitmix64 hash with the same spatial keying).
+
+Boundary clipping goes through a BoundaryIndex built once per worker: lattice
+rows are classified by scanline, jittered points through a latitude-bucketed
+edge index, so detailed boundaries cost close to O(points).
+
+The bounding box is cut into latitude bands that are generated on a process
+pool and merged in band order, so output does not depend on --workers.
+
+Per-point geography (basis Gaussians, clump field, local noise) is split from
+the cheap classification into properties and cached in scripts/.grid_cache/
+(one .npz per band plus an index), keyed by region, step and a digest of the
+spec keys it depends on. Editing fields, water rules or ranges then reruns
+only the classification; --no-cache skips the cache entirely.
+"""
+
+import argparse
 import hashlib
 import json
+import math
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
-
-GRID_PATH = Path(__file__).resolve().parents[1] / "public" / "cambodia_grid.json"
-STEP = 0.04
-
-# Approximate Cambodia outer boundary polygon (lon, lat).
-# This is used to clip a regular grid into a country-shaped footprint.
-CAMBODIA_POLYGON = [
-    (102.33, 13.55),
-    (102.56, 14.42),
-    (103.35, 14.31),
-    (104.70, 14.70),
-    (106.18, 14.66),
-    (107.56, 14.15),
-    (107.65, 13.58),
-    (107.28, 12.95),
-    (107.56, 12.26),
-    (107.37, 11.57),
-    (106.96, 11.12),
-    (106.36, 10.95),
-    (105.87, 10.45),
-    (104.98, 10.40),
-    (104.16, 10.49),
-    (103.53, 10.72),
-    (103.03, 10.45),
-    (102.48, 10.86),
-    (102.17, 11.40),
-    (102.23, 12.14),
-    (102.09, 12.68),
-    (102.20, 13.10),
-    (102.33, 13.55),
-]
+import numpy as np
+
+
+PUBLIC_DIR = Path(__file__).resolve().parents[1] / "public"
+REGIONS_DIR = Path(__file__).resolve().parent / "regions"
+DEFAULT_REGION = "cambodia"
+TILE_ZOOM = 9
+BAND_ROWS = 16  # lattice rows per band; one band is one unit of parallel work
+GEOGRAPHY_CACHE_DIR = Path(__file__).resolve().parent / ".grid_cache"
+GEOGRAPHY_CACHE_VERSION = 2
+# Spec keys the cached points and geography fields depend on; the rest
+# (fields, water, properties, ranges, latTrend) only feed classify_properties.
+GEOGRAPHY_KEYS = ("boundary", "step", "jitter", "basis", "clumps", "microNoise", "noise")
+
+
+# Inputs a property term can name: the fields derived in classify_properties
+# plus the two noise fields.
+PROPERTY_INPUTS = ("agriculture", "wetness", "dryness", "highland", "coastal", "latTrend", "patchNoise", "localNoise")
+
+# Cambodia's calibration; regions override per property under "properties".
+# Terms are summed in order, so reordering them changes the last bits.
+DEFAULT_PROPERTY_MODEL = {
+    "ndvi": {
+        "base": 0.22,
+        "terms": [["agriculture", 0.43], ["wetness", 0.18], ["dryness", -0.2], ["patchNoise", 0.09], ["localNoise", 0.03]],
+        "water": [0.08, 0.1],
+    },
+    "temperature": {
+        "base": 31.8,
+        "terms": [["latTrend", 0.9], ["wetness", -2.2], ["dryness", 1.5], ["highland", -1.0], ["patchNoise", 0.8], ["localNoise", 0.3]],
+    },
+    "humidity": {
+        "base": 61.5,
+        "terms": [["wetness", 24.0], ["dryness", -7.0], ["coastal", 5.0], ["patchNoise", 4.0]],
+    },
+    "soilMoisture": {
+        "base": 14.0,
+        "terms": [["wetness", 41.0], ["agriculture", 8.0], ["dryness", -12.0], ["patchNoise", 5.0]],
+        "water": [74.0, 18.0],
+    },
+    "precipitationForecast": {
+        "base": 5.0,
+        "terms": [["wetness", 54.0], ["coastal", 8.0], ["dryness", -10.0], ["patchNoise", 7.0]],
+    },
+    "ph": {
+        "base": 6.35,
+        "terms": [["wetness", 0.35], ["dryness", -0.45], ["patchNoise", 0.2]],
+        "soilOffsets": [["Lithosols", -0.25], ["Ferralsols", 0.05]],
+    },
+}
+
+
+def property_model(region, name):
+    """The region's model for one property, or Cambodia's when it has none."""
+    return region.get("properties", {}).get(name, DEFAULT_PROPERTY_MODEL[name])
+
+
+def load_region(name_or_path):
+    path = Path(name_or_path)
+    if not path.suffix:
+        path = REGIONS_DIR / f"{name_or_path}.json"
+    with path.open("r", encoding="utf-8") as f:
+        region = json.load(f)
+
+    for key in ("name", "step", "jitter", "boundary", "basis", "fields", "ranges"):
+        if key not in region:
+            raise ValueError(f"Region spec {path} is missing '{key}'")
+    if region.get("noise", "sha256") not in NOISE_SCHEMES:
+        raise ValueError(f"Region spec {path} has unknown noise scheme '{region['noise']}'")
+    if not region["boundary"] or any(len(ring) < 3 for ring in region["boundary"]):
+        raise ValueError(f"Region spec {path} needs at least one ring of 3+ points")
+    for name, model in region.get("properties", {}).items():
+        if name not in DEFAULT_PROPERTY_MODEL:
+            raise ValueError(f"Region spec {path} has a model for unknown property '{name}'")
+        for term, _ in model.get("terms", []):
+            if term not in PROPERTY_INPUTS:
+                raise ValueError(f"Region spec {path} property '{name}' uses unknown input '{term}'")
+    return region
+
+
+def grid_path(region):
+    return PUBLIC_DIR / f"{region['name']}_grid.json"
+
+
+def tiles_dir(region):
+    return PUBLIC_DIR / f"{region['name']}_grid_tiles"
 
 
 def clamp(value, low, high):
-    return max(low, min(high, value))
+    return np.maximum(low, np.minimum(high, value))
+
+
+def exact_pow(base, exponents):
+    # np.power may use SIMD kernels that differ from libm pow() in the last ulp;
+    # math.pow keeps results bit-identical to the committed grid.
+    flat = np.asarray(exponents, dtype=np.float64).ravel()
+    out = np.fromiter(map(math.pow, repeat(base, flat.size), flat.tolist()), dtype=np.float64, count=flat.size)
+    return out.reshape(np.shape(exponents))
+
+
+def round_half_even(values, ndigits):
+    """Vectorized equivalent of Python's round(value, ndigits) for float arrays."""
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    out = np.rint(scaled) / scale
+    # Near-ties can round differently after scaling; settle those with round() itself.
+    ambiguous = np.nonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)[0]
+    for i in ambiguous:
+        out[i] = round(float(values[i]), ndigits)
+    return out
 
 
 def gauss(lon, lat, cx, cy, sx, sy):
     dx = (lon - cx) / sx
     dy = (lat - cy) / sy
-    return pow(2.718281828, -(dx * dx + dy * dy))
+    return exact_pow(2.718281828, -(dx * dx + dy * dy))
 
 
-def stable_noise(key, amplitude=1.0):
-    digest = hashlib.sha256(key.encode("utf-8")).digest()
-    raw = int.from_bytes(digest[:8], "big") / float(2**64 - 1)
+def stable_noise_grid(prefix, lons, lats, amplitude=1.0):
+    """
+    Noise in [-amplitude, amplitude] per point from the first 8 bytes of
+    sha256(f"{prefix}{lon:.3f}:{lat:.3f}"), as an array.
+    """
+    raw = np.fromiter(
+        (
+            int.from_bytes(hashlib.sha256(f"{prefix}{lon:.3f}:{lat:.3f}".encode("utf-8")).digest()[:8], "big")
+            / float(2**64 - 1)
+            for lon, lat in zip(np.asarray(lons).tolist(), np.asarray(lats).tolist())
+        ),
+        dtype=np.float64,
+        count=len(lons),
+    )
     return (raw * 2.0 - 1.0) * amplitude
 
 
-def clump_noise(lon, lat):
+# Counter-based noise: a splitmix64 finalizer over (seed, milli-degree lon,
+# milli-degree lat). Same 0.001 degree keying as the SHA-256 scheme, but a few
+# integer ops per point and fully vectorized.
+_U64 = np.uint64
+
+
+def noise_seed(prefix):
+    return int.from_bytes(hashlib.sha256(prefix.encode("utf-8")).digest()[:8], "big")
+
+
+def mix64_array(x):
+    """The splitmix64 finalizer over a uint64 array; multiplication wraps modulo 2**64."""
+    x = x + _U64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> _U64(30))) * _U64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> _U64(27))) * _U64(0x94D049BB133111EB)
+    return x ^ (x >> _U64(31))
+
+
+def counter_noise_grid(prefix, lons, lats, amplitude=1.0):
+    """
+    Noise in [-amplitude, amplitude) per point: the top 53 bits of
+    splitmix64(splitmix64(seed ^ milli-lon) ^ milli-lat), as an array.
+    """
+    ix = np.rint(np.asarray(lons, dtype=np.float64) * 1000.0).astype(np.int64).view(np.uint64)
+    iy = np.rint(np.asarray(lats, dtype=np.float64) * 1000.0).astype(np.int64).view(np.uint64)
+    h = mix64_array(mix64_array(_U64(noise_seed(prefix)) ^ ix) ^ iy)
+    raw = (h >> _U64(11)).astype(np.float64) * 2.0 ** -53
+    return (raw * 2.0 - 1.0) * amplitude
+
+
+# "sha256" reproduces the committed grids bit for bit; "counter" is the fast path.
+NOISE_SCHEMES = {
+    "sha256": stable_noise_grid,
+    "counter": counter_noise_grid,
+}
+
+
+def region_noise(region, prefix, lons, lats, amplitude=1.0):
+    return NOISE_SCHEMES[region.get("noise", "sha256")](prefix, lons, lats, amplitude)
+
+
+def clump_noise(lons, lats, region):
     """
     Smooth, blob-like noise field (not axis-aligned buckets), used to avoid
     rectangular artifacts in the rendered map.
     """
-    centers = [
-        (103.2, 11.2, 0.38, 0.45, 0.9),
-        (104.1, 12.6, 0.42, 0.36, -0.7),
-        (105.0, 13.1, 0.55, 0.40, 0.8),
-        (106.1, 12.8, 0.50, 0.44, -0.6),
-        (104.9, 11.1, 0.46, 0.38, 0.7),
-        (103.8, 13.6, 0.52, 0.48, -0.5),
-        (106.6, 13.8, 0.55, 0.42, 0.6),
-    ]
-
-    v = 0.0
-    for cx, cy, sx, sy, w in centers:
-        v += w * gauss(lon, lat, cx, cy, sx, sy)
+    v = np.zeros(len(lons), dtype=np.float64)
+    for cx, cy, sx, sy, w in region.get("clumps", []):
+        v = v + w * gauss(lons, lats, cx, cy, sx, sy)
 
     # low-amplitude irregularity, still continuous in space
-    v += 0.18 * stable_noise(f"micro:{lon:.3f}:{lat:.3f}")
+    v = v + region.get("microNoise", 0.18) * region_noise(region, "micro:", lons, lats)
     return clamp(v, -1.0, 1.0)
 
 
-def point_in_polygon(lon, lat, polygon):
-    inside = False
-    j = len(polygon) - 1
-    for i in range(len(polygon)):
-        xi, yi = polygon[i]
-        xj, yj = polygon[j]
-        intersects = ((yi > lat) != (yj > lat)) and (
-            lon < (xj - xi) * (lat - yi) / ((yj - yi) + 1e-12) + xi
-        )
-        if intersects:
-            inside = not inside
-        j = i
-    return inside
-
-
-def generate_grid_points():
-    lons = [p[0] for p in CAMBODIA_POLYGON]
-    lats = [p[1] for p in CAMBODIA_POLYGON]
-    min_lon, max_lon = min(lons), max(lons)
-    min_lat, max_lat = min(lats), max(lats)
-
-    points = []
-    lat = min_lat
-    while lat <= max_lat:
-        lon = min_lon
-        while lon <= max_lon:
-            if point_in_polygon(lon, lat, CAMBODIA_POLYGON):
-                # Keep slight deterministic jitter for natural look without random reruns.
-                j_lon = lon + stable_noise(f"jlon:{lon:.3f}:{lat:.3f}", 0.010)
-                j_lat = lat + stable_noise(f"jlat:{lon:.3f}:{lat:.3f}", 0.010)
-
-                if point_in_polygon(j_lon, j_lat, CAMBODIA_POLYGON):
-                    points.append((round(j_lon, 3), round(j_lat, 3)))
-                else:
-                    points.append((round(lon, 3), round(lat, 3)))
-            lon += STEP
-        lat += STEP
-
-    # De-duplicate from rounding.
-    points = sorted(set(points))
-    return points
+class BoundaryIndex:
+    """
+    Even-odd point-in-boundary tests over every edge of every ring.
+
+    Lattice rows use a scanline: the crossings of one latitude with the
+    boundary are computed once and sorted, then the whole row is classified
+    with a binary search. Arbitrary points (e.g. jittered ones) go through a
+    latitude-bucket edge index, so each point is only tested against the
+    edges that span its bucket. Both paths evaluate the same crossing
+    expression as a plain ray cast, so results are identical to one; the cost
+    is near O(points) instead of O(points x edges).
+    """
+
+    def __init__(self, rings):
+        xi, yi, xj, yj = [], [], [], []
+        for ring in rings:
+            j = len(ring) - 1
+            for i in range(len(ring)):
+                xi.append(ring[i][0])
+                yi.append(ring[i][1])
+                xj.append(ring[j][0])
+                yj.append(ring[j][1])
+                j = i
+        self.xi = np.array(xi, dtype=np.float64)
+        self.yi = np.array(yi, dtype=np.float64)
+        self.xj = np.array(xj, dtype=np.float64)
+        self.yj = np.array(yj, dtype=np.float64)
+        self._build_buckets()
+
+    def _build_buckets(self):
+        y_lo = np.minimum(self.yi, self.yj)
+        y_hi = np.maximum(self.yi, self.yj)
+        self.y0 = float(y_lo.min())
+        span = max(float(y_hi.max()) - self.y0, 1e-9)
+        self.n_buckets = int(max(1, min(4096, len(self.xi))))
+        self.bucket_h = span / self.n_buckets
+
+        # One bucket of slack on each side so float error in the bucket maths
+        # can only add candidate edges, never drop one.
+        first = np.clip(((y_lo - self.y0) / self.bucket_h).astype(np.int64) - 1, 0, self.n_buckets - 1)
+        last = np.clip(((y_hi - self.y0) / self.bucket_h).astype(np.int64) + 1, 0, self.n_buckets - 1)
+        counts = last - first + 1
+        edge_ids = np.repeat(np.arange(len(self.xi)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        bucket_of = np.repeat(first, counts) + offsets
+
+        order = np.argsort(bucket_of, kind="stable")
+        self.bucket_edges = edge_ids[order]
+        self.bucket_start = np.searchsorted(bucket_of[order], np.arange(self.n_buckets + 1))
+
+    def _crossings(self, edges, lats):
+        """(points x edges) mask of `ray from the point crosses the edge`."""
+        xi, yi, xj, yj = self.xi[edges], self.yi[edges], self.xj[edges], self.yj[edges]
+        lat = lats[:, None]
+        return ((yi > lat) != (yj > lat)), (xj - xi) * (lat - yi) / ((yj - yi) + 1e-12) + xi
+
+    def contains_rows(self, row_lats, lons):
+        """Scanline classification of a lattice; returns a (rows, lons) mask."""
+        lons = np.asarray(lons, dtype=np.float64)
+        mask = np.zeros((len(row_lats), len(lons)), dtype=bool)
+        for r, lat in enumerate(np.asarray(row_lats, dtype=np.float64)):
+            straddles, x_cross = self._crossings(slice(None), np.array([lat]))
+            xs = np.sort(x_cross[0][straddles[0]])
+            # Crossings strictly to the right of each lon; odd means inside.
+            right = len(xs) - np.searchsorted(xs, lons, side="right")
+            mask[r] = (right % 2) == 1
+        return mask
+
+    def contains(self, lons, lats):
+        """Classification of arbitrary points through the bucket index."""
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        inside = np.zeros(lons.shape, dtype=bool)
+        if not lons.size:
+            return inside
+
+        bucket = np.floor((lats - self.y0) / self.bucket_h)
+        in_range = (bucket >= 0) & (bucket < self.n_buckets)
+        idx = np.nonzero(in_range)[0]
+        bucket = bucket[idx].astype(np.int64)
+        order = np.argsort(bucket, kind="stable")
+        idx, bucket = idx[order], bucket[order]
+        bounds = np.searchsorted(bucket, np.arange(self.n_buckets + 1))
+
+        for b in np.nonzero(np.diff(bounds))[0]:
+            pts = idx[bounds[b]:bounds[b + 1]]
+            edges = self.bucket_edges[self.bucket_start[b]:self.bucket_start[b + 1]]
+            if not len(edges):
+                continue
+            straddles, x_cross = self._crossings(edges, lats[pts])
+            hits = straddles & (lons[pts][:, None] < x_cross)
+            inside[pts] = (hits.sum(axis=1) % 2) == 1
+        return inside
+
+
+def region_bbox(region):
+    lons = [p[0] for ring in region["boundary"] for p in ring]
+    lats = [p[1] for ring in region["boundary"] for p in ring]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def lattice(start, stop, step):
+    """start, start+step, ... <= stop, accumulated exactly like `x += step`."""
+    count = int((stop - start) / step) + 2
+    values = np.cumsum(np.concatenate(([start], np.full(count, step))))
+    return values[values <= stop]
+
+
+def band_points(band_lats, grid_lons, region, index):
+    keep = index.contains_rows(band_lats, grid_lons).ravel()
+    grid_lat, grid_lon = np.meshgrid(band_lats, grid_lons, indexing="ij")
+    lon = grid_lon.ravel()[keep]
+    lat = grid_lat.ravel()[keep]
+
+    # Keep slight deterministic jitter for natural look without random reruns.
+    j_lon = lon + region_noise(region, "jlon:", lon, lat, region["jitter"])
+    j_lat = lat + region_noise(region, "jlat:", lon, lat, region["jitter"])
+
+    jitter_ok = index.contains(j_lon, j_lat)
+    out_lon = round_half_even(np.where(jitter_ok, j_lon, lon), 3)
+    out_lat = round_half_even(np.where(jitter_ok, j_lat, lat), 3)
+    return set(zip(out_lon.tolist(), out_lat.tolist()))
+
+
+_worker_region = None
+_worker_index = None
+
+
+def _init_worker(region):
+    global _worker_region, _worker_index
+    _worker_region = region
+    _worker_index = BoundaryIndex(region["boundary"])
+
+
+def _generate_band(args):
+    band_lats, grid_lons = args
+    points = sorted(band_points(band_lats, grid_lons, _worker_region, _worker_index))
+    if not points:
+        return points, {}
+    return points, geography_fields(*point_arrays(points), _worker_region)
+
+
+def _ordered_results(pool, tasks, window):
+    """pool.map that keeps at most `window` bands in flight, so memory stays bounded."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(_generate_band, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_geography_bands(region, band_rows=BAND_ROWS, workers=1):
+    """
+    Yields (points, geography fields) one latitude band at a time, in band
+    order, with points sorted and de-duplicated. Bands are generated on a
+    process pool when workers > 1; the merge is identical either way.
+    """
+    min_lon, min_lat, max_lon, max_lat = region_bbox(region)
+    grid_lons = lattice(min_lon, max_lon, region["step"])
+    grid_lats = lattice(min_lat, max_lat, region["step"])
+    starts = range(0, len(grid_lats), band_rows)
+    tasks = ((grid_lats[start:start + band_rows], grid_lons) for start in starts)
+
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(region,))
+        results = _ordered_results(pool, tasks, 2 * workers)
+    else:
+        pool = None
+        _init_worker(region)
+        results = map(_generate_band, tasks)
+
+    # Rounded, jittered points can only collide with points near the band edge.
+    reach = 2 * region["jitter"] + 0.001
+    carried = set()
+    try:
+        for start, (points, geography) in zip(starts, results):
+            fresh = [i for i, p in enumerate(points) if p not in carried]
+            if len(fresh) < len(points):
+                points = [points[i] for i in fresh]
+                geography = {key: values[fresh] for key, values in geography.items()} if points else {}
+            yield points, geography
+
+            if start + band_rows < len(grid_lats):
+                edge = grid_lats[start + band_rows] - reach
+                carried = {p for p in carried.union(points) if p[1] >= edge}
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def geography_cache_path(region, cache_dir, band_rows=BAND_ROWS):
+    """Cache directory for a region and step; the digest covers every spec key the fields depend on."""
+    spec = {key: region.get(key) for key in GEOGRAPHY_KEYS}
+    spec.update({
+        "noise": region.get("noise", "sha256"),
+        "microNoise": region.get("microNoise", 0.18),
+        "clumps": region.get("clumps", []),
+        "bandRows": band_rows,
+        "version": GEOGRAPHY_CACHE_VERSION,
+    })
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return Path(cache_dir) / f"{region['name']}-step{region['step']:g}-{digest}"
+
+
+def _band_file(directory, index):
+    return directory / f"band-{index:05d}.npz"
+
+
+def save_geography_band(directory, index, points, geography):
+    arrays = {
+        "lon": np.array([p[0] for p in points], dtype=np.float64),
+        "lat": np.array([p[1] for p in points], dtype=np.float64),
+    }
+    arrays.update(geography)
+    with _band_file(directory, index).open("wb") as f:
+        np.savez(f, **arrays)
+
+
+def load_geography_bands(path):
+    """Yields the cached bands one file at a time; empty bands have no file."""
+    with (path / "index.json").open("r", encoding="utf-8") as f:
+        sizes = json.load(f)["bandSizes"]
+    for index, size in enumerate(sizes):
+        if not size:
+            yield [], {}
+            continue
+        with np.load(_band_file(path, index)) as data:
+            arrays = {key: data[key] for key in data.files}
+        points = list(zip(arrays.pop("lon").tolist(), arrays.pop("lat").tolist()))
+        yield points, arrays
+
+
+def cached_geography_bands(region, cache_dir, band_rows=BAND_ROWS, workers=1):
+    """
+    iter_geography_bands, read from the on-disk cache when present and written
+    to it otherwise. Each band is written as it is produced, so memory stays
+    flat; the index is written last and the directory renamed into place, so
+    only a complete run is ever read back.
+    """
+    path = geography_cache_path(region, cache_dir, band_rows)
+    if (path / "index.json").exists():
+        yield from load_geography_bands(path)
+        return
+
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    tmp_path.mkdir(parents=True)
+    try:
+        sizes = []
+        for index, (points, geography) in enumerate(iter_geography_bands(region, band_rows, workers)):
+            if points:
+                save_geography_band(tmp_path, index, points, geography)
+            sizes.append(len(points))
+            yield points, geography
+
+        with (tmp_path / "index.json").open("w", encoding="utf-8") as f:
+            json.dump({"version": GEOGRAPHY_CACHE_VERSION, "bandSizes": sizes}, f)
+        if path.exists():
+            shutil.rmtree(path)  # an incomplete directory from an older run
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def iter_grid_bands(region, band_rows=BAND_ROWS, workers=1, cache_dir=None):
+    """
+    Yields (points, property columns) one latitude band at a time, in band
+    order. With cache_dir, geography fields come from (or go to) the cache, so
+    only classify_properties runs when just thresholds or weights changed.
+    """
+    if cache_dir is None:
+        bands = iter_geography_bands(region, band_rows, workers)
+    else:
+        bands = cached_geography_bands(region, cache_dir, band_rows, workers)
+    for points, geography in bands:
+        yield points, property_columns(points, region, geography)
 
 
 def choose_soil_type(wetness, dryness, mountain, patch_noise):
     # Keep to existing categories used in the dataset.
-    if mountain > 0.45 or dryness > 0.5:
-        return "Lithosols"
-    if wetness > 0.55:
-        return "Acrisols" if patch_noise > -0.2 else "Ferralsols"
-    return "Ferralsols" if patch_noise > 0.1 else "Acrisols"
+    return np.select(
+        [
+            (mountain > 0.45) | (dryness > 0.5),
+            (wetness > 0.55) & (patch_noise > -0.2),
+            wetness > 0.55,
+            patch_noise > 0.1,
+        ],
+        ["Lithosols", "Acrisols", "Ferralsols", "Ferralsols"],
+        default="Acrisols",
+    )
 
 
 def risk_level(temp, humidity, soil_moisture, precip, ph, is_water):
-    score = 0
-    if temp > 34:
-        score += 2
-    elif temp > 32:
-        score += 1
+    score = np.zeros(len(temp), dtype=np.int64)
+    score += np.where(temp > 34, 2, np.where(temp > 32, 1, 0))
+    score += humidity < 58
+    score += np.where(soil_moisture < 18, 2, np.where(soil_moisture < 25, 1, 0))
+    score += precip < 5
+    score += (ph < 5.2) | (ph > 7.8)
 
-    if humidity < 58:
-        score += 1
+    # Flood risk bump for very wet locations.
+    flood = is_water & (precip > 45)
+    score += np.where(flood, 2, np.where(~flood & (soil_moisture > 75) & (precip > 50), 1, 0))
 
-    if soil_moisture < 18:
-        score += 2
-    elif soil_moisture < 25:
-        score += 1
+    return np.select([score >= 5, score >= 3, score >= 1], ["Critical", "High", "Medium"], default="Low")
 
-    if precip < 5:
-        score += 1
 
-    if ph < 5.2 or ph > 7.8:
-        score += 1
+def weighted_sum(basis, terms, complement=None):
+    """Σ weight * basis[name] in spec order, plus an optional weight * (1 - field) term."""
+    total = None
+    for name, weight in terms:
+        term = weight * basis[name]
+        total = term if total is None else total + term
+    if complement is not None:
+        weight, field = complement
+        term = weight * (1.0 - field)
+        total = term if total is None else total + term
+    return total
 
-    # Flood risk bump for very wet locations.
-    if is_water and precip > 45:
-        score += 2
-    elif soil_moisture > 75 and precip > 50:
-        score += 1
-
-    if score >= 5:
-        return "Critical"
-    if score >= 3:
-        return "High"
-    if score >= 1:
-        return "Medium"
-    return "Low"
-
-
-def generate_properties(lon, lat):
-
-    # Large-scale geographic structures for Cambodia.
-    tonle_sap = gauss(lon, lat, 104.25, 12.85, 0.55, 0.42)
-    mekong_corridor = gauss(lon, lat, 104.95, 11.65, 0.60, 0.50)
-    northwest_plains = gauss(lon, lat, 103.75, 13.15, 0.75, 0.55)
-    northeast_dry = gauss(lon, lat, 106.45, 13.65, 0.85, 0.65)
-    cardamom_highland = gauss(lon, lat, 103.45, 12.05, 0.55, 0.45)
-    coastal_wet = gauss(lon, lat, 103.35, 10.70, 0.65, 0.40)
-
-    wetness = clamp(0.58 * tonle_sap + 0.45 * mekong_corridor + 0.30 * coastal_wet, 0.0, 1.0)
-    dryness = clamp(0.70 * northeast_dry + 0.22 * (1.0 - wetness), 0.0, 1.0)
-    agri_potential = clamp(0.52 * northwest_plains + 0.44 * mekong_corridor + 0.28 * (1.0 - dryness), 0.0, 1.0)
 
-    # Blob-like homogeneous patches using smooth clump field (no rectangular bins).
-    patch_noise = clump_noise(lon, lat)
-    local_noise = stable_noise(f"{lon:.3f}:{lat:.3f}", amplitude=1.0)
+def basis_fields(lons, lats, region):
+    return {name: gauss(lons, lats, *params) for name, params in region["basis"].items()}
 
-    is_water = tonle_sap > 0.58 or (mekong_corridor > 0.72 and patch_noise > 0.30)
 
-    ndvi = 0.22 + 0.43 * agri_potential + 0.18 * wetness - 0.20 * dryness + 0.09 * patch_noise + 0.03 * local_noise
-    if is_water:
-        ndvi = 0.08 + 0.10 * max(0.0, patch_noise)
-    ndvi = round(clamp(ndvi, 0.05, 0.93), 2)
+def geography_fields(lons, lats, region):
+    """
+    The expensive per-point inputs to classify_properties: every basis
+    Gaussian, the clump field and the local noise. They depend only on the
+    point positions and the GEOGRAPHY_KEYS of the spec.
+    """
+    geography = {f"basis:{name}": values for name, values in basis_fields(lons, lats, region).items()}
+    geography["patchNoise"] = clump_noise(lons, lats, region)
+    geography["localNoise"] = region_noise(region, "", lons, lats, amplitude=1.0)
+    return geography
+
+
+def linear_property(model, inputs, is_water=None):
+    """model["base"] + Σ weight * input in spec order, with the optional water override."""
+    value = model["base"]
+    for name, weight in model.get("terms", []):
+        value = value + weight * inputs[name]
+    if is_water is not None and "water" in model:
+        base, weight = model["water"]
+        value = np.where(is_water, base + weight * np.maximum(0.0, inputs["patchNoise"]), value)
+    return value
+
+
+def classify_properties(lats, geography, region):
+    """Property columns (arrays) in output key order from the geography fields: weights, thresholds and risk scoring."""
+    zeros = np.zeros(len(lats), dtype=np.float64)
+    ranges = region["ranges"]
+    fields = region["fields"]
+
+    # Large-scale geographic structures for the region.
+    basis = {name: geography[f"basis:{name}"] for name in region["basis"]}
+    highland = basis.get(fields.get("highland"), zeros)
+    coastal = basis.get(fields.get("coastal"), zeros)
+
+    wetness = clamp(weighted_sum(basis, fields["wetness"]["terms"]), 0.0, 1.0)
+    dry = fields["dryness"]
+    dryness = clamp(weighted_sum(basis, dry.get("terms", []), (dry.get("notWetness", 0.0), wetness)), 0.0, 1.0)
+    agri = fields["agriculture"]
+    agri_potential = clamp(weighted_sum(basis, agri.get("terms", []), (agri.get("notDryness", 0.0), dryness)), 0.0, 1.0)
 
-    is_agricultural = (not is_water) and (agri_potential > 0.35 or ndvi > 0.42)
+    # Blob-like homogeneous patches using smooth clump field (no rectangular bins).
+    patch_noise = geography["patchNoise"]
+    local_noise = geography["localNoise"]
 
-    soil_type = choose_soil_type(wetness, dryness, cardamom_highland, patch_noise)
+    is_water = np.zeros(len(lats), dtype=bool)
+    for rule in region.get("water", []):
+        hit = basis[rule["basis"]] > rule["above"]
+        if "patchAbove" in rule:
+            hit &= patch_noise > rule["patchAbove"]
+        is_water |= hit
 
     # Slight north/south climatic trend with regional modulation.
-    lat_trend = clamp((12.4 - lat) / 2.8, -1.0, 1.0)
-
-    temperature = (
-        31.8
-        + 0.9 * lat_trend
-        - 2.2 * wetness
-        + 1.5 * dryness
-        - 1.0 * cardamom_highland
-        + 0.8 * patch_noise
-        + 0.3 * local_noise
-    )
-    temperature = round(clamp(temperature, 22.5, 37.8), 1)
+    lat_trend = clamp((region["latTrend"]["center"] - lats) / region["latTrend"]["scale"], -1.0, 1.0)
+
+    inputs = {
+        "agriculture": agri_potential,
+        "wetness": wetness,
+        "dryness": dryness,
+        "highland": highland,
+        "coastal": coastal,
+        "latTrend": lat_trend,
+        "patchNoise": patch_noise,
+        "localNoise": local_noise,
+    }
+
+    def linear(name):
+        return linear_property(property_model(region, name), inputs, is_water)
+
+    ndvi = round_half_even(clamp(linear("ndvi"), *ranges["ndvi"]), 2)
 
-    humidity = 61.5 + 24.0 * wetness - 7.0 * dryness + 5.0 * coastal_wet + 4.0 * patch_noise
-    humidity = round(clamp(humidity, 42.0, 96.0), 1)
+    is_agricultural = ~is_water & ((agri_potential > 0.35) | (ndvi > 0.42))
 
-    soil_moisture = 14.0 + 41.0 * wetness + 8.0 * agri_potential - 12.0 * dryness + 5.0 * patch_noise
-    if is_water:
-        soil_moisture = 74.0 + 18.0 * max(0.0, patch_noise)
-    soil_moisture = round(clamp(soil_moisture, 7.0, 98.0), 1)
+    soil_type = choose_soil_type(wetness, dryness, highland, patch_noise)
 
-    precipitation_forecast = 5.0 + 54.0 * wetness + 8.0 * coastal_wet - 10.0 * dryness + 7.0 * patch_noise
-    precipitation_forecast = round(clamp(precipitation_forecast, 0.0, 92.0), 1)
+    temperature = round_half_even(clamp(linear("temperature"), *ranges["temperature"]), 1)
+    humidity = round_half_even(clamp(linear("humidity"), *ranges["humidity"]), 1)
+    soil_moisture = round_half_even(clamp(linear("soilMoisture"), *ranges["soilMoisture"]), 1)
+    precipitation_forecast = round_half_even(clamp(linear("precipitationForecast"), *ranges["precipitationForecast"]), 1)
 
-    ph = 6.35 + 0.35 * wetness - 0.45 * dryness + 0.20 * patch_noise
-    if soil_type == "Lithosols":
-        ph -= 0.25
-    elif soil_type == "Ferralsols":
-        ph += 0.05
-    ph = round(clamp(ph, 4.8, 8.2), 1)
+    ph = linear("ph")
+    for soil, offset in property_model(region, "ph").get("soilOffsets", []):
+        ph = np.where(soil_type == soil, ph + offset, ph)
+    ph = round_half_even(clamp(ph, *ranges["ph"]), 1)
 
     risk = risk_level(temperature, humidity, soil_moisture, precipitation_forecast, ph, is_water)
 
     return {
-        "isAgricultural": bool(is_agricultural),
-        "isWater": bool(is_water),
+        "isAgricultural": is_agricultural,
+        "isWater": is_water,
         "soilType": soil_type,
         "ph": ph,
         "temperature": temperature,
@@ -240,32 +660,185 @@ def generate_properties(lon, lat):
     }
 
 
-def build_feature(lon, lat):
-    return {
-        "type": "Feature",
-        "geometry": {
-            "type": "Point",
-            "coordinates": [lon, lat],
-        },
-        "properties": generate_properties(lon, lat),
-    }
-
-
+def point_arrays(points):
+    lons = np.array([p[0] for p in points], dtype=np.float64)
+    lats = np.array([p[1] for p in points], dtype=np.float64)
+    return lons, lats
+
+
+def property_columns(points, region, geography=None):
+    """classify_properties for a list of (lon, lat) points, as plain Python lists."""
+    if not points:
+        return {}
+    lons, lats = point_arrays(points)
+    if geography is None:
+        geography = geography_fields(lons, lats, region)
+    return {key: values.tolist() for key, values in classify_properties(lats, geography, region).items()}
+
+
+def build_features(points, columns):
+    keys = list(columns)
+    features = []
+    for i, (lon, lat) in enumerate(points):
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat],
+            },
+            "properties": {key: columns[key][i] for key in keys},
+        })
+    return features
+
+
+def tile_xy(lons, lats, zoom):
+    """Web Mercator (slippy map) tile indices for arrays of points."""
+    n = 2 ** zoom
+    lat_rad = np.radians(lats)
+    x = np.floor((np.asarray(lons) + 180.0) / 360.0 * n).astype(np.int64)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    n = 2 ** zoom
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return [round(west, 6), round(south, 6), round(east, 6), round(north, 6)]
+
+
+class TileWriter:
+    """
+    Streams features into compact per-tile GeoJSON files ({z}/{x}/{y}.json).
+    Features are buffered per tile until flush() (once per band), which
+    appends each buffer to its file and closes it again, so only one file is
+    open at a time however many tiles a region spans. close() terminates
+    every file and writes manifest.json listing every tile with its bounds
+    and feature count.
+    """
 
-def main():
-    points = generate_grid_points()
-    features = [build_feature(lon, lat) for lon, lat in points]
+    def __init__(self, directory, zoom, region):
+        self.directory = Path(directory)
+        self.zoom = zoom
+        self.region = region
+        self._pending = {}
+        self._counts = {}
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True)
+
+    def _path(self, x, y):
+        return f"{self.zoom}/{x}/{y}.json"
+
+    def add(self, x, y, feature):
+        self._pending.setdefault((x, y), []).append(json.dumps(feature, ensure_ascii=False, separators=(",", ":")))
+
+    def flush(self):
+        for (x, y), features in self._pending.items():
+            path = self.directory / self._path(x, y)
+            written = self._counts.get((x, y))
+            if written is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with path.open("w", encoding="utf-8") as f:
+                    f.write('{"type":"FeatureCollection","features":[')
+                    f.write(",".join(features))
+            else:
+                with path.open("a", encoding="utf-8") as f:
+                    f.write(",")
+                    f.write(",".join(features))
+            self._counts[(x, y)] = (written or 0) + len(features)
+        self._pending = {}
+
+    def close(self):
+        self.flush()
+        for x, y in self._counts:
+            with (self.directory / self._path(x, y)).open("a", encoding="utf-8") as f:
+                f.write("]}\n")
+
+        tiles = [
+            {
+                "z": self.zoom,
+                "x": x,
+                "y": y,
+                "path": self._path(x, y),
+                "bounds": tile_bounds(x, y, self.zoom),
+                "count": count,
+            }
+            for (x, y), count in sorted(self._counts.items())
+        ]
+        manifest = {
+            "format": "geojson",
+            "region": self.region["name"],
+            "zoom": self.zoom,
+            "step": self.region["step"],
+            "featureCount": sum(self._counts.values()),
+            "tiles": tiles,
+        }
+        with (self.directory / "manifest.json").open("w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+            f.write("\n")
+        return manifest
+
+
+def write_tiles(region, directory, zoom=TILE_ZOOM, workers=1, cache_dir=None):
+    writer = TileWriter(directory, zoom, region)
+    for points, columns in iter_grid_bands(region, workers=workers, cache_dir=cache_dir):
+        if not points:
+            continue
+        xs, ys = tile_xy([p[0] for p in points], [p[1] for p in points], zoom)
+        for x, y, feature in zip(xs.tolist(), ys.tolist(), build_features(points, columns)):
+            writer.add(x, y, feature)
+        writer.flush()
+    return writer.close()
+
+
+def write_grid(region, path, workers=1, cache_dir=None):
+    features = []
+    for points, columns in iter_grid_bands(region, workers=workers, cache_dir=cache_dir):
+        features.extend(build_features(points, columns))
+    features.sort(key=lambda f: f["geometry"]["coordinates"])
 
     data = {
         "type": "FeatureCollection",
         "features": features,
     }
 
-    with GRID_PATH.open("w", encoding="utf-8") as f:
+    with path.open("w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
         f.write("\n")
+    return len(features)
+
 
-    print(f"Generated {len(features)} boundary-clipped features in {GRID_PATH}")
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate a boundary-clipped sensor grid for a region")
+    parser.add_argument("--region", default=DEFAULT_REGION, help="Region name in scripts/regions/ or a path to a spec JSON")
+    parser.add_argument("--step", type=float, default=None, help="Override the region's lattice step (degrees)")
+    parser.add_argument("--noise", choices=sorted(NOISE_SCHEMES), default=None, help="Override the region's noise scheme (sha256 keeps committed grids identical)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes used to generate bands")
+    parser.add_argument("--tiles", action="store_true", help="Stream compact z/x/y GeoJSON tiles plus a manifest instead of one file")
+    parser.add_argument("--zoom", type=int, default=TILE_ZOOM, help="Tile zoom level for --tiles")
+    parser.add_argument("--cache-dir", default=str(GEOGRAPHY_CACHE_DIR), help="Where per region/step geography fields are cached")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute geography fields and leave the cache untouched")
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    region = load_region(args.region)
+    if args.step is not None:
+        region["step"] = args.step
+    if args.noise is not None:
+        region["noise"] = args.noise
+
+    if args.tiles:
+        directory = tiles_dir(region)
+        manifest = write_tiles(region, directory, args.zoom, args.workers, cache_dir)
+        print(f"Generated {manifest['featureCount']} features in {len(manifest['tiles'])} tiles under {directory}")
+        return
+
+    path = grid_path(region)
+    count = write_grid(region, path, args.workers, cache_dir)
+    print(f"Generated {count} boundary-clipped features in {path}")
 
 
 if __name__ == "__main__":